@@ -10,28 +10,50 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from oslo_concurrency import processutils
-from oslo_log import log as logging
-from stevedore import extension
+# NOTE: Importing os_vif must stay cheap, because many short-lived helper
+# processes import it. The oslo libraries, stevedore and the os_vif objects
+# are therefore imported by the functions below on first use, rather than
+# at module level. os_vif/tests/test_import.py enforces this.
 
-import os_vif.exception
-import os_vif.i18n
-import os_vif.objects
+_EXT_MANAGER = None
+_EXECUTOR = None
+_ROUTES = None
+_JOURNAL = None
+_LOCKS = None
+_COALESCER = None
+# Library-wide timeout of plug and unplug operations, and the timeouts of
+# the plugins that declare their own.
+_TIMEOUT = None
+_PLUGIN_TIMEOUTS = {}
 
-_LE = os_vif.i18n._LE
-_LI = os_vif.i18n._LI
 
-_EXT_MANAGER = None
-LOG = logging.getLogger('os_vif')
+class _LazyLogger(object):
+    """Logger that only imports oslo_log when it is first used."""
+
+    def __init__(self, name):
+        self.name = name
+        self._logger = None
+
+    def __getattr__(self, attr):
+        if self._logger is None:
+            from oslo_log import log as logging
+            self._logger = logging.getLogger(self.name)
+        return getattr(self._logger, attr)
+
 
+LOG = _LazyLogger('os_vif')
 
-def initialize(reset=False, **config):
+
+def initialize(reset=False, lazy=False, **config):
     """
     Loads all os_vif plugins and initializes them with a dictionary of
     configuration options. These configuration options are passed as-is
     to the individual VIF plugins that are loaded via stevedore.
 
     :param reset: Recreate and load the VIF plugin extensions.
+    :param lazy: Only read the plugins' entry point metadata now, and import
+                 and construct each plugin the first time a VIF that uses
+                 it is plugged or unplugged.
 
     The following configuration options are currently known to be
     used by the VIF plugins, however this list may change and you
@@ -45,9 +67,11 @@ def initialize(reset=False, **config):
                     to support IPv6.
         `disable_rootwrap`: Default: False. Set to True to force plugins to use
                     sudoers files instead of any `oslo.rootwrap` functionality.
+                    Also applies to `PluginBase.execute_privileged()`.
         `use_rootwrap_daemon`: Default: False. Set to True to use the optional
                     `oslo.rootwrap` daemon for better performance of root-run
-                    commands.
+                    commands. `PluginBase.execute_privileged()` then runs all
+                    commands through a single daemon process.
         `rootwrap_config`: Default: /etc/nova/rootwrap.conf. Path to the
                     rootwrap configuration file.
         `iptables_top_regex`: Default: ''. Override top filters in iptables
@@ -59,21 +83,525 @@ def initialize(reset=False, **config):
         `forward_bridge_interface`: Default: ['all'].
         `network_device_mtu`: Default: 1500. Override the MTU of network
                     devices created by a VIF plugin.
+
+    The following configuration options are used by the library itself.
+
+        `executor_max_workers`: Default: 16. Number of workers in the pool
+                    that runs independent VIF operations concurrently.
+        `plugin_max_concurrency`: Default: 8. Number of operations a thread
+                    safe plugin may run concurrently when its `PluginInfo`
+                    does not declare a `max_concurrency` of its own.
+        `plugin_index_path`: Default: None. Only used with `lazy`. Path of
+                    a file caching the discovered plugins and their
+                    `PluginInfo`, so that later processes do not have to
+                    scan entry points. It is rebuilt automatically when the
+                    set of installed packages changes.
+        `privileged_max_batch`: Default: 64. Maximum number of root commands
+                    run by plugins through `execute_privileged()` that are
+                    merged into a single `ip -batch` or `ovs-vsctl`
+                    invocation.
+        `enable_metrics`: Default: False. Set to True to record how long VIF
+                    lookups, plugin operations and the root commands plugins
+                    run take, and how many operations fail, in the registry
+                    returned by `os_vif.metrics.get_registry()`. Metrics
+                    are turned off by an initialization without it.
+        `metrics_statsd_address`: Default: None. `host:port` of a statsd
+                    daemon to also send the metrics to. Implies
+                    `enable_metrics`.
+        `journal_path`: Default: None. Path of a file on local disk in which
+                    to record each plug and unplug before it starts and once
+                    it completes, so that `recover()` can replay the ones
+                    that were interrupted.
+        `journal_fsync`: Default: True. Set to False to not wait for the
+                    journal to be synced to disk before plugging or
+                    unplugging, at the risk of missing operations begun
+                    just before a crash of the host.
+        `lock_resources`: Default: True. Set to False to let operations on
+                    the same VIF, device or bridge created by os_vif run at
+                    the same time. See `os_vif.locking.resources()`.
+        `lock_path`: Default: None. Directory in which to create lock files,
+                    so that the resources of VIFs are also locked against
+                    the other processes of the host using the same
+                    directory.
+        `device_pool_size`: Default: 0. Number of unattached veth pairs and
+                    bridges to keep created on the host, for plugins to
+                    take at plug time through `os_vif.devpool.get_pool()`.
+                    0 disables the pool.
+        `device_pool_low_watermark`: Default: half of `device_pool_size`.
+                    Number of pooled devices of a kind below which the pool
+                    is refilled in the background.
+        `device_pool_mtu`: Default: None. MTU to set on pooled devices.
+        `plug_timeout`: Default: None. Number of seconds after which `plug()`
+                    and `unplug()` time out, for plugins that do not declare
+                    a `default_timeout` in their `PluginInfo`. None means
+                    operations are not time bound.
+        `coalesce_requests`: Default: False. Set to True to run at most one
+                    plug or unplug per VIF id at a time, made through
+                    `plug()` and `unplug()` or their coroutine versions.
+                    Of the requests made on a VIF while one runs, only the
+                    last runs next, and the others return or raise what it
+                    did, or raise `exception.OperationSuperseded` if it was
+                    the other operation. See `os_vif.coalescer`.
+
+    The `os_vif.plugin.PluginInfo` of every plugin is read once, here, to
+    build the table that checks the VIF object versions each plugin
+    understands. VIFs are routed by the plugin they name in `VIF.plugin`.
+    See `os_vif.routing.RoutingTable`.
     """
+    from stevedore import extension
+
+    import os_vif.coalescer
+    import os_vif.devpool
+    import os_vif.executor
+    import os_vif.journal
+    import os_vif.loader
+    import os_vif.locking
+    import os_vif.metrics
+    import os_vif.objects
+    import os_vif.privileged
+    import os_vif.routing
+
     global _EXT_MANAGER
+    global _EXECUTOR
+    global _ROUTES
+    global _JOURNAL
+    global _LOCKS
+    global _COALESCER
+    global _TIMEOUT
+    global _PLUGIN_TIMEOUTS
     if reset or (_EXT_MANAGER is None):
-        _EXT_MANAGER = extension.ExtensionManager(namespace='os_vif',
-                                                  invoke_on_load=True,
-                                                  invoke_args=config)
+        os_vif.metrics.reset()
+        if config.get('enable_metrics') or config.get(
+                'metrics_statsd_address'):
+            sinks = [os_vif.metrics.get_registry()]
+            if config.get('metrics_statsd_address'):
+                host, port = config['metrics_statsd_address'].rsplit(':', 1)
+                sinks.append(os_vif.metrics.StatsdSink(host, int(port)))
+            os_vif.metrics.enable(*sinks)
+        os_vif.privileged.configure(
+            disable_rootwrap=config.get('disable_rootwrap', False),
+            use_rootwrap_daemon=config.get('use_rootwrap_daemon', False),
+            rootwrap_config=config.get(
+                'rootwrap_config', os_vif.privileged.DEFAULT_ROOTWRAP_CONFIG),
+            max_batch=config.get('privileged_max_batch',
+                                 os_vif.privileged.DEFAULT_MAX_BATCH))
+        if lazy:
+            _EXT_MANAGER = os_vif.loader.LazyPluginManager(
+                namespace='os_vif', invoke_args=config,
+                index_path=config.get('plugin_index_path'))
+        else:
+            _EXT_MANAGER = extension.ExtensionManager(namespace='os_vif',
+                                                      invoke_on_load=True,
+                                                      invoke_args=config)
         os_vif.objects.register_all()
+        _TIMEOUT = config.get('plug_timeout')
+        _PLUGIN_TIMEOUTS = {}
+        infos, pending = _describe_plugins()
+        _ROUTES = os_vif.routing.RoutingTable(infos, pending=pending)
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False)
+        _EXECUTOR = os_vif.executor.PlugExecutor(
+            max_workers=config.get(
+                'executor_max_workers',
+                os_vif.executor.DEFAULT_MAX_WORKERS),
+            plugin_concurrency=config.get(
+                'plugin_max_concurrency',
+                os_vif.executor.DEFAULT_PLUGIN_CONCURRENCY))
+        if _JOURNAL is not None:
+            _JOURNAL.close()
+            _JOURNAL = None
+        if config.get('journal_path'):
+            _JOURNAL = os_vif.journal.Journal(
+                config['journal_path'],
+                fsync=config.get('journal_fsync', True))
+        _LOCKS = None
+        if config.get('lock_resources', True):
+            _LOCKS = os_vif.locking.LockManager(
+                lock_path=config.get('lock_path'))
+        _COALESCER = None
+        if config.get('coalesce_requests'):
+            _COALESCER = os_vif.coalescer.Coalescer(plug=_plug,
+                                                    unplug=_unplug)
+        os_vif.devpool.configure(
+            size=config.get('device_pool_size', 0),
+            low_watermark=config.get('device_pool_low_watermark'),
+            mtu=config.get('device_pool_mtu'))
+
+
+def _get_plugin(plugin_name):
+    import os_vif.exception
+
+    try:
+        return _EXT_MANAGER[plugin_name]
+    except KeyError:
+        raise os_vif.exception.NoMatchingPlugin(plugin_name=plugin_name)
+
+
+def _plugin_names():
+    names = getattr(_EXT_MANAGER, 'names', None)
+    return names() if names is not None else list(_EXT_MANAGER)
+
+
+def _describe_plugin(name):
+    """
+    Returns the `os_vif.plugin.PluginInfo` the named plugin describes itself
+    with, and records its default timeout.
+    """
+    import numbers
+
+    # A LazyPluginManager can describe plugins from its index without
+    # loading them.
+    describe = getattr(_EXT_MANAGER, 'describe', None)
+    if describe is not None:
+        info = describe(name)
+    else:
+        info = _EXT_MANAGER[name].describe()
+    timeout = getattr(info, 'default_timeout', None)
+    if isinstance(timeout, numbers.Real):
+        _PLUGIN_TIMEOUTS[name] = timeout
+    return info
+
+
+def _describe_plugins():
+    """
+    Describes the plugins that can be described without loading them.
+
+    :returns: tuple of a dictionary mapping the name of each plugin to the
+              `os_vif.plugin.PluginInfo` it describes itself with, leaving
+              out plugins that fail to describe themselves, and a list of
+              the names of the plugins to describe once they are used.
+    """
+    from os_vif.i18n import _LW
+
+    # Plugins that are loaded on first use and missing from the index are
+    # only described then, so that initializing does not load them.
+    indexed_info = getattr(_EXT_MANAGER, 'indexed_info', None)
+    infos = {}
+    pending = []
+    for name in _plugin_names():
+        if indexed_info is not None and indexed_info(name) is None:
+            pending.append(name)
+            continue
+        try:
+            infos[name] = _describe_plugin(name)
+        except Exception as err:
+            LOG.warning(_LW("Unable to describe os_vif plugin %(name)s: "
+                            "%(err)s"), {'name': name, 'err': err})
+    return infos, pending
+
+
+def _route(vif):
+    """
+    Returns the name of the plugin that handles the VIF, the plugin, and the
+    VIF to hand to the plugin.
+
+    The plugin is the one named by `vif.plugin`. A VIF newer than the latest
+    version the plugin declares it understands is backported to that
+    version.
+
+    :raises `exception.NoMatchingPlugin` or one of its subclasses if no
+            plugin can handle the VIF.
+    """
+    import os_vif.metrics
+
+    started = os_vif.metrics.start()
+    plugin_name = vif.plugin
+    plugin = _get_plugin(plugin_name)
+    if plugin_name in _ROUTES.pending:
+        _ROUTES.describe([plugin_name], _describe_plugin)
+    version = vif.VERSION
+    target_version = _ROUTES.target_version(plugin_name, vif.obj_name(),
+                                            version)
+    if target_version != version:
+        vif = vif.obj_backport(target_version)
+    os_vif.metrics.observe(os_vif.metrics.LOOKUP, started,
+                           plugin=plugin_name)
+    return plugin_name, plugin, vif
+
+
+def _group_by_plugin(vifs):
+    """
+    Routes each VIF to its plugin.
+
+    :returns: tuple of a list of (plugin_name, plugin, [(index, vif), ...])
+              tuples, preserving the order in which each plugin first
+              appears in `vifs`, and a list of (index, error) tuples for the
+              VIFs no plugin can handle. The VIFs in the groups are the ones
+              to hand to the plugin, which may be backported copies.
+    """
+    import os_vif.exception
+
+    groups = {}
+    order = []
+    unrouted = []
+    for index, vif in enumerate(vifs):
+        try:
+            plugin_name, plugin, vif = _route(vif)
+        except os_vif.exception.NoMatchingPlugin as err:
+            unrouted.append((index, err))
+            continue
+        if plugin_name not in groups:
+            groups[plugin_name] = (plugin_name, plugin, [])
+            order.append(plugin_name)
+        groups[plugin_name][2].append((index, vif))
+    return [groups[plugin_name] for plugin_name in order], unrouted
+
+
+def _journal_begin(operation, items):
+    """
+    Records in the journal, if there is one, that operations are about to be
+    performed.
+
+    Failing to write the journal is logged but not fatal; it only means
+    that the operations cannot be recovered.
+
+    :param operation: 'plug' or 'unplug'.
+    :param items: list of (plugin_name, vif, instance) tuples.
+    :returns: the journal and the sequence numbers of the operations, to
+              pass to `_journal_end()`, or None.
+    """
+    from os_vif.i18n import _LW
+
+    journal = _JOURNAL
+    if journal is None or not items:
+        return None
+    try:
+        return journal, journal.begin(operation, items)
+    except (IOError, OSError) as err:
+        LOG.warning(_LW("Unable to write os_vif journal %(path)s: %(err)s"),
+                    {'path': journal.path, 'err': err})
+        return None
+
+
+def _journal_end(begun, succeeded):
+    """
+    Records the outcome of the operations `_journal_begin()` began. Failed
+    operations stay pending, for `recover()` to retry.
+
+    :param succeeded: whether all of the operations succeeded, or a list
+                      telling it for each operation.
+    """
+    from os_vif.i18n import _LW
+
+    if begun is None:
+        return
+    journal, seqs = begun
+    if isinstance(succeeded, bool):
+        succeeded = [succeeded] * len(seqs)
+    failed = [seq for seq, ok in zip(seqs, succeeded) if not ok]
+    try:
+        journal.end(seqs, failed)
+    except (IOError, OSError) as err:
+        LOG.warning(_LW("Unable to write os_vif journal %(path)s: %(err)s"),
+                    {'path': journal.path, 'err': err})
+
+
+class _NotLocked(object):
+    """Context manager standing in for the locks when locking is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOT_LOCKED = _NotLocked()
+
+
+def _lock_names(vifs):
+    """
+    Returns the names of the resources of the VIFs to lock, or an empty list
+    if locking is off.
+    """
+    import os_vif.locking
+
+    if _LOCKS is None:
+        return []
+    if len(vifs) == 1:
+        return os_vif.locking.resources(vifs[0])
+    return os_vif.locking.resources_of_all(vifs)
 
 
-def plug(vif, instance):
+def _locked(vifs, deadline=None):
+    """
+    Returns a context manager holding the locks on the resources of the
+    VIFs, if locking is on.
+
+    :param deadline: Optional `os_vif.deadline.Deadline` bounding the wait.
+    :raises `exception.PlugTimeout` if the deadline passed while waiting.
+    """
+    locks = _LOCKS
+    if locks is None:
+        return _NOT_LOCKED
+    return locks.acquire(_lock_names(vifs), deadline)
+
+
+def _submit_batch(operation, items, instance, plugin_name, plugin, hook,
+                  *args):
+    """
+    Submits the batch `hook` of a plugin to the executor with the VIFs of
+    `items`, a list of (vif, plugin_vif) tuples, holding the locks on their
+    resources until it completes.
+
+    The locks are taken in the calling thread, before the plugin's
+    concurrency slot, so that waiting for a lock neither keeps other VIFs
+    from using the slot nor holds a worker of the executor. The operations
+    are journaled under them, so that the journal records the operations
+    on a VIF in the order they run.
+
+    :returns: A `futurist.Future` for the list of the errors returned by
+              `hook`.
+    """
+    plugin_vifs = [plugin_vif for _vif, plugin_vif in items]
+    held = _locked(plugin_vifs)
+    try:
+        begun = _journal_begin(operation, [(plugin_name, vif, instance)
+                                           for vif, _plugin_vif in items])
+        return _EXECUTOR.submit(plugin_name, plugin, _run_batch, held, begun,
+                                hook, plugin_vifs, *args)
+    except Exception:
+        # The batch will not run to release the locks.
+        held.__exit__(None, None, None)
+        raise
+
+
+def _run_batch(held, begun, hook, plugin_vifs, *args):
+    """
+    Calls the batch `hook` of a plugin, then records the outcome of the
+    operations `_journal_begin()` began and releases the locks `held`.
+
+    :returns: list of the errors returned by `hook`.
+    """
+    with held:
+        succeeded = False
+        try:
+            errors = hook(plugin_vifs, *args)
+            succeeded = [err is None for err in errors]
+        finally:
+            _journal_end(begun, succeeded)
+        return errors
+
+
+def _deadline(plugin_name, operation, vif, timeout):
+    """
+    Returns the `os_vif.deadline.Deadline` of an operation, from the timeout
+    passed by the caller, or else the plugin's or the library's default, or
+    None if the operation is not time bound.
+    """
+    import os_vif.deadline
+
+    if timeout is None:
+        timeout = _PLUGIN_TIMEOUTS.get(plugin_name, _TIMEOUT)
+        if timeout is None:
+            return None
+    return os_vif.deadline.Deadline(timeout, operation, vif)
+
+
+def _run_within(deadline, plugin_name, plugin, func, *args):
+    """
+    Calls `func` through the executor under the deadline, unless it passed
+    while waiting for locks or for the plugin's concurrency slot.
+
+    :raises `exception.PlugTimeout` if the deadline passed before `func` was
+            called, or while it ran and `func` failed.
+    """
+    from oslo_concurrency import processutils
+
+    def call():
+        deadline.check()
+        with deadline:
+            return func(*args)
+
+    if deadline is None:
+        return _EXECUTOR.run(plugin_name, plugin, func, *args)
+    try:
+        return _EXECUTOR.run_within(deadline, plugin_name, plugin, call)
+    except processutils.ProcessExecutionError:
+        # A command that failed once the deadline passed is reported as
+        # timing out.
+        deadline.check()
+        raise
+
+
+def _has_batch_hook(plugin, hook_name):
+    """
+    Returns True if the plugin provides its own implementation of the named
+    batch hook rather than the per-VIF loop in `os_vif.plugin.PluginBase`.
+    """
+    import os_vif.plugin
+
+    hook = getattr(type(plugin), hook_name, None)
+    base_hook = getattr(os_vif.plugin.PluginBase, hook_name)
+    return (getattr(hook, '__func__', hook) is not
+            getattr(base_hook, '__func__', base_hook))
+
+
+def _run_many(vifs, hook_name, *args):
+    """
+    Hands each plugin the VIFs it is responsible for through the named batch
+    hook, running independent batches concurrently on the executor.
+
+    A plugin that overrides the batch hook gets all of its VIFs in one call.
+    Otherwise the VIFs are handed over one at a time, so that a thread safe
+    plugin can work on several of them at once.
+
+    :returns: list of (vif, error) tuples in the same order as `vifs`, where
+              error is None, a `exception.NoMatchingPlugin`, or the error
+              reported by the plugin.
+    """
+    from oslo_concurrency import processutils
+
+    import os_vif.metrics
+
+    outcomes = [None] * len(vifs)
+    groups, unrouted = _group_by_plugin(vifs)
+    for index, err in unrouted:
+        outcomes[index] = (vifs[index], err)
+
+    operation = hook_name[:-len('_many')]
+    instance = args[0] if args else None
+    pending = []
+    for plugin_name, plugin, group in groups:
+        serial = _EXECUTOR.concurrency(plugin_name, plugin) == 1
+        if serial or _has_batch_hook(plugin, hook_name):
+            batches = [group]
+        else:
+            batches = [[item] for item in group]
+
+        hook = os_vif.metrics.instrument(getattr(plugin, hook_name),
+                                         plugin_name, hook_name)
+        for batch in batches:
+            if _LOCKS is not None or _JOURNAL is not None:
+                future = _submit_batch(
+                    operation, [(vifs[index], vif) for index, vif in batch],
+                    instance, plugin_name, plugin, hook, *args)
+            else:
+                future = _EXECUTOR.submit(plugin_name, plugin, hook,
+                                          [vif for _index, vif in batch],
+                                          *args)
+            pending.append((batch, future))
+
+    for batch, future in pending:
+        try:
+            errors = future.result()
+        except processutils.ProcessExecutionError as err:
+            errors = [err] * len(batch)
+        for (index, _vif), err in zip(batch, errors):
+            outcomes[index] = (vifs[index], err)
+    return outcomes
+
+
+def plug(vif, instance, timeout=None):
     """
     Given a model of a VIF, perform operations to plug the VIF properly.
 
     :param vif: `os_vif.objects.VIF` object.
     :param instance: `nova.objects.Instance` object.
+    :param timeout: Optional number of seconds the operation may take,
+                    including waiting for other operations on the same
+                    resources. Defaults to the `default_timeout` of the
+                    plugin, or else the `plug_timeout` option.
     :raises `exception.LibraryNotInitialized` if the user of the library
             did not call os_vif.initialize(**config) before trying to
             plug a VIF.
@@ -81,31 +609,99 @@ def plug(vif, instance):
             type of VIF supplied.
     :raises `exception.PlugException` if anything fails during unplug
             operations.
+    :raises `exception.PlugTimeout` if the operation did not complete in
+            time.
+    :raises `exception.OperationSuperseded` if requests are coalesced and
+            the VIF was unplugged instead.
+    """
+    coalescer = _COALESCER
+    if coalescer is not None:
+        # The deadline also bounds the wait for a running operation on the
+        # VIF.
+        return coalescer.plug(vif, instance,
+                              deadline=_unrouted_deadline(vif, 'plug',
+                                                          timeout))
+    return _plug(vif, instance, timeout)
+
+
+def _unrouted_deadline(vif, operation, timeout):
     """
+    Returns the deadline of an operation on a VIF that is not routed yet,
+    as `_deadline()` does.
+    """
+    import os_vif.exception
+
+    plugin_name = vif.plugin
+    if plugin_name is None and timeout is None:
+        try:
+            plugin_name = _route(vif)[0]
+        except os_vif.exception.NoMatchingPlugin:
+            # The operation fails once routed.
+            pass
+    return _deadline(plugin_name, operation, vif, timeout)
+
+
+def _plug(vif, instance, timeout=None, deadline=None):
+    """
+    Plugs the VIF, as `plug()` does without coalescing requests, under the
+    given deadline if it is set.
+    """
+    from oslo_concurrency import processutils
+
+    import os_vif.exception
+    from os_vif.i18n import _LE
+    from os_vif.i18n import _LI
+    import os_vif.logutils
+    import os_vif.metrics
+
     if _EXT_MANAGER is None:
         raise os_vif.exception.LibraryNotInitialized()
 
-    plugin_name = vif.plugin
     try:
-        plugin = _EXT_MANAGER[plugin_name]
-    except KeyError:
-        raise os_vif.exception.NoMatchingPlugin(plugin_name=plugin_name)
+        plugin_name, plugin, plugin_vif = _route(vif)
+    except os_vif.exception.NoMatchingPlugin as err:
+        os_vif.metrics.count_failure(err, vif.plugin, 'plug')
+        raise
+    hook = os_vif.metrics.instrument(plugin.plug, plugin_name, 'plug')
+    if deadline is None:
+        deadline = _deadline(plugin_name, 'plug', vif, timeout)
 
     try:
-        LOG.debug("Plugging vif %s", vif)
-        plugin.plug(vif, instance)
-        LOG.info(_LI("Successfully plugged vif %s"), vif)
+        # The deadline also bounds the wait for the locks. The journal is
+        # written under them, so that it records the operations on a VIF in
+        # the order they run.
+        with _locked([plugin_vif], deadline):
+            begun = _journal_begin('plug', [(plugin_name, vif, instance)])
+            succeeded = False
+            try:
+                LOG.debug("Plugging vif %s", vif)
+                _run_within(deadline, plugin_name, plugin, hook, plugin_vif,
+                            instance)
+                succeeded = True
+            finally:
+                _journal_end(begun, succeeded)
+        LOG.info(_LI("Successfully plugged vif %s"),
+                 os_vif.logutils.identity(vif))
+    except os_vif.exception.PlugTimeout as err:
+        LOG.error(_LE("Failed to plug vif %(vif)s. Got error: %(err)s"),
+                  {'vif': os_vif.logutils.identity(vif), 'err': err})
+        os_vif.metrics.count_failure(err, plugin_name, 'plug')
+        raise
     except processutils.ProcessExecutionError as err:
         LOG.error(_LE("Failed to plug vif %(vif)s. Got error: %(err)s"),
-                  vif=vif, err=err)
-        raise os_vif.exception.PlugException(vif=vif, err=err)
+                  {'vif': os_vif.logutils.identity(vif), 'err': err})
+        exc = os_vif.exception.PlugException(vif=vif, err=err)
+        os_vif.metrics.count_failure(exc, plugin_name, 'plug')
+        raise exc
 
 
-def unplug(vif):
+def unplug(vif, timeout=None):
     """
     Given a model of a VIF, perform operations to unplug the VIF properly.
 
     :param vif: `os_vif.objects.VIF` object.
+    :param timeout: Optional number of seconds the operation may take, as
+                    for `plug()`.
     :raises `exception.LibraryNotInitialized` if the user of the library
             did not call os_vif.initialize(**config) before trying to
             plug a VIF.
@@ -113,21 +709,529 @@ def unplug(vif):
             type of VIF supplied.
     :raises `exception.UnplugException` if anything fails during unplug
             operations.
+    :raises `exception.PlugTimeout` if the operation did not complete in
+            time.
+    :raises `exception.OperationSuperseded` if requests are coalesced and
+            the VIF was plugged instead.
     """
+    coalescer = _COALESCER
+    if coalescer is not None:
+        return coalescer.unplug(vif,
+                                deadline=_unrouted_deadline(vif, 'unplug',
+                                                            timeout))
+    return _unplug(vif, timeout)
+
+
+def _unplug(vif, timeout=None, deadline=None):
+    """
+    Unplugs the VIF, as `unplug()` does without coalescing requests, under
+    the given deadline if it is set.
+    """
+    from oslo_concurrency import processutils
+
+    import os_vif.exception
+    from os_vif.i18n import _LE
+    from os_vif.i18n import _LI
+    import os_vif.logutils
+    import os_vif.metrics
+
     if _EXT_MANAGER is None:
         raise os_vif.exception.LibraryNotInitialized()
 
-    plugin_name = vif.plugin
     try:
-        plugin = _EXT_MANAGER[plugin_name]
-    except KeyError:
-        raise os_vif.exception.NoMatchingPlugin(plugin_name=plugin_name)
+        plugin_name, plugin, plugin_vif = _route(vif)
+    except os_vif.exception.NoMatchingPlugin as err:
+        os_vif.metrics.count_failure(err, vif.plugin, 'unplug')
+        raise
+    hook = os_vif.metrics.instrument(plugin.unplug, plugin_name, 'unplug')
+    if deadline is None:
+        deadline = _deadline(plugin_name, 'unplug', vif, timeout)
 
     try:
-        LOG.debug("Unplugging vif %s", vif)
-        plugin.unplug(vif)
-        LOG.info(_LI("Successfully unplugged vif %s"), vif)
+        with _locked([plugin_vif], deadline):
+            begun = _journal_begin('unplug', [(plugin_name, vif, None)])
+            succeeded = False
+            try:
+                LOG.debug("Unplugging vif %s", vif)
+                _run_within(deadline, plugin_name, plugin, hook, plugin_vif)
+                succeeded = True
+            finally:
+                _journal_end(begun, succeeded)
+        LOG.info(_LI("Successfully unplugged vif %s"),
+                 os_vif.logutils.identity(vif))
+    except os_vif.exception.PlugTimeout as err:
+        LOG.error(_LE("Failed to unplug vif %(vif)s. Got error: %(err)s"),
+                  {'vif': os_vif.logutils.identity(vif), 'err': err})
+        os_vif.metrics.count_failure(err, plugin_name, 'unplug')
+        raise
     except processutils.ProcessExecutionError as err:
         LOG.error(_LE("Failed to unplug vif %(vif)s. Got error: %(err)s"),
-                  vif=vif, err=err)
-        raise os_vif.exception.UnplugException(vif=vif, err=err)
+                  {'vif': os_vif.logutils.identity(vif), 'err': err})
+        exc = os_vif.exception.UnplugException(vif=vif, err=err)
+        os_vif.metrics.count_failure(exc, plugin_name, 'unplug')
+        raise exc
+
+
+def prepare(vif, instance, timeout=None):
+    """
+    Given a model of a VIF, perform the operations to plug it that can run
+    ahead of time, such as on the destination host of a live migration
+    before the instance is switched over. `activate()` then completes the
+    plugging of the VIF. Plugins that do not split plugging in two plug the
+    VIF fully here, and do nothing in `activate()`.
+
+    A prepared VIF is recorded in the journal as plugged, so that
+    `recover()` plugs it fully if the operation is interrupted.
+
+    :param vif: `os_vif.objects.VIF` object.
+    :param instance: `nova.objects.Instance` object.
+    :param timeout: Optional number of seconds the operation may take, as
+                    for `plug()`.
+    :raises `exception.LibraryNotInitialized` if the user of the library
+            did not call os_vif.initialize(**config) before trying to
+            prepare a VIF.
+    :raises `exception.NoMatchingPlugin` if there is no plugin for the
+            type of VIF supplied.
+    :raises `exception.PlugException` if anything fails during prepare
+            operations.
+    :raises `exception.PlugTimeout` if the operation did not complete in
+            time.
+    """
+    from oslo_concurrency import processutils
+
+    import os_vif.exception
+    from os_vif.i18n import _LE
+    from os_vif.i18n import _LI
+    import os_vif.logutils
+    import os_vif.metrics
+
+    if _EXT_MANAGER is None:
+        raise os_vif.exception.LibraryNotInitialized()
+
+    try:
+        plugin_name, plugin, plugin_vif = _route(vif)
+    except os_vif.exception.NoMatchingPlugin as err:
+        os_vif.metrics.count_failure(err, vif.plugin, 'prepare')
+        raise
+    hook = os_vif.metrics.instrument(plugin.prepare, plugin_name, 'prepare')
+    deadline = _deadline(plugin_name, 'prepare', vif, timeout)
+
+    try:
+        with _locked([plugin_vif], deadline):
+            begun = _journal_begin('plug', [(plugin_name, vif, instance)])
+            succeeded = False
+            try:
+                LOG.debug("Preparing vif %s", vif)
+                _run_within(deadline, plugin_name, plugin, hook, plugin_vif,
+                            instance)
+                succeeded = True
+            finally:
+                _journal_end(begun, succeeded)
+        LOG.info(_LI("Successfully prepared vif %s"),
+                 os_vif.logutils.identity(vif))
+    except os_vif.exception.PlugTimeout as err:
+        LOG.error(_LE("Failed to prepare vif %(vif)s. Got error: %(err)s"),
+                  {'vif': os_vif.logutils.identity(vif), 'err': err})
+        os_vif.metrics.count_failure(err, plugin_name, 'prepare')
+        raise
+    except processutils.ProcessExecutionError as err:
+        LOG.error(_LE("Failed to prepare vif %(vif)s. Got error: %(err)s"),
+                  {'vif': os_vif.logutils.identity(vif), 'err': err})
+        exc = os_vif.exception.PlugException(vif=vif, err=err)
+        os_vif.metrics.count_failure(exc, plugin_name, 'prepare')
+        raise exc
+
+
+def activate(vif, timeout=None):
+    """
+    Given a model of a VIF that `prepare()` was called for, complete its
+    plugging. This only runs the cheap steps the plugin left out of
+    `prepare()`, so that it can run at a time critical moment such as the
+    switchover of a live migration.
+
+    :param vif: `os_vif.objects.VIF` object.
+    :param timeout: Optional number of seconds the operation may take, as
+                    for `plug()`.
+    :raises `exception.LibraryNotInitialized` if the user of the library
+            did not call os_vif.initialize(**config) before trying to
+            activate a VIF.
+    :raises `exception.NoMatchingPlugin` if there is no plugin for the
+            type of VIF supplied.
+    :raises `exception.PlugException` if anything fails during activate
+            operations.
+    :raises `exception.PlugTimeout` if the operation did not complete in
+            time.
+    """
+    from oslo_concurrency import processutils
+
+    import os_vif.exception
+    from os_vif.i18n import _LE
+    from os_vif.i18n import _LI
+    import os_vif.logutils
+    import os_vif.metrics
+
+    if _EXT_MANAGER is None:
+        raise os_vif.exception.LibraryNotInitialized()
+
+    try:
+        plugin_name, plugin, plugin_vif = _route(vif)
+    except os_vif.exception.NoMatchingPlugin as err:
+        os_vif.metrics.count_failure(err, vif.plugin, 'activate')
+        raise
+    hook = os_vif.metrics.instrument(plugin.activate, plugin_name, 'activate')
+    deadline = _deadline(plugin_name, 'activate', vif, timeout)
+
+    try:
+        with _locked([plugin_vif], deadline):
+            LOG.debug("Activating vif %s", vif)
+            _run_within(deadline, plugin_name, plugin, hook, plugin_vif)
+        LOG.info(_LI("Successfully activated vif %s"),
+                 os_vif.logutils.identity(vif))
+    except os_vif.exception.PlugTimeout as err:
+        LOG.error(_LE("Failed to activate vif %(vif)s. Got error: %(err)s"),
+                  {'vif': os_vif.logutils.identity(vif), 'err': err})
+        os_vif.metrics.count_failure(err, plugin_name, 'activate')
+        raise
+    except processutils.ProcessExecutionError as err:
+        LOG.error(_LE("Failed to activate vif %(vif)s. Got error: %(err)s"),
+                  {'vif': os_vif.logutils.identity(vif), 'err': err})
+        exc = os_vif.exception.PlugException(vif=vif, err=err)
+        os_vif.metrics.count_failure(exc, plugin_name, 'activate')
+        raise exc
+
+
+def plug_many(vifs, instance):
+    """
+    Given a list of VIF models, plug all of them, handing each plugin the
+    whole group of VIFs it is responsible for.
+
+    Independent groups of VIFs are plugged concurrently, within the
+    concurrency limits declared by each plugin. Failures are reported per
+    VIF instead of aborting the whole batch.
+
+    :param vifs: list of `os_vif.objects.VIF` objects.
+    :param instance: `nova.objects.Instance` object.
+    :returns: list of `os_vif.result.VIFResult` objects, in the same order
+              as `vifs`. The `error` of a failed result is either a
+              `exception.NoMatchingPlugin` or a `exception.PlugException`.
+    :raises `exception.LibraryNotInitialized` if the user of the library
+            did not call os_vif.initialize(**config) before trying to
+            plug VIFs.
+    """
+    import os_vif.exception
+    from os_vif.i18n import _LE
+    from os_vif.i18n import _LI
+    import os_vif.logutils
+    import os_vif.metrics
+    import os_vif.result
+
+    if _EXT_MANAGER is None:
+        raise os_vif.exception.LibraryNotInitialized()
+
+    LOG.debug("Plugging vifs %s", vifs)
+    results = []
+    for vif, err in _run_many(vifs, 'plug_many', instance):
+        if err is None:
+            LOG.info(_LI("Successfully plugged vif %s"),
+                     os_vif.logutils.identity(vif))
+        elif not isinstance(err, os_vif.exception.NoMatchingPlugin):
+            LOG.error(_LE("Failed to plug vif %(vif)s. Got error: %(err)s"),
+                      {'vif': os_vif.logutils.identity(vif), 'err': err})
+            err = os_vif.exception.PlugException(vif=vif, err=err)
+        if err is not None:
+            os_vif.metrics.count_failure(err, vif.plugin, 'plug')
+        results.append(os_vif.result.VIFResult(vif, err))
+    return results
+
+
+def unplug_many(vifs):
+    """
+    Given a list of VIF models, unplug all of them, handing each plugin the
+    whole group of VIFs it is responsible for.
+
+    Independent groups of VIFs are unplugged concurrently, within the
+    concurrency limits declared by each plugin. Failures are reported per
+    VIF instead of aborting the whole batch.
+
+    :param vifs: list of `os_vif.objects.VIF` objects.
+    :returns: list of `os_vif.result.VIFResult` objects, in the same order
+              as `vifs`. The `error` of a failed result is either a
+              `exception.NoMatchingPlugin` or a `exception.UnplugException`.
+    :raises `exception.LibraryNotInitialized` if the user of the library
+            did not call os_vif.initialize(**config) before trying to
+            unplug VIFs.
+    """
+    import os_vif.exception
+    from os_vif.i18n import _LE
+    from os_vif.i18n import _LI
+    import os_vif.logutils
+    import os_vif.metrics
+    import os_vif.result
+
+    if _EXT_MANAGER is None:
+        raise os_vif.exception.LibraryNotInitialized()
+
+    LOG.debug("Unplugging vifs %s", vifs)
+    results = []
+    for vif, err in _run_many(vifs, 'unplug_many'):
+        if err is None:
+            LOG.info(_LI("Successfully unplugged vif %s"),
+                     os_vif.logutils.identity(vif))
+        elif not isinstance(err, os_vif.exception.NoMatchingPlugin):
+            LOG.error(_LE("Failed to unplug vif %(vif)s. Got error: "
+                          "%(err)s"),
+                      {'vif': os_vif.logutils.identity(vif), 'err': err})
+            err = os_vif.exception.UnplugException(vif=vif, err=err)
+        if err is not None:
+            os_vif.metrics.count_failure(err, vif.plugin, 'unplug')
+        results.append(os_vif.result.VIFResult(vif, err))
+    return results
+
+
+def _describe_state(plugin_name, plugin, vifs, host_state):
+    """
+    Returns the `os_vif.hoststate.PluginState` the plugin reports for the
+    VIFs, or None if the plugin cannot tell or fails to.
+    """
+    from os_vif.i18n import _LW
+
+    try:
+        state = plugin.describe_state(vifs, host_state)
+    except Exception as err:
+        LOG.warning(_LW("Unable to get the state of the VIFs of os_vif "
+                        "plugin %(name)s, plugging them again: %(err)s"),
+                    {'name': plugin_name, 'err': err})
+        return None
+    for vif in getattr(state, 'extra', ()):
+        if not vif.plugin:
+            vif.plugin = plugin_name
+    return state
+
+
+def reconcile(vifs):
+    """
+    Given the complete list of VIF models that should be plugged on the host,
+    plug the ones that are missing or stale, unplug the ones that are
+    plugged without being listed, and leave the others alone.
+
+    One snapshot of the host's network state is taken and handed to the
+    `describe_state()` hook of every plugin, which compares the VIFs it is
+    responsible for against it. This loads every plugin, since any of them
+    may have VIFs to unplug. Plugins that do not implement the hook have all
+    of their VIFs plugged again.
+
+    Each VIF is plugged with its `instance_info` as the instance.
+
+    :param vifs: list of `os_vif.objects.VIF` objects.
+    :returns: `os_vif.result.ReconcileResult` object.
+    :raises `exception.LibraryNotInitialized` if the user of the library
+            did not call os_vif.initialize(**config) before trying to
+            reconcile VIFs.
+    """
+    import os_vif.exception
+    import os_vif.hoststate
+    import os_vif.result
+
+    if _EXT_MANAGER is None:
+        raise os_vif.exception.LibraryNotInitialized()
+
+    host_state = os_vif.hoststate.HostState.capture()
+    result = os_vif.result.ReconcileResult()
+    groups, unrouted = _group_by_plugin(vifs)
+    for index, err in unrouted:
+        result.plugged.append(os_vif.result.VIFResult(vifs[index], err))
+
+    to_plug = []
+    extra = []
+    described = set()
+    for plugin_name, plugin, group in groups:
+        described.add(plugin_name)
+        state = _describe_state(plugin_name, plugin,
+                                [vif for _index, vif in group], host_state)
+        states = state.states if state is not None else {}
+        for index, vif in group:
+            if states.get(vif.id) == os_vif.hoststate.VIF_STATE_PLUGGED:
+                result.unchanged.append(vifs[index])
+            else:
+                to_plug.append(vifs[index])
+        if state is not None:
+            extra.extend(state.extra)
+    for plugin_name in _plugin_names():
+        if plugin_name not in described:
+            state = _describe_state(plugin_name, _get_plugin(plugin_name),
+                                    [], host_state)
+            if state is not None:
+                extra.extend(state.extra)
+
+    LOG.debug("Reconciling vifs: %(plug)d to plug, %(unplug)d to unplug, "
+              "%(unchanged)d unchanged",
+              {'plug': len(to_plug), 'unplug': len(extra),
+               'unchanged': len(result.unchanged)})
+    # Unplug first, so that the devices of stale VIFs that were reported
+    # as extra are out of the way of the VIFs replacing them.
+    if extra:
+        result.unplugged.extend(unplug_many(extra))
+    # plug_many() takes a single instance, so plug the VIFs of each
+    # instance together.
+    instances = []
+    by_instance = {}
+    for vif in to_plug:
+        instance = getattr(vif, 'instance_info', None)
+        if id(instance) not in by_instance:
+            by_instance[id(instance)] = []
+            instances.append(instance)
+        by_instance[id(instance)].append(vif)
+    for instance in instances:
+        result.plugged.extend(plug_many(by_instance[id(instance)], instance))
+    return result
+
+
+def recover():
+    """
+    Replays the plug and unplug operations that the journal recorded as
+    begun but not completed, such as those interrupted by a crash or a
+    restart of the process, or those that failed. Requires the
+    `journal_path` configuration option.
+
+    Only the last operation begun on each VIF is replayed, so a VIF that
+    was plugged and then unplugged is not plugged again. Unplugs are
+    replayed before plugs. A VIF is plugged with the instance it was
+    plugged with if that was an os_vif object, and otherwise with its
+    `instance_info`.
+
+    :returns: list of `os_vif.result.VIFResult` objects for the replayed
+              operations, unplugs first. Operations whose journal entry
+              cannot be decoded are logged and dropped from the journal.
+    :raises `exception.LibraryNotInitialized` if the user of the library
+            did not call os_vif.initialize(**config) before trying to
+            recover VIFs.
+    """
+    import os_vif.exception
+    from os_vif.i18n import _LW
+
+    if _EXT_MANAGER is None:
+        raise os_vif.exception.LibraryNotInitialized()
+    journal = _JOURNAL
+    if journal is None:
+        return []
+
+    unplugs = []
+    instances = []
+    by_instance = {}
+    for entry in journal.pending():
+        try:
+            vif, instance = entry.decode()
+        except Exception as err:
+            # Whatever the damage to the payload, the entry cannot be
+            # replayed, and is not to stop the others from being replayed.
+            LOG.warning(_LW("Unable to recover the %(operation)s of vif "
+                            "%(vif_id)s: %(err)s"),
+                        {'operation': entry.operation,
+                         'vif_id': entry.vif_id, 'err': err})
+            journal.end([entry.seq])
+            continue
+        if entry.operation == 'unplug':
+            unplugs.append(vif)
+            continue
+        if instance is None:
+            instance = getattr(vif, 'instance_info', None)
+        # Each entry decodes into objects of its own, so the VIFs of an
+        # instance are told apart by the instance's UUID.
+        key = getattr(instance, 'uuid', None) or id(instance)
+        if key not in by_instance:
+            by_instance[key] = []
+            instances.append((key, instance))
+        by_instance[key].append(vif)
+
+    LOG.debug("Recovering vifs: %(plug)d to plug, %(unplug)d to unplug",
+              {'plug': sum(len(group) for group in by_instance.values()),
+               'unplug': len(unplugs)})
+    results = unplug_many(unplugs) if unplugs else []
+    for key, instance in instances:
+        results.extend(plug_many(by_instance[key], instance))
+    journal.compact()
+    return results
+
+
+def transaction():
+    """
+    Returns a context manager plugging VIFs as a whole: if the `with` block
+    raises, the VIFs it plugged are unplugged again before the exception
+    propagates::
+
+        with os_vif.transaction() as tx:
+            tx.plug(vif, instance)
+            tx.plug_many(other_vifs, instance)
+
+    VIFs that share a bridge or another resource are unplugged in the
+    reverse of the order they were plugged in, and the others concurrently.
+
+    :returns: `os_vif.transactions.Transaction` object.
+    """
+    import os_vif.transactions
+    return os_vif.transactions.Transaction()
+
+
+def aplug(vif, instance, timeout=None):
+    """
+    Coroutine version of `plug()`, for callers running an asyncio event
+    loop. Requires Python 3.5 or newer::
+
+        await os_vif.aplug(vif, instance)
+
+    Plugins that define a coroutine `aplug()` method are awaited directly.
+    For all other plugins, `plug()` is run on the library's executor so that
+    the event loop is not blocked while the plugin runs commands. When
+    requests are coalesced, the request is made through the library's
+    coalescer on the executor, and `plug()` of the plugin is run.
+
+    :param vif: `os_vif.objects.VIF` object.
+    :param instance: `nova.objects.Instance` object.
+    :param timeout: Optional number of seconds the operation may take, as
+                    for `plug()`. A coroutine `aplug()` of the plugin still
+                    running when it passes is cancelled.
+    :raises `exception.LibraryNotInitialized` if the user of the library
+            did not call os_vif.initialize(**config) before trying to
+            plug a VIF.
+    :raises `exception.NoMatchingPlugin` if there is no plugin for the
+            type of VIF supplied.
+    :raises `exception.PlugException` if anything fails during plug
+            operations.
+    :raises `exception.PlugTimeout` if the operation did not complete in
+            time.
+    :raises `exception.OperationSuperseded` if requests are coalesced and
+            the VIF was unplugged instead.
+    """
+    from os_vif import _aio
+    return _aio.aplug(vif, instance, timeout)
+
+
+def aunplug(vif, timeout=None):
+    """
+    Coroutine version of `unplug()`, for callers running an asyncio event
+    loop. Requires Python 3.5 or newer::
+
+        await os_vif.aunplug(vif)
+
+    Plugins that define a coroutine `aunplug()` method are awaited directly.
+    For all other plugins, `unplug()` is run on the library's executor so
+    that the event loop is not blocked while the plugin runs commands. When
+    requests are coalesced, they go through the coalescer as for `aplug()`.
+
+    :param vif: `os_vif.objects.VIF` object.
+    :param timeout: Optional number of seconds the operation may take, as
+                    for `aplug()`.
+    :raises `exception.LibraryNotInitialized` if the user of the library
+            did not call os_vif.initialize(**config) before trying to
+            unplug a VIF.
+    :raises `exception.NoMatchingPlugin` if there is no plugin for the
+            type of VIF supplied.
+    :raises `exception.UnplugException` if anything fails during unplug
+            operations.
+    :raises `exception.PlugTimeout` if the operation did not complete in
+            time.
+    :raises `exception.OperationSuperseded` if requests are coalesced and
+            the VIF was plugged instead.
+    """
+    from os_vif import _aio
+    return _aio.aunplug(vif, timeout)
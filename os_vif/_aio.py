@@ -0,0 +1,210 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""asyncio implementations of os_vif.aplug() and os_vif.aunplug().
+
+This module uses `async def` and must only be imported on Python 3.5 or
+newer.
+"""
+
+import asyncio
+
+from oslo_concurrency import processutils
+
+import os_vif
+import os_vif.exception
+import os_vif.i18n
+from os_vif import logutils
+from os_vif import metrics
+
+_LE = os_vif.i18n._LE
+_LI = os_vif.i18n._LI
+LOG = os_vif.LOG
+
+
+async def _bounded(awaitable, deadline):
+    """
+    Awaits `awaitable`, within the deadline if there is one.
+
+    :raises `exception.PlugTimeout` if the deadline passes first, after
+            cancelling `awaitable`.
+    """
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, deadline.remaining())
+    except asyncio.TimeoutError:
+        deadline.cancel()
+        deadline.check()
+
+
+async def _acquire(locks, names, deadline):
+    """
+    Acquires the locks on the named resources on a worker of the library's
+    executor, so that the event loop is not blocked while waiting for them.
+    The deadline, if there is one, bounds the wait.
+    """
+    future = os_vif._EXECUTOR.spawn(locks.acquire, names, deadline)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # The worker goes on waiting for the locks, so release them once it
+        # has them.
+        def release(done):
+            if done.exception() is None:
+                done.result().release()
+        future.add_done_callback(release)
+        raise
+
+
+def _run_journaled(operation, plugin_name, plugin, vif, plugin_vif,
+                   instance, deadline, hook, *args):
+    """
+    Runs a synchronous hook through the library's executor under the
+    deadline, holding the locks on the resources of the VIF, and journals
+    the operation under them.
+    """
+    with os_vif._locked([plugin_vif], deadline):
+        begun = os_vif._journal_begin(operation,
+                                      [(plugin_name, vif, instance)])
+        succeeded = False
+        try:
+            os_vif._run_within(deadline, plugin_name, plugin, hook,
+                               plugin_vif, *args)
+            succeeded = True
+        finally:
+            os_vif._journal_end(begun, succeeded)
+
+
+async def _call(plugin_name, plugin, operation, async_hook, sync_hook, vif,
+                plugin_vif, instance, deadline, *args):
+    """
+    Awaits the plugin's coroutine hook if it has one, otherwise runs the
+    synchronous hook on the library's executor and awaits its completion.
+    Either way, the hook runs holding the locks on the resources of the
+    VIF, under which the operation is journaled, and the deadline bounds
+    the wait for the locks and for the hook.
+    """
+    if async_hook is not None and asyncio.iscoroutinefunction(async_hook):
+        locks = os_vif._LOCKS
+        held = None
+        if locks is not None:
+            held = await _acquire(locks, os_vif._lock_names([plugin_vif]),
+                                  deadline)
+        succeeded = False
+        try:
+            begun = os_vif._journal_begin(operation,
+                                          [(plugin_name, vif, instance)])
+            started = metrics.start()
+            try:
+                await _bounded(async_hook(plugin_vif, *args), deadline)
+                succeeded = True
+            finally:
+                metrics.observe(metrics.PLUGIN, started, plugin=plugin_name,
+                                operation=operation)
+                os_vif._journal_end(begun, succeeded)
+        finally:
+            if held is not None:
+                held.release()
+    else:
+        hook = metrics.instrument(sync_hook, plugin_name, operation)
+        guarded = os_vif._LOCKS is not None or os_vif._JOURNAL is not None
+        if guarded or deadline is not None:
+            future = os_vif._EXECUTOR.spawn(
+                _run_journaled, operation, plugin_name, plugin, vif,
+                plugin_vif, instance, deadline, hook, *args)
+        else:
+            future = os_vif._EXECUTOR.submit(plugin_name, plugin, hook,
+                                             plugin_vif, *args)
+        # A hook still running when the deadline passes is abandoned, as
+        # with `os_vif.plug()`.
+        await _bounded(asyncio.wrap_future(future), deadline)
+
+
+async def _coalesced(request, vif, operation, timeout, *args):
+    """
+    Makes the request through the library's coalescer on a worker of the
+    executor, as coalesced requests run in the thread that makes them, and
+    awaits its completion.
+    """
+    deadline = os_vif._unrouted_deadline(vif, operation, timeout)
+    future = os_vif._EXECUTOR.spawn(request, vif, *args, deadline=deadline)
+    await _bounded(asyncio.wrap_future(future), deadline)
+
+
+def _route(vif, operation):
+    try:
+        return os_vif._route(vif)
+    except os_vif.exception.NoMatchingPlugin as err:
+        metrics.count_failure(err, vif.plugin, operation)
+        raise
+
+
+async def aplug(vif, instance, timeout=None):
+    if os_vif._EXT_MANAGER is None:
+        raise os_vif.exception.LibraryNotInitialized()
+    coalescer = os_vif._COALESCER
+    if coalescer is not None:
+        return await _coalesced(coalescer.plug, vif, 'plug', timeout,
+                                instance)
+
+    plugin_name, plugin, plugin_vif = _route(vif, 'plug')
+    deadline = os_vif._deadline(plugin_name, 'plug', vif, timeout)
+
+    try:
+        LOG.debug("Plugging vif %s", vif)
+        await _call(plugin_name, plugin, 'plug',
+                    getattr(plugin, 'aplug', None), plugin.plug, vif,
+                    plugin_vif, instance, deadline, instance)
+        LOG.info(_LI("Successfully plugged vif %s"),
+                 logutils.identity(vif))
+    except os_vif.exception.PlugTimeout as err:
+        LOG.error(_LE("Failed to plug vif %(vif)s. Got error: %(err)s"),
+                  {'vif': logutils.identity(vif), 'err': err})
+        metrics.count_failure(err, plugin_name, 'plug')
+        raise
+    except processutils.ProcessExecutionError as err:
+        LOG.error(_LE("Failed to plug vif %(vif)s. Got error: %(err)s"),
+                  {'vif': logutils.identity(vif), 'err': err})
+        exc = os_vif.exception.PlugException(vif=vif, err=err)
+        metrics.count_failure(exc, plugin_name, 'plug')
+        raise exc
+
+
+async def aunplug(vif, timeout=None):
+    if os_vif._EXT_MANAGER is None:
+        raise os_vif.exception.LibraryNotInitialized()
+    coalescer = os_vif._COALESCER
+    if coalescer is not None:
+        return await _coalesced(coalescer.unplug, vif, 'unplug', timeout)
+
+    plugin_name, plugin, plugin_vif = _route(vif, 'unplug')
+    deadline = os_vif._deadline(plugin_name, 'unplug', vif, timeout)
+
+    try:
+        LOG.debug("Unplugging vif %s", vif)
+        await _call(plugin_name, plugin, 'unplug',
+                    getattr(plugin, 'aunplug', None), plugin.unplug, vif,
+                    plugin_vif, None, deadline)
+        LOG.info(_LI("Successfully unplugged vif %s"),
+                 logutils.identity(vif))
+    except os_vif.exception.PlugTimeout as err:
+        LOG.error(_LE("Failed to unplug vif %(vif)s. Got error: %(err)s"),
+                  {'vif': logutils.identity(vif), 'err': err})
+        metrics.count_failure(err, plugin_name, 'unplug')
+        raise
+    except processutils.ProcessExecutionError as err:
+        LOG.error(_LE("Failed to unplug vif %(vif)s. Got error: %(err)s"),
+                  {'vif': logutils.identity(vif), 'err': err})
+        exc = os_vif.exception.UnplugException(vif=vif, err=err)
+        metrics.count_failure(exc, plugin_name, 'unplug')
+        raise exc
@@ -0,0 +1,227 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Coalescing of plug and unplug requests made on the same VIF.
+
+When a port flaps, plug, unplug and plug again may be asked for the same
+VIF within milliseconds. A `Coalescer` runs at most one operation per VIF
+id at a time. Requests made while one is running wait, and only the last
+of them runs once it completes; the requests it replaces are not run:
+
+    coalescer = os_vif.coalescer.Coalescer()
+    coalescer.plug(vif, instance)
+    coalescer.unplug(vif)
+
+`os_vif.plug()`, `os_vif.unplug()` and their coroutine versions go through
+a coalescer of the library when `os_vif.initialize()` is given the
+`coalesce_requests` option.
+
+A request that is not run returns, or raises, only once the request that
+replaced it has completed, so that the VIF is in its final state by then:
+
+* if the request that replaced it is the same operation, it returns or
+  raises what that request did.
+* otherwise it raises `exception.OperationSuperseded`.
+
+A `deadline` keyword argument, an `os_vif.deadline.Deadline`, bounds the
+wait of a request for its turn or for the request that replaced it, and is
+passed on to the plug or unplug function. A request still waiting when the
+deadline passes is withdrawn, and raises `exception.PlugTimeout`.
+"""
+
+import sys
+import threading
+
+import six
+
+from os_vif import exception
+from os_vif import metrics
+
+PLUG = 'plug'
+UNPLUG = 'unplug'
+
+
+class _Request(object):
+    """A plug or unplug waiting to run, or to be replaced."""
+
+    __slots__ = ('operation', 'args', 'kwargs', 'replaced', 'group', 'event',
+                 'turn', 'exc_info', 'final')
+
+    def __init__(self, operation, args, kwargs):
+        self.operation = operation
+        self.args = args
+        self.kwargs = kwargs
+        # Requests this one replaced, resolved once it completes.
+        self.replaced = []
+        # The list of replaced requests this one is in, once replaced.
+        self.group = None
+        self.event = threading.Event()
+        # Set when the request is to run in the thread that made it.
+        self.turn = False
+        self.exc_info = None
+        # The request that ran in place of this one.
+        self.final = None
+
+
+class Coalescer(object):
+    """
+    Runs plug and unplug requests, merging the ones made on the same VIF
+    while an operation on it is already running.
+
+    Requests are run in the thread that makes them, and a coalescer can be
+    used from multiple threads or greenthreads. VIFs without an id are
+    never coalesced.
+    """
+
+    def __init__(self, plug=None, unplug=None):
+        """
+        Constructs the Coalescer object.
+
+        :param plug: Callable taking a VIF and an instance that plugs the
+                     VIF. Defaults to `os_vif.plug()`.
+        :param unplug: Callable taking a VIF that unplugs the VIF. Defaults
+                       to `os_vif.unplug()`.
+        """
+        import os_vif
+
+        self._funcs = {PLUG: plug or os_vif.plug,
+                       UNPLUG: unplug or os_vif.unplug}
+        self._lock = threading.Lock()
+        # Maps the id of each VIF with a running operation to the request
+        # waiting to run after it, or None.
+        self._waiting = {}
+
+    def plug(self, vif, instance, **kwargs):
+        """
+        Plugs the VIF, unless a later request on the same VIF replaces
+        this one before it starts.
+
+        :param vif: `os_vif.objects.VIF` object.
+        :param instance: `nova.objects.Instance` object.
+        :param kwargs: Passed to the plug function, such as the `timeout`
+                       of `os_vif.plug()`. A `deadline` also bounds the wait
+                       of the request.
+        :raises `exception.OperationSuperseded` if the VIF was unplugged
+                instead, `exception.PlugTimeout` if the deadline passed
+                while the request waited, and any exception the plug
+                function raises.
+        """
+        self._submit(vif, _Request(PLUG, (vif, instance), kwargs))
+
+    def unplug(self, vif, **kwargs):
+        """
+        Unplugs the VIF, unless a later request on the same VIF replaces
+        this one before it starts.
+
+        :param vif: `os_vif.objects.VIF` object.
+        :param kwargs: Passed to the unplug function, as for `plug()`.
+        :raises `exception.OperationSuperseded` if the VIF was plugged
+                instead, `exception.PlugTimeout` as for `plug()`, and any
+                exception the unplug function raises.
+        """
+        self._submit(vif, _Request(UNPLUG, (vif,), kwargs))
+
+    def pending(self):
+        """Returns the number of VIFs with an operation running."""
+        with self._lock:
+            return len(self._waiting)
+
+    def _submit(self, vif, request):
+        vif_id = getattr(vif, 'id', None)
+        if vif_id is None:
+            self._funcs[request.operation](*request.args, **request.kwargs)
+            return
+
+        previous = None
+        with self._lock:
+            if vif_id in self._waiting:
+                previous = self._waiting[vif_id]
+                if previous is not None:
+                    request.replaced = previous.replaced
+                    request.replaced.append(previous)
+                    previous.replaced = []
+                    previous.group = request.replaced
+                self._waiting[vif_id] = request
+            else:
+                self._waiting[vif_id] = None
+                request.turn = True
+
+        if not request.turn:
+            if previous is not None:
+                metrics.increment(metrics.COALESCED,
+                                  operation=previous.operation)
+            self._wait(vif_id, request)
+        if request.turn:
+            self._run(vif_id, request)
+        self._outcome(request)
+
+    def _wait(self, vif_id, request):
+        """
+        Waits for the turn of the request, or for the request that replaced
+        it to complete, within the deadline of the request if it has one.
+
+        :raises `exception.PlugTimeout` if the deadline passes first, after
+                withdrawing the request.
+        """
+        deadline = request.kwargs.get('deadline')
+        if deadline is None:
+            request.event.wait()
+            return
+        if request.event.wait(deadline.remaining()):
+            return
+        with self._lock:
+            if request.turn or request.final is not None:
+                # The request was resolved as the deadline passed.
+                return
+            if request.group is not None:
+                request.group.remove(request)
+            elif request.replaced:
+                # The latest request this one replaced waits in its place.
+                successor = request.replaced.pop()
+                successor.replaced = request.replaced
+                successor.group = None
+                self._waiting[vif_id] = successor
+            else:
+                self._waiting[vif_id] = None
+        deadline.cancel()
+        deadline.check()
+
+    def _run(self, vif_id, request):
+        try:
+            self._funcs[request.operation](*request.args, **request.kwargs)
+        except Exception:
+            request.exc_info = sys.exc_info()
+        finally:
+            with self._lock:
+                following = self._waiting[vif_id]
+                if following is None:
+                    del self._waiting[vif_id]
+                else:
+                    self._waiting[vif_id] = None
+                    following.turn = True
+                resolved = request.replaced
+                request.replaced = []
+                for replaced in resolved:
+                    replaced.final = request
+            if following is not None:
+                following.event.set()
+            for replaced in resolved:
+                replaced.event.set()
+
+    def _outcome(self, request):
+        final = request.final or request
+        if final.operation != request.operation:
+            raise exception.OperationSuperseded(
+                operation=request.operation, vif_id=final.args[0].id,
+                final=final.operation)
+        if final.exc_info is not None:
+            six.reraise(*final.exc_info)
@@ -0,0 +1,157 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time bounds of plug and unplug operations.
+
+`os_vif.plug()`, `os_vif.unplug()`, `os_vif.prepare()`,
+`os_vif.activate()` and their coroutine versions run a plugin under a
+`Deadline` when a timeout applies to the call, which the plugin gets from
+`current()`. The deadline starts before the locks on the VIF's resources
+are taken, and bounds the wait for them, for a concurrency slot of the
+plugin and, when requests are coalesced, for a running operation on the
+same VIF. Plugins waiting on something outside of os_vif can bound the
+wait with `Deadline.remaining()`, and register a callback with
+`Deadline.on_cancel()` to stop outstanding work, such as a child process,
+when the deadline passes. Coroutine hooks of plugins are cancelled instead,
+and do not get their deadline from `current()`. The wait for root commands
+run through `PluginBase.execute_privileged()`, merged with the commands of
+other callers or not, is bounded already, but these commands are abandoned
+rather than killed: they run as root, through sudo, rootwrap or the
+rootwrap daemon, which an unprivileged process cannot signal.
+"""
+
+import threading
+import time
+
+from oslo_log import log as logging
+
+from os_vif import exception
+import os_vif.i18n
+from os_vif import logutils
+
+_LE = os_vif.i18n._LE
+
+LOG = logging.getLogger(__name__)
+
+_now = getattr(time, 'monotonic', time.time)
+
+# The deadline of the operation the current thread is running.
+_context = threading.local()
+
+
+class Deadline(object):
+    """
+    The point in time by which a VIF operation must complete.
+    """
+
+    def __init__(self, timeout, operation, vif):
+        """
+        Constructs the Deadline object, which starts counting right away.
+
+        :param timeout: Number of seconds the operation may take.
+        :param operation: Name of the operation, such as 'plug'.
+        :param vif: `os_vif.objects.VIF` object the operation acts on.
+        """
+        self.timeout = timeout
+        self.operation = operation
+        self.vif = vif
+        self.expires = _now() + timeout
+        self.cancelled = False
+        self._callbacks = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Returns the number of seconds left, 0 once the deadline passed."""
+        return max(self.expires - _now(), 0.0)
+
+    @property
+    def expired(self):
+        return self.cancelled or _now() >= self.expires
+
+    def error(self):
+        """Returns the `exception.PlugTimeout` to raise once it passed."""
+        return exception.PlugTimeout(timeout=self.timeout,
+                                     operation=self.operation,
+                                     vif=logutils.identity(self.vif))
+
+    def check(self):
+        """
+        :raises `exception.PlugTimeout` if the deadline passed.
+        """
+        if self.expired:
+            raise self.error()
+
+    def on_cancel(self, callback):
+        """
+        Registers a callable to call, from another thread, when the
+        deadline passes. It is called straight away if it already passed.
+
+        :returns: callable unregistering `callback`, once the work it would
+                  stop is done.
+        """
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                if self._timer is None:
+                    self._timer = threading.Timer(self.remaining(),
+                                                  self.cancel)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return lambda: self._discard(callback)
+        callback()
+        return lambda: None
+
+    def _discard(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def cancel(self):
+        """
+        Marks the deadline as passed, and calls the callbacks registered
+        with `on_cancel()`.
+        """
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                LOG.exception(_LE("Unable to cancel the %(operation)s of "
+                                  "vif %(vif)s"),
+                              {'operation': self.operation,
+                               'vif': self.vif.id})
+
+    def __enter__(self):
+        self._previous = getattr(_context, 'deadline', None)
+        _context.deadline = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _context.deadline = self._previous
+        with self._lock:
+            timer, self._timer = self._timer, None
+            self._callbacks = []
+        if timer is not None:
+            timer.cancel()
+
+
+def current():
+    """
+    Returns the `Deadline` of the operation running in the current thread,
+    or None if it has no time bound.
+    """
+    return getattr(_context, 'deadline', None)
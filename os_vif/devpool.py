@@ -0,0 +1,331 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Pool of pre-created veth pairs and bridges.
+
+Creating a device costs a round trip to the kernel and, for a bridge, the
+setup of its forwarding state. A `DevicePool` creates unattached veth
+pairs and bridges ahead of time, under temporary names, and hands them to
+plugins at plug time by renaming them to the names a `VIF` uses, such as
+`VIF.veth_pair_names` and `VIF.br_name`. Pooled devices are left down, so
+that they can be renamed, and the plugin brings them up as it would a
+device it created.
+
+The pool is refilled by a background thread. Taking a device that leaves
+fewer than `low_watermark` devices of its kind wakes the thread, which
+creates devices until there are `size` of each kind again. A plugin that
+finds the pool empty creates the device itself. Before filling the pool
+for the first time, the thread deletes the devices with pool names left
+over by a process that did not shut its pool down, so only one process
+per host may keep a pool.
+
+The pool is enabled by the `device_pool_size` option of
+`os_vif.initialize()`, and returned to plugins by `get_pool()`. Plugins
+use it with, for instance::
+
+    pool = devpool.get_pool()
+    if pool is None or not pool.assign_veth_pair(vif):
+        netlink.ensure_veth_pair(ipr, *vif.veth_pair_names)
+"""
+
+import atexit
+import collections
+import errno
+import threading
+import uuid
+
+from oslo_log import log as logging
+
+from os_vif import exception
+import os_vif.i18n
+from os_vif import metrics
+from os_vif import netlink
+
+_LE = os_vif.i18n._LE
+_LI = os_vif.i18n._LI
+_LW = os_vif.i18n._LW
+
+LOG = logging.getLogger(__name__)
+
+VETH = 'veth'
+BRIDGE = 'bridge'
+
+# Prefixes of the temporary names of pooled devices, per kind. The rest of
+# the name is random, up to the length of the names os_vif gives devices.
+_PREFIXES = {
+    VETH: ('ovpv', 'ovpw'),
+    BRIDGE: ('ovpb',),
+}
+_SUFFIX_LEN = 10
+
+DEFAULT_SIZE = 8
+
+_POOL = None
+
+
+class DevicePool(object):
+    """
+    Keeps up to `size` unattached veth pairs and bridges on the host, for
+    plugins to take instead of creating devices at plug time.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, low_watermark=None, mtu=None,
+                 kinds=(VETH, BRIDGE), ipr=None):
+        """
+        Constructs the DevicePool object. No device is created until
+        `start()` or `fill()` is called.
+
+        :param size: Number of devices of each kind to keep, the high
+                     watermark.
+        :param low_watermark: Number of devices of a kind below which the
+                     pool is refilled. Defaults to half of `size`.
+        :param mtu: Optional MTU to set on pooled devices.
+        :param kinds: Kinds of devices to keep, among `VETH` and `BRIDGE`.
+        :param ipr: Optional `os_vif.netlink.IPRoute` object to use.
+        """
+        self.size = size
+        self.low_watermark = (size // 2 if low_watermark is None
+                              else low_watermark)
+        self.mtu = mtu
+        self.kinds = tuple(kinds)
+        self._ipr = ipr
+        self._free = dict((kind, collections.deque()) for kind in self.kinds)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    @property
+    def ipr(self):
+        if self._ipr is None:
+            self._ipr = netlink.IPRoute()
+        return self._ipr
+
+    def free(self, kind):
+        """Returns the number of pooled devices of a kind."""
+        with self._lock:
+            return len(self._free[kind])
+
+    def start(self):
+        """Starts the thread refilling the pool, which fills it first."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._refill,
+                                        name='os_vif-devpool')
+        self._thread.daemon = True
+        self._thread.start()
+        self._wake.set()
+
+    def _refill(self):
+        reclaimed = False
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                if not reclaimed:
+                    self.reclaim()
+                    reclaimed = True
+                self.fill()
+            except Exception:
+                # The thread goes on, to try again the next time the pool
+                # runs low.
+                LOG.exception(_LE("Unable to refill the os_vif device "
+                                  "pool"))
+
+    def reclaim(self):
+        """
+        Deletes the devices with pool names that are not in the pool, such
+        as the ones a previous process left behind.
+
+        :returns: number of devices deleted, a veth pair counting once.
+        """
+        prefixes = tuple(prefix for kind in self.kinds
+                         for prefix in _PREFIXES[kind])
+        with self._lock:
+            pooled = set(name for pool in self._free.values()
+                         for names in pool for name in names)
+        deleted = 0
+        for name in sorted(self.ipr.list_links()):
+            if not name.startswith(prefixes) or name in pooled:
+                continue
+            try:
+                self.ipr.delete_link(name)
+            except exception.NetlinkError as err:
+                # The peer of a veth is gone with the veth.
+                if err.kwargs['errno'] != errno.ENODEV:
+                    LOG.warning(_LW("Unable to delete %(name)s left over "
+                                    "in the os_vif device pool: %(err)s"),
+                                {'name': name, 'err': err})
+                continue
+            deleted += 1
+        if deleted:
+            LOG.info(_LI("Deleted %d devices left over in the os_vif device "
+                         "pool"), deleted)
+        return deleted
+
+    def fill(self):
+        """
+        Creates devices until the pool has `size` devices of each kind. A
+        device that cannot be created, including when netlink cannot be
+        used at all, is logged, and stops the fill until the next time the
+        pool runs low.
+
+        :returns: number of devices created.
+        """
+        created = 0
+        for kind in self.kinds:
+            while not self._stopped and self.free(kind) < self.size:
+                try:
+                    names = self._create(kind)
+                except (exception.NetlinkError, IOError, OSError) as err:
+                    LOG.warning(_LW("Unable to create a %(kind)s for the "
+                                    "os_vif device pool: %(err)s"),
+                                {'kind': kind, 'err': err})
+                    return created
+                with self._lock:
+                    self._free[kind].append(names)
+                created += 1
+        return created
+
+    def _create(self, kind):
+        suffix = uuid.uuid4().hex[:_SUFFIX_LEN]
+        names = tuple(prefix + suffix for prefix in _PREFIXES[kind])
+        if kind == VETH:
+            self.ipr.add_veth(*names)
+        else:
+            self.ipr.add_bridge(names[0])
+        if self.mtu:
+            try:
+                for name in names:
+                    self.ipr.set_mtu(name, self.mtu)
+            except (exception.NetlinkError, IOError, OSError):
+                netlink.delete_link_if_exists(self.ipr, names[0])
+                raise
+        return names
+
+    def _take(self, kind):
+        with self._lock:
+            pool = self._free.get(kind)
+            names = pool.popleft() if pool else None
+            low = pool is not None and len(pool) < self.low_watermark
+        if low and self._thread is not None:
+            self._wake.set()
+        if metrics.enabled():
+            metrics.increment(metrics.DEVICE_POOL, kind=kind,
+                              outcome='miss' if names is None else 'hit')
+        return names
+
+    def _assign(self, kind, new_names):
+        names = self._take(kind)
+        if names is None:
+            return False
+        # The name the pooled device has at each point, to delete it if a
+        # rename fails.
+        current = names[0]
+        try:
+            for name, new_name in zip(names, new_names):
+                self.ipr.rename(name, new_name)
+                if name == names[0]:
+                    current = new_name
+        except exception.NetlinkError as err:
+            LOG.warning(_LW("Unable to rename %(kind)s %(name)s from the "
+                            "os_vif device pool to %(new_name)s: %(err)s"),
+                        {'kind': kind, 'name': names[0],
+                         'new_name': new_names[0], 'err': err})
+            netlink.delete_link_if_exists(self.ipr, current)
+            return False
+        return True
+
+    def assign_veth_pair(self, vif, names=None):
+        """
+        Renames a pooled veth pair after a VIF.
+
+        :param vif: `os_vif.objects.VIF` object.
+        :param names: Optional (name, peer name) tuple to use instead of
+                      `vif.veth_pair_names`.
+        :returns: True if the pair was taken from the pool, False if the
+                  pool had none, or the pair could not be renamed, in which
+                  case the caller creates the pair itself.
+        """
+        return self._assign(VETH, names or vif.veth_pair_names)
+
+    def assign_bridge(self, vif, name=None):
+        """
+        Renames a pooled bridge after a VIF.
+
+        :param vif: `os_vif.objects.VIF` object.
+        :param name: Optional name to use instead of `vif.br_name`.
+        :returns: True if the bridge was taken from the pool, False if the
+                  pool had none, or the bridge could not be renamed, in
+                  which case the caller creates the bridge itself.
+        """
+        return self._assign(BRIDGE, (name or vif.br_name,))
+
+    def shutdown(self):
+        """
+        Stops the refill thread and deletes the devices left in the pool.
+        Devices already assigned to VIFs are left alone.
+        """
+        self._stopped = True
+        if self._thread is not None:
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            pooled = [names[0] for pool in self._free.values()
+                      for names in pool]
+            for pool in self._free.values():
+                pool.clear()
+        for name in pooled:
+            try:
+                netlink.delete_link_if_exists(self.ipr, name)
+            except exception.NetlinkError as err:
+                LOG.warning(_LW("Unable to delete %(name)s from the os_vif "
+                                "device pool: %(err)s"),
+                            {'name': name, 'err': err})
+
+
+def _shutdown():
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown()
+        _POOL = None
+
+
+def configure(size=0, low_watermark=None, mtu=None):
+    """
+    Replaces the pool returned by `get_pool()`, deleting the devices of the
+    previous one, and starts filling the new one. Called by
+    `os_vif.initialize()`. The pool is deleted when the process exits.
+
+    :param size: Number of devices of each kind to keep. 0 disables the
+                 pool.
+    :param low_watermark: Number of devices of a kind below which the pool
+                 is refilled. Defaults to half of `size`.
+    :param mtu: Optional MTU to set on pooled devices.
+    """
+    global _POOL
+    _shutdown()
+    if size:
+        _POOL = DevicePool(size, low_watermark=low_watermark, mtu=mtu)
+        _POOL.start()
+    return _POOL
+
+
+def get_pool():
+    """Returns the configured `DevicePool`, or None if it is disabled."""
+    return _POOL
+
+
+atexit.register(_shutdown)
@@ -51,13 +51,65 @@ class NoMatchingPlugin(ExceptionBase):
     msg_fmt = _("No VIF plugin was found with the name %(plugin_name)s")
 
 
-class PlugException(ExceptionBase):
+class UnsupportedVIFObject(NoMatchingPlugin):
+    msg_fmt = _("VIF plugin %(plugin_name)s does not support VIF object "
+                "%(vif_type)s version %(version)s")
+
+
+class _PerVIFDetailMixin(object):
+    """
+    Per-VIF detail of failed operations acting on several VIFs, such as
+    those of an `os_vif.transaction()`, passed as the `results` and
+    `rollback` keyword arguments.
+    """
+
+    @property
+    def results(self):
+        """
+        List of the `os_vif.result.VIFResult` objects of the VIFs the
+        operation acted on.
+        """
+        return self.kwargs.get('results') or []
+
+    @property
+    def rollback(self):
+        """
+        List of the `os_vif.result.VIFResult` objects of the VIFs unplugged
+        to roll back the operation.
+        """
+        return self.kwargs.get('rollback') or []
+
+
+class PlugException(_PerVIFDetailMixin, ExceptionBase):
     msg_fmt = _("Failed to plug VIF %(vif)s. Got error: %(err)s")
 
 
-class UnplugException(ExceptionBase):
+class UnplugException(_PerVIFDetailMixin, ExceptionBase):
     msg_fmt = _("Failed to unplug VIF %(vif)s. Got error: %(err)s")
 
 
+class PlugTimeout(_PerVIFDetailMixin, ExceptionBase):
+    msg_fmt = _("Timed out after %(timeout)s seconds trying to %(operation)s "
+                "VIF %(vif)s")
+
+
+class OperationSuperseded(ExceptionBase):
+    msg_fmt = _("The %(operation)s of VIF %(vif_id)s was not run, because a "
+                "later request to %(final)s it replaced it")
+
+
+class NetlinkError(ExceptionBase):
+    msg_fmt = _("Netlink request to %(operation)s device %(device)s failed: "
+                "%(err)s")
+
+
+class ObjectDecodingError(ExceptionBase):
+    msg_fmt = _("Unable to decode os_vif objects: %(reason)s")
+
+
+class JournalError(ExceptionBase):
+    msg_fmt = _("Unable to use os_vif journal %(path)s: %(reason)s")
+
+
 class NetworkMissingPhysicalNetwork(ExceptionBase):
     msg_fmt = _("Physical network is missing for network %(network_uuid)s")
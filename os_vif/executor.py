@@ -0,0 +1,238 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import sys
+import threading
+
+import futurist
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_PLUGIN_CONCURRENCY = 8
+
+
+def _green_threads_enabled():
+    # If eventlet has not been imported, nothing can have monkey-patched
+    # the thread module, so don't pay for importing it.
+    if 'eventlet' not in sys.modules:
+        return False
+    from eventlet import patcher
+    return patcher.is_monkey_patched('thread')
+
+
+def _new_pool(max_workers):
+    if _green_threads_enabled():
+        return futurist.GreenThreadPoolExecutor(max_workers=max_workers)
+    return futurist.ThreadPoolExecutor(max_workers=max_workers)
+
+
+class _Slots(object):
+    """
+    The concurrency slots of a plugin. Slots are handed over in the order
+    they were asked for, both to callers waiting in `acquire()` and to work
+    queued with `schedule()`, which only goes to the worker pool once it
+    has a slot, so that it never holds a worker while waiting for one.
+    """
+
+    def __init__(self, limit, pool):
+        self._free = limit
+        self._pool = pool
+        # Callables waking up a caller, or starting queued work, once
+        # handed a slot.
+        self._waiting = collections.deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """
+        Takes a slot, waiting for one to be free if needed.
+
+        :returns: False if the timeout passed before a slot was free.
+        """
+        with self._lock:
+            if self._free and not self._waiting:
+                self._free -= 1
+                return True
+            event = threading.Event()
+            wake = event.set
+            self._waiting.append(wake)
+        if event.wait(timeout):
+            return True
+        with self._lock:
+            if wake in self._waiting:
+                self._waiting.remove(wake)
+                return False
+        # The slot was handed over as the wait timed out.
+        return True
+
+    def release(self):
+        """Hands the slot over to the next waiter, or frees it."""
+        with self._lock:
+            if not self._waiting:
+                self._free += 1
+                return
+            wake = self._waiting.popleft()
+        wake()
+
+    def schedule(self, future, func, args, kwargs):
+        """
+        Runs `func` on the worker pool once a slot is free, and resolves
+        `future` with its outcome.
+        """
+        work = (future, func, args, kwargs)
+        with self._lock:
+            if not self._free or self._waiting:
+                self._waiting.append(lambda: self._start(work))
+                return
+            self._free -= 1
+        self._start(work)
+
+    def _start(self, work):
+        try:
+            self._pool.submit(self._call, *work)
+        except RuntimeError as err:
+            # The pool was shut down.
+            self.release()
+            if work[0].set_running_or_notify_cancel():
+                work[0].set_exception(err)
+
+    def _call(self, future, func, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            self.release()
+            return
+        try:
+            result = func(*args, **kwargs)
+        except Exception as err:
+            self.release()
+            future.set_exception(err)
+        else:
+            self.release()
+            future.set_result(result)
+
+
+class PlugExecutor(object):
+    """
+    Runs VIF operations on a bounded pool of workers, limiting the number of
+    operations that run concurrently inside any single plugin.
+
+    Work submitted for a plugin only goes to the pool once the plugin has a
+    free concurrency slot, so that a busy plugin does not hold workers the
+    other plugins need. Work spawned to wait for something, such as locks,
+    runs on a pool of its own for the same reason.
+
+    Greenthread pools are used when the thread module has been
+    monkey-patched by eventlet, and native thread pools otherwise.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS,
+                 plugin_concurrency=DEFAULT_PLUGIN_CONCURRENCY):
+        """
+        Constructs the PlugExecutor object.
+
+        :param max_workers: Size of the worker pool shared by all plugins.
+        :param plugin_concurrency: Concurrency limit applied to thread safe
+                                   plugins that do not declare their own
+                                   `max_concurrency`.
+        """
+        self._pool = _new_pool(max_workers)
+        self._max_workers = max_workers
+        # Created on first use, as most callers never spawn work.
+        self._spawned = None
+        self._plugin_concurrency = plugin_concurrency
+        self._limits = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def concurrency(self, plugin_name, plugin):
+        """
+        Returns the number of operations the named plugin may run at once,
+        as declared in the `os_vif.plugin.PluginInfo` it describes itself
+        with.
+        """
+        try:
+            return self._limits[plugin_name]
+        except KeyError:
+            pass
+        with self._lock:
+            if plugin_name not in self._limits:
+                info = plugin.describe()
+                limit = 1
+                if info.thread_safe:
+                    limit = info.max_concurrency or self._plugin_concurrency
+                self._limits[plugin_name] = max(int(limit), 1)
+                self._slots[plugin_name] = _Slots(self._limits[plugin_name],
+                                                  self._pool)
+            return self._limits[plugin_name]
+
+    def run(self, plugin_name, plugin, func, *args, **kwargs):
+        """
+        Calls `func` in the calling thread, once the named plugin has a free
+        concurrency slot.
+        """
+        self.concurrency(plugin_name, plugin)
+        slots = self._slots[plugin_name]
+        slots.acquire()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            slots.release()
+
+    def run_within(self, deadline, plugin_name, plugin, func, *args,
+                   **kwargs):
+        """
+        Calls `func` in the calling thread, once the named plugin has a free
+        concurrency slot, unless the deadline passes first.
+
+        :param deadline: `os_vif.deadline.Deadline` bounding the wait.
+        :raises `exception.PlugTimeout` if the deadline passed before a slot
+                was free.
+        """
+        self.concurrency(plugin_name, plugin)
+        slots = self._slots[plugin_name]
+        if not slots.acquire(timeout=deadline.remaining()):
+            raise deadline.error()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            slots.release()
+
+    def submit(self, plugin_name, plugin, func, *args, **kwargs):
+        """
+        Schedules `func` to run on the worker pool, once the named plugin
+        has a free concurrency slot. Cancelling the future before then
+        drops `func`.
+
+        :returns: A `futurist.Future` for the result of `func`.
+        """
+        self.concurrency(plugin_name, plugin)
+        future = futurist.Future()
+        self._slots[plugin_name].schedule(future, func, args, kwargs)
+        return future
+
+    def spawn(self, func, *args, **kwargs):
+        """
+        Schedules `func` to run right away, on a pool of workers of its own
+        standing in for a caller that may wait, for instance for the locks
+        an operation needs. `func` is expected to call `run()` itself.
+
+        :returns: A `futurist.Future` for the result of `func`.
+        """
+        with self._lock:
+            if self._spawned is None:
+                self._spawned = _new_pool(self._max_workers)
+        return self._spawned.submit(func, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            spawned = self._spawned
+        if spawned is not None:
+            spawned.shutdown(wait=wait)
+        self._pool.shutdown(wait=wait)
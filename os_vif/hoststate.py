@@ -0,0 +1,164 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+from oslo_concurrency import processutils
+from oslo_log import log as logging
+
+import os_vif.i18n
+from os_vif import netlink
+from os_vif import privileged
+
+_LW = os_vif.i18n._LW
+
+LOG = logging.getLogger(__name__)
+
+# States a plugin can report for a VIF in `PluginState.states`.
+VIF_STATE_PLUGGED = 'plugged'
+VIF_STATE_MISSING = 'missing'
+VIF_STATE_STALE = 'stale'
+
+# Key of the external_ids entry of an OVS interface holding the VIF id.
+OVS_IFACE_ID = 'iface-id'
+
+
+class Link(object):
+    """A network device on the host."""
+
+    __slots__ = ('name', 'index', 'kind', 'mtu', 'up', 'master')
+
+    def __init__(self, name, index, kind=None, mtu=None, up=False,
+                 master=None):
+        self.name = name
+        self.index = index
+        self.kind = kind
+        self.mtu = mtu
+        self.up = up
+        # Name of the bridge the device is enslaved to, or None.
+        self.master = master
+
+    def __repr__(self):
+        return 'Link(%s)' % ','.join('%s=%r' % (name, getattr(self, name))
+                                     for name in self.__slots__)
+
+
+def _ovs_map(value):
+    # ovs-vsctl's JSON output encodes maps as ["map", [[key, value], ...]].
+    if isinstance(value, list) and len(value) == 2 and value[0] == 'map':
+        return dict(value[1])
+    return {}
+
+
+class HostState(object):
+    """
+    Snapshot of the network state of the host that plugins compare VIFs
+    against: its network devices, which bridges they are enslaved to, and
+    its Open vSwitch interfaces.
+    """
+
+    def __init__(self, links, ovs_interfaces=None):
+        """
+        Constructs the HostState object.
+
+        :param links: Dictionary mapping device names to `Link` objects.
+        :param ovs_interfaces: Dictionary mapping the names of Open vSwitch
+                               interfaces to their external_ids, or None if
+                               Open vSwitch could not be queried.
+        """
+        self.links = links
+        self.ovs_interfaces = ovs_interfaces
+        self._ovs_by_vif_id = {}
+        for name, external_ids in (ovs_interfaces or {}).items():
+            vif_id = external_ids.get(OVS_IFACE_ID)
+            if vif_id:
+                self._ovs_by_vif_id[vif_id] = name
+        self._ports = {}
+        for link in links.values():
+            if link.master is not None:
+                self._ports.setdefault(link.master, []).append(link.name)
+
+    @classmethod
+    def capture(cls, ipr=None, service=None):
+        """
+        Takes a snapshot of the host, with one netlink request and, where
+        Open vSwitch is installed, one `ovs-vsctl` command.
+
+        :param ipr: Optional `netlink.IPRoute` to list devices with.
+        :param service: Optional `privileged.PrivilegedService` to run
+                        `ovs-vsctl` with. Defaults to the shared one.
+        """
+        if ipr is None:
+            with netlink.IPRoute() as ipr:
+                raw_links = ipr.list_links()
+        else:
+            raw_links = ipr.list_links()
+        names = dict((link['index'], name)
+                     for name, link in raw_links.items())
+        links = {}
+        for name, link in raw_links.items():
+            links[name] = Link(name, link['index'], kind=link['kind'],
+                               mtu=link['mtu'], up=link['up'],
+                               master=names.get(link['master']))
+
+        if service is None:
+            service = privileged.get_service()
+        try:
+            out, _err = service.execute(
+                'ovs-vsctl', '--format=json', '--columns=name,external_ids',
+                'list', 'Interface')
+            ovs_interfaces = dict(
+                (row[0], _ovs_map(row[1]))
+                for row in json.loads(out)['data'])
+        except (OSError, processutils.ProcessExecutionError, ValueError,
+                KeyError, IndexError, TypeError) as err:
+            LOG.warning(_LW("Unable to list Open vSwitch interfaces: "
+                            "%(err)s"), {'err': err})
+            ovs_interfaces = None
+        return cls(links, ovs_interfaces=ovs_interfaces)
+
+    def link(self, name):
+        """Returns the `Link` for the named device, or None."""
+        return self.links.get(name)
+
+    def bridge_ports(self, bridge_name):
+        """Returns the names of the devices enslaved to a Linux bridge."""
+        return list(self._ports.get(bridge_name, ()))
+
+    def ovs_interface_for_vif(self, vif_id):
+        """
+        Returns the name of the Open vSwitch interface whose `iface-id`
+        external id is the VIF id, or None.
+        """
+        return self._ovs_by_vif_id.get(vif_id)
+
+
+class PluginState(object):
+    """
+    What a plugin found on the host for the VIFs it is responsible for, as
+    returned by `PluginBase.describe_state()`.
+    """
+
+    def __init__(self, states=None, extra=None):
+        """
+        Constructs the PluginState object.
+
+        :param states: Dictionary mapping the id of each VIF the plugin was
+                       asked about to VIF_STATE_PLUGGED, VIF_STATE_MISSING or
+                       VIF_STATE_STALE. VIFs left out are plugged again.
+        :param extra: List of `os_vif.objects.VIF` objects for VIFs that the
+                      plugin found plugged on the host but was not asked
+                      about. They are unplugged, so they need to carry
+                      whatever the plugin's `unplug()` uses.
+        """
+        self.states = states or {}
+        self.extra = extra or []
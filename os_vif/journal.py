@@ -0,0 +1,356 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Write-ahead journal of plug and unplug operations.
+
+The journal is an append-only file of msgpack messages. A BEGIN message is
+written, and synced to disk, before a VIF is handed to its plugin. It holds
+the operation, the name of the plugin and the VIF, encoded with
+`os_vif.objects.codec` along with the instance when the instance is an
+os_vif object. An END message is written once the plugin returns, and
+records whether the operation succeeded.
+
+END messages are not synced. Losing one in a crash only means that an
+operation that completed is replayed, which plugging and unplugging
+tolerate.
+
+Only the last operation begun on each VIF matters. An operation is pending
+when it did not succeed, because it has no END message or its END message
+records a failure, and no later operation was begun on the same VIF.
+`os_vif.recover()` replays the pending operations.
+"""
+
+import collections
+import errno
+import os
+import tempfile
+import threading
+
+import msgpack
+from oslo_log import log as logging
+
+from os_vif import exception
+import os_vif.i18n
+from os_vif.objects import codec
+
+_LW = os_vif.i18n._LW
+
+LOG = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+_MAGIC = 'os_vif-journal'
+
+# Message kinds.
+_BEGIN = 0
+_END = 1
+
+PLUG = 'plug'
+UNPLUG = 'unplug'
+
+# Number of END messages after which the journal is rewritten with only
+# the pending operations.
+DEFAULT_COMPACT_THRESHOLD = 1000
+
+
+class Entry(object):
+    """
+    An operation recorded in the journal. `failed` is True once the
+    operation ran and failed, and False while it may still be running.
+    """
+
+    __slots__ = ('seq', 'operation', 'plugin_name', 'vif_id', 'payload',
+                 'failed')
+
+    def __init__(self, seq, operation, plugin_name, vif_id, payload):
+        self.seq = seq
+        self.operation = operation
+        self.plugin_name = plugin_name
+        self.vif_id = vif_id
+        self.payload = payload
+        self.failed = False
+
+    def decode(self):
+        """
+        Returns the VIF the operation was begun on, and the instance it was
+        plugged with, or None if the instance was not recorded.
+
+        :raises `exception.ObjectDecodingError` if the payload is corrupt.
+        """
+        objs = codec.loads(self.payload)
+        return objs[0], objs[1] if len(objs) > 1 else None
+
+    def _message(self):
+        return [_BEGIN, self.seq, self.operation, self.plugin_name,
+                self.vif_id, self.payload]
+
+    def _messages(self):
+        messages = [self._message()]
+        if self.failed:
+            messages.append([_END, self.seq, False])
+        return messages
+
+    def __repr__(self):
+        return ('Entry(seq=%d, operation=%s, plugin_name=%s, vif_id=%s, '
+                'failed=%s)' % (self.seq, self.operation, self.plugin_name,
+                                self.vif_id, self.failed))
+
+
+def _pack(message):
+    return msgpack.packb(message, use_bin_type=True)
+
+
+class Journal(object):
+    """
+    Write-ahead journal kept in a file on local disk.
+
+    A journal can be used from multiple threads, but only one process may
+    use a given file at a time.
+    """
+
+    def __init__(self, path, fsync=True,
+                 compact_threshold=DEFAULT_COMPACT_THRESHOLD):
+        """
+        Opens the journal, creating the file if it does not exist.
+
+        An incomplete message at the end of the file, left by a crash in
+        the middle of a write, is cut off.
+
+        :param path: Path of the journal file.
+        :param fsync: Whether to sync BEGIN messages to disk before
+                      returning. Without it, operations begun shortly before
+                      the host itself crashes may be missing from the
+                      journal.
+        :param compact_threshold: Number of completed operations after which
+                                  the journal is compacted.
+        :raises `exception.JournalError` if the file cannot be opened or is
+                not a journal.
+        """
+        self.path = path
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        # Pending entries, keyed by VIF id, and the VIF ids of the pending
+        # entries, keyed by sequence number.
+        self._pending = collections.OrderedDict()
+        self._seqs = {}
+        self._next_seq = 1
+        self._completed = 0
+        try:
+            self._fd = self._open()
+        except (IOError, OSError) as err:
+            raise exception.JournalError(path=path, reason=err)
+
+    def _open(self):
+        journal_dir = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            size = self._load(fd)
+            if size == 0:
+                self._write(fd, _pack([_MAGIC, FORMAT_VERSION]), self.fsync)
+                self._sync_dir()
+        except Exception:
+            os.close(fd)
+            raise
+        return fd
+
+    def _load(self, fd):
+        """
+        Reads the journal, and returns the size of its complete messages,
+        cutting off anything after them.
+        """
+        unpacker = msgpack.Unpacker(raw=False, use_list=True)
+        while True:
+            data = os.read(fd, 65536)
+            if not data:
+                break
+            unpacker.feed(data)
+        end = 0
+        try:
+            for message in unpacker:
+                if end == 0:
+                    if message != [_MAGIC, FORMAT_VERSION]:
+                        raise exception.JournalError(
+                            path=self.path, reason='not an os_vif journal')
+                else:
+                    self._replay(message)
+                end = unpacker.tell()
+        except (TypeError, ValueError, IndexError) as err:
+            raise exception.JournalError(path=self.path, reason=err)
+
+        size = os.fstat(fd).st_size
+        if end != size:
+            LOG.warning(_LW("Discarding %(count)d bytes of an incomplete "
+                            "message at the end of os_vif journal "
+                            "%(path)s"), {'count': size - end,
+                                          'path': self.path})
+            os.ftruncate(fd, end)
+        return end
+
+    def _replay(self, message):
+        if message[0] == _BEGIN:
+            entry = Entry(*message[1:])
+            self._add(entry)
+            self._next_seq = max(self._next_seq, entry.seq + 1)
+        elif message[0] == _END:
+            # Journals written before outcomes were recorded only have END
+            # messages for operations that completed.
+            self._end(message[1], message[2] if len(message) > 2 else True)
+        else:
+            raise ValueError('unknown message kind %r' % message[0])
+
+    def _add(self, entry):
+        previous = self._pending.pop(entry.vif_id, None)
+        if previous is not None:
+            del self._seqs[previous.seq]
+        self._pending[entry.vif_id] = entry
+        self._seqs[entry.seq] = entry.vif_id
+
+    def _end(self, seq, succeeded):
+        if not succeeded:
+            vif_id = self._seqs.get(seq)
+            if vif_id is not None:
+                self._pending[vif_id].failed = True
+            return
+        vif_id = self._seqs.pop(seq, None)
+        if vif_id is not None:
+            del self._pending[vif_id]
+
+    def _check_open(self):
+        if self._fd is None:
+            raise IOError(errno.EBADF, 'journal %s is closed' % self.path)
+
+    def _write(self, fd, data, sync):
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+        if sync:
+            os.fsync(fd)
+
+    def _sync_dir(self):
+        if not self.fsync:
+            return
+        dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)),
+                         os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def begin(self, operation, items):
+        """
+        Records that operations are about to be performed, and returns once
+        the records are on disk.
+
+        :param operation: `PLUG` or `UNPLUG`.
+        :param items: list of (plugin_name, vif, instance) tuples, where
+                      the instance is only recorded when it is an os_vif
+                      object.
+        :returns: list of sequence numbers identifying the operations, in
+                  the same order as `items`, to pass to `end()`.
+        :raises IOError if the journal cannot be written, or was closed.
+        """
+        from os_vif.objects import base as osv_base
+
+        entries = []
+        for plugin_name, vif, instance in items:
+            objs = [vif]
+            if isinstance(instance, osv_base.TrustedConstructionMixin):
+                objs.append(instance)
+            entries.append(Entry(None, operation, plugin_name, vif.id,
+                                 codec.dumps(objs)))
+        with self._lock:
+            self._check_open()
+            for entry in entries:
+                entry.seq = self._next_seq
+                self._next_seq += 1
+            self._write(self._fd, b''.join(
+                _pack(entry._message()) for entry in entries), self.fsync)
+            for entry in entries:
+                self._add(entry)
+        return [entry.seq for entry in entries]
+
+    def end(self, seqs, failed=()):
+        """
+        Records that the operations begun as `seqs` have returned. They
+        completed unless they are also in `failed`, in which case they stay
+        pending.
+
+        :raises IOError if the journal cannot be written, or was closed.
+        """
+        failed = frozenset(failed)
+        outcomes = [(seq, seq not in failed) for seq in seqs]
+        with self._lock:
+            self._check_open()
+            self._write(self._fd, b''.join(
+                _pack([_END, seq, succeeded]) for seq, succeeded in outcomes),
+                False)
+            for seq, succeeded in outcomes:
+                self._end(seq, succeeded)
+            self._completed += len(seqs)
+            if self._completed >= self.compact_threshold:
+                self._compact()
+
+    def pending(self):
+        """
+        Returns the list of the `Entry` objects of the pending operations,
+        in the order they were begun.
+        """
+        with self._lock:
+            return sorted(self._pending.values(),
+                          key=lambda entry: entry.seq)
+
+    def compact(self):
+        """
+        Rewrites the journal with only the pending operations.
+
+        :raises IOError if the journal was closed.
+        """
+        with self._lock:
+            self._check_open()
+            self._compact()
+
+    def _compact(self):
+        data = b''.join([_pack([_MAGIC, FORMAT_VERSION])] + [
+            _pack(message) for entry in sorted(
+                self._pending.values(), key=lambda entry: entry.seq)
+            for message in entry._messages()])
+        journal_dir = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=journal_dir,
+                                            prefix='.os_vif')
+            try:
+                self._write(fd, data, self.fsync)
+            finally:
+                os.close(fd)
+            new_fd = os.open(tmp_path, os.O_RDWR | os.O_APPEND)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as err:
+            # The current file is still complete, so keep appending to it.
+            LOG.warning(_LW("Unable to compact os_vif journal %(path)s: "
+                            "%(err)s"), {'path': self.path, 'err': err})
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        self._sync_dir()
+        os.close(self._fd)
+        self._fd = new_fd
+        self._completed = 0
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
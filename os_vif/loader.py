@@ -0,0 +1,300 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import importlib
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from oslo_log import log as logging
+
+import os_vif.i18n
+import os_vif.plugin
+
+_LW = os_vif.i18n._LW
+
+LOG = logging.getLogger(__name__)
+
+# Names of the metadata directories of distributions, which hold their
+# entry_points.txt.
+_METADATA_SUFFIXES = ('.dist-info', '.egg-info', 'EGG-INFO')
+
+
+def _scan_entry_points(namespace):
+    # pkg_resources scans every distribution on sys.path when it is first
+    # imported, so only pay for that when the entry points are needed.
+    import pkg_resources
+    return dict((ep.name, ep)
+                for ep in pkg_resources.iter_entry_points(namespace))
+
+
+class _IndexedEntryPoint(object):
+    """Entry point rebuilt from a `PluginIndex` record."""
+
+    def __init__(self, name, module_name, attrs):
+        self.name = name
+        self.module_name = module_name
+        self.attrs = attrs
+
+    def resolve(self):
+        obj = importlib.import_module(self.module_name)
+        for attr in self.attrs:
+            obj = getattr(obj, attr)
+        return obj
+
+
+class PluginIndex(object):
+    """
+    On-disk cache of the plugins registered under an entry point namespace,
+    along with the `os_vif.plugin.PluginInfo` each of them describes itself
+    with.
+
+    The index is keyed by a fingerprint of the entry points files of the
+    distributions on `sys.path`. Installing, upgrading or removing a
+    distribution that registers entry points changes the fingerprint, which
+    makes the index stale, while other changes to the directories on
+    `sys.path`, such as writing bytecode, do not.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, namespace):
+        """
+        Constructs the PluginIndex object.
+
+        :param path: Path of the JSON file holding the index.
+        :param namespace: The entry point namespace that is indexed.
+        """
+        self.path = path
+        self.namespace = namespace
+
+    @staticmethod
+    def fingerprint():
+        """
+        Returns a fingerprint of the entry points of the installed
+        distributions, from the path, size and modification time of the
+        entry_points.txt file of each of them.
+        """
+        parts = [sys.version]
+        for entry in sys.path:
+            directory = entry or os.curdir
+            try:
+                names = sorted(os.listdir(directory))
+            except OSError:
+                # Missing, or a file such as a zipped egg.
+                try:
+                    mtime = os.stat(directory).st_mtime
+                except OSError:
+                    mtime = None
+                parts.append('%s:%r' % (entry, mtime))
+                continue
+            parts.append(entry)
+            for name in names:
+                if not name.endswith(_METADATA_SUFFIXES):
+                    continue
+                path = os.path.join(directory, name, 'entry_points.txt')
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                parts.append('%s:%r:%r' % (path, stat.st_size,
+                                           stat.st_mtime))
+        return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def load(self):
+        """
+        Returns the indexed plugin records, keyed by plugin name, or None if
+        the index is missing, unreadable or stale. The records themselves
+        are checked by `LazyPluginManager`.
+        """
+        try:
+            with open(self.path) as index_file:
+                index = json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(index, dict):
+            return None
+        key = (index.get('version'), index.get('namespace'),
+               index.get('fingerprint'))
+        if key != (self.VERSION, self.namespace, self.fingerprint()):
+            return None
+        plugins = index.get('plugins')
+        if not isinstance(plugins, dict):
+            return None
+        return plugins
+
+    def save(self, plugins):
+        """
+        Atomically replaces the index with the supplied plugin records.
+
+        Failing to write the index is logged but not fatal; it only means
+        the next process has to scan the entry points again.
+        """
+        index = {
+            'version': self.VERSION,
+            'namespace': self.namespace,
+            'fingerprint': self.fingerprint(),
+            'plugins': plugins,
+        }
+        index_dir = os.path.dirname(os.path.abspath(self.path))
+        try:
+            if not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=index_dir, prefix='.os_vif')
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(index, tmp_file, sort_keys=True)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as err:
+            LOG.warning(_LW("Unable to write os_vif plugin index %(path)s: "
+                            "%(err)s"), {'path': self.path, 'err': err})
+
+
+class LazyPluginManager(object):
+    """
+    Gives dict-like access to the os_vif plugins by name, like a stevedore
+    `ExtensionManager`, but only reads entry point metadata up front. Each
+    plugin is imported and constructed the first time it is looked up.
+    """
+
+    def __init__(self, namespace, invoke_args=None, index_path=None):
+        """
+        Constructs the LazyPluginManager object.
+
+        :param namespace: The entry point namespace plugins are registered
+                          under.
+        :param invoke_args: Dictionary of keyword arguments that each plugin
+                            is constructed with.
+        :param index_path: Optional path of a `PluginIndex` file. When it is
+                           current, the entry points are read from it
+                           instead of being scanned. Otherwise it is rebuilt.
+        """
+        self.namespace = namespace
+        self._invoke_args = invoke_args or {}
+        self._plugins = {}
+        self._infos = {}
+        self._lock = threading.Lock()
+
+        if index_path is None:
+            self._entry_points = _scan_entry_points(namespace)
+            return
+
+        index = PluginIndex(index_path, namespace)
+        records = index.load()
+        if records is not None:
+            try:
+                self._entry_points, self._infos = self._read_records(records)
+                return
+            except (AttributeError, KeyError, TypeError, ValueError) as err:
+                LOG.warning(_LW("Rebuilding invalid os_vif plugin index "
+                                "%(path)s: %(err)s"),
+                            {'path': index_path, 'err': err})
+        self._entry_points = _scan_entry_points(namespace)
+        self._infos = {}
+        index.save(self._build_records())
+
+    @staticmethod
+    def _read_records(records):
+        """
+        Returns the entry points and the descriptions of the plugins
+        recorded in a `PluginIndex`.
+
+        :raises AttributeError, KeyError, TypeError or ValueError if a
+                record is malformed.
+        """
+        entry_points = {}
+        infos = {}
+        for name, record in records.items():
+            attrs = record['attrs']
+            if not isinstance(attrs, list):
+                raise TypeError('attrs of plugin %s is not a list' % name)
+            entry_points[name] = _IndexedEntryPoint(
+                name, str(record['module']), [str(attr) for attr in attrs])
+            if record['info'] is not None:
+                infos[name] = os_vif.plugin.PluginInfo.from_dict(
+                    record['info'])
+        return entry_points, infos
+
+    def _build_records(self):
+        """
+        Loads every plugin to record what it describes itself with, and
+        returns the records to store in a `PluginIndex`. The loaded plugins
+        are kept, so they are not constructed a second time.
+        """
+        records = {}
+        for name, ep in self._entry_points.items():
+            record = {'module': ep.module_name, 'attrs': list(ep.attrs),
+                      'info': None}
+            try:
+                record['info'] = self.describe(name).to_dict()
+            except Exception as err:
+                LOG.warning(_LW("Unable to describe os_vif plugin %(name)s: "
+                                "%(err)s"), {'name': name, 'err': err})
+            records[name] = record
+        return records
+
+    def names(self):
+        """Returns the names of all plugins, loaded or not."""
+        return list(self._entry_points)
+
+    def loaded_names(self):
+        """Returns the names of the plugins that have been loaded so far."""
+        return list(self._plugins)
+
+    def describe(self, name):
+        """
+        Returns the `os_vif.plugin.PluginInfo` for the plugin registered
+        under `name`. The plugin is only loaded if its description was not
+        found in the index.
+
+        :raises KeyError if no plugin is registered under `name`.
+        """
+        try:
+            return self._infos[name]
+        except KeyError:
+            pass
+        info = self[name].describe()
+        self._infos[name] = info
+        return info
+
+    def indexed_info(self, name):
+        """
+        Returns the `os_vif.plugin.PluginInfo` for the plugin registered
+        under `name` if it is known without loading the plugin, from the
+        index or because the plugin was loaded already, or None.
+        """
+        return self._infos.get(name)
+
+    def __contains__(self, name):
+        return name in self._entry_points
+
+    def __getitem__(self, name):
+        """
+        Returns the plugin registered under `name`, loading it first if this
+        is the first time it has been asked for.
+
+        :raises KeyError if no plugin is registered under `name`.
+        """
+        try:
+            return self._plugins[name]
+        except KeyError:
+            pass
+
+        with self._lock:
+            # Another thread may have loaded the plugin while this one was
+            # waiting for the lock.
+            if name not in self._plugins:
+                plugin_cls = self._entry_points[name].resolve()
+                self._plugins[name] = plugin_cls(**self._invoke_args)
+            return self._plugins[name]
@@ -0,0 +1,256 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Locks on the host resources VIF operations act on.
+
+Operations that touch the same VIF, device, bridge or physical network must
+not run at the same time, while operations on unrelated VIFs should not wait
+for each other. `resources()` names what an operation on a VIF acts on, and
+`LockManager.acquire()` holds the locks on a set of names:
+
+    with lock_manager.acquire(locking.resources(vif)):
+        plugin.plug(vif, instance)
+
+Locks are always taken in the order of their names, so that operations
+holding several of them cannot deadlock, within a process or, with file
+locks, across the processes of a host.
+"""
+
+import os
+import threading
+
+from os_vif import metrics
+from os_vif.objects import vif as vif_obj
+
+# Prefixes of the names of the kinds of resources.
+VIF = 'vif:'
+DEVICE = 'device:'
+BRIDGE = 'bridge:'
+PHYSNET = 'physnet:'
+
+
+def resources(vif):
+    """
+    Returns the sorted list of the names of the resources an operation on
+    the VIF acts on:
+
+    * the VIF itself, and the device created for it.
+    * the per-VIF Linux bridge of a VIF plugged with OVS hybrid plug.
+    * the network's bridge, if os_vif is to create it.
+    * the physical network, or interface, on which a VLAN interface is
+      created for the network, if os_vif is to create one.
+
+    Bridges that os_vif only adds ports to, such as the OVS integration
+    bridge, are not included, so that VIFs on the same network do not wait
+    for each other.
+    """
+    names = set()
+    vif_id = getattr(vif, 'id', None)
+    if vif_id:
+        names.add(VIF + vif_id)
+    devname = getattr(vif, 'devname', None)
+    if devname:
+        names.add(DEVICE + devname)
+    details = getattr(vif, 'details', None) or {}
+    if vif_id and details.get(vif_obj.VIF_DETAILS_OVS_HYBRID_PLUG):
+        names.add(BRIDGE + vif.br_name)
+    network = getattr(vif, 'network', None)
+    if network is not None:
+        bridge = getattr(network, 'bridge', None)
+        if bridge and getattr(network, 'should_provide_bridge', False):
+            names.add(BRIDGE + bridge)
+        if getattr(network, 'should_provide_vlan', False):
+            physnet = details.get(vif_obj.VIF_DETAILS_PHYSICAL_NETWORK)
+            if not physnet:
+                physnet = getattr(network, 'bridge_interface', None)
+            if physnet:
+                names.add(PHYSNET + physnet)
+    return sorted(names)
+
+
+def resources_of_all(vifs):
+    """Returns the sorted list of the resources of all the VIFs."""
+    names = set()
+    for vif in vifs:
+        names.update(resources(vif))
+    return sorted(names)
+
+
+class _Lock(object):
+    """A lock on a resource, and the number of threads using it."""
+
+    __slots__ = ('lock', 'file_lock', 'users')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file_lock = None
+        self.users = 0
+
+
+class _Held(object):
+    """
+    Locks held by `LockManager.acquire()`, released by `release()` or on
+    leaving a `with` block.
+    """
+
+    __slots__ = ('_manager', 'names', '_entries')
+
+    def __init__(self, manager, names, entries):
+        self._manager = manager
+        self.names = names
+        self._entries = entries
+
+    def release(self):
+        """Releases the locks. Does nothing if they were released already."""
+        entries = self._entries
+        if entries is None:
+            return
+        self._entries = None
+        self._manager._release(self.names, entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
+
+
+class LockManager(object):
+    """
+    Locks resources by name, for the threads, or greenthreads, of a process
+    and optionally across processes with lock files.
+
+    Locks are not reentrant: a thread holding the lock on a resource must
+    not ask for it again. A lock is only kept while it is held or waited
+    for, so that locking the resources of many short-lived VIFs uses no
+    memory once they are gone.
+    """
+
+    def __init__(self, lock_path=None):
+        """
+        Constructs the LockManager object.
+
+        :param lock_path: Directory in which to create a lock file per
+                          resource, shared by the processes of the host
+                          using the same directory. Locks are only held
+                          within the process if this is None.
+        """
+        self.lock_path = lock_path
+        if lock_path is not None and not os.path.isdir(lock_path):
+            os.makedirs(lock_path)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, names, deadline=None):
+        """
+        Acquires the locks on all of the named resources, in the order of
+        their names, waiting for them if needed. The time spent waiting for
+        each lock is recorded under `metrics.LOCK_WAIT`.
+
+        The locks are held until the returned object's `release()` method
+        is called, or the `with` block it is used in is left::
+
+            with lock_manager.acquire(names):
+                ...
+
+        :param names: Names of the resources, such as returned by
+                      `resources()`, in any order.
+        :param deadline: Optional `os_vif.deadline.Deadline` bounding the
+                         wait.
+        :returns: An object holding the locks.
+        :raises `exception.PlugTimeout` if the deadline passed before all
+                of the locks were acquired, in which case none is held.
+        """
+        names = sorted(set(names))
+        locks = self._locks
+        entries = []
+        held = 0
+        timed = metrics.enabled()
+        started = metrics.start() if timed else None
+        with self._lock:
+            for name in names:
+                entry = locks.get(name)
+                if entry is None:
+                    entry = locks[name] = _Lock()
+                entry.users += 1
+                entries.append(entry)
+            if self.lock_path is None:
+                # The locks no other thread holds are taken in the same
+                # pass, in order, up to the first one that would block.
+                for entry in entries:
+                    if not entry.lock.acquire(False):
+                        break
+                    held += 1
+        if timed:
+            for name in names[:held]:
+                metrics.observe(metrics.LOCK_WAIT, started,
+                                resource=name.split(':', 1)[0])
+        if held == len(entries):
+            return _Held(self, names, entries)
+
+        try:
+            for name, entry in zip(names[held:], entries[held:]):
+                started = metrics.start() if timed else None
+                if deadline is None:
+                    entry.lock.acquire()
+                elif not entry.lock.acquire(timeout=deadline.remaining()):
+                    raise deadline.error()
+                if self.lock_path is not None:
+                    try:
+                        if entry.file_lock is None:
+                            entry.file_lock = self._file_lock(name)
+                        if deadline is None:
+                            entry.file_lock.acquire()
+                        elif not entry.file_lock.acquire(
+                                timeout=deadline.remaining()):
+                            raise deadline.error()
+                    except BaseException:
+                        entry.lock.release()
+                        raise
+                held += 1
+                if timed:
+                    metrics.observe(metrics.LOCK_WAIT, started,
+                                    resource=name.split(':', 1)[0])
+        except BaseException:
+            self._release(names, entries, held)
+            raise
+        return _Held(self, names, entries)
+
+    def _file_lock(self, name):
+        from oslo_concurrency import lockutils
+
+        return lockutils.InterProcessLock(os.path.join(
+            self.lock_path, 'os_vif-' + name.replace(os.sep, '_')))
+
+    def _release(self, names, entries, held=None):
+        """
+        Releases the first `held` locks of `entries`, all of them by default,
+        and forgets the locks no other thread uses.
+        """
+        if held is None:
+            held = len(entries)
+        locks = self._locks
+        with self._lock:
+            for entry in entries[:held]:
+                if entry.file_lock is not None:
+                    entry.file_lock.release()
+                entry.lock.release()
+            for name, entry in zip(names, entries):
+                entry.users -= 1
+                if entry.users == 0:
+                    del locks[name]
+
+    def held(self):
+        """Returns the sorted list of the resources locked or waited for."""
+        with self._lock:
+            return sorted(self._locks)
@@ -0,0 +1,67 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Lazily rendered VIF descriptions for log messages.
+
+The repr of a VIF includes its network, subnets and instance info, which
+is costly to build and rarely needed outside of debugging. Messages logged
+on every plug and unplug reference VIFs through `identity()` instead, which
+renders only the id, plugin and device name, and only when the message is
+emitted. Debug messages keep passing the VIF itself as a logging argument,
+so its full repr is built only when debug logging is enabled.
+"""
+
+# Fields making up the short identity of a VIF, in rendering order.
+_IDENTITY_FIELDS = ('id', 'plugin', 'devname')
+
+
+def _field(vif, name):
+    try:
+        return getattr(vif, name)
+    except (AttributeError, NotImplementedError, TypeError, ValueError):
+        # Unset fields of versioned objects raise NotImplementedError, and
+        # devname is derived from the id, which may be unset as well.
+        return None
+
+
+def format_identity(vif):
+    """Returns the short identity of a VIF, such as `VIF(id=..., ...)`."""
+    return '%s(%s)' % (
+        type(vif).__name__,
+        ', '.join('%s=%s' % (name, _field(vif, name))
+                  for name in _IDENTITY_FIELDS))
+
+
+class VIFIdentity(object):
+    """
+    Logging argument rendering the short identity of a VIF when, and only
+    when, the message referencing it is emitted.
+    """
+
+    __slots__ = ('vif',)
+
+    def __init__(self, vif):
+        self.vif = vif
+
+    def __str__(self):
+        return format_identity(self.vif)
+
+    __repr__ = __str__
+
+
+def identity(vif):
+    """
+    Returns a logging argument for a VIF that renders its short identity.
+
+    :param vif: `os_vif.objects.VIF` object.
+    """
+    return VIFIdentity(vif)
@@ -0,0 +1,319 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Timing and failure metrics for VIF operations.
+
+Instrumentation is off until `enable()` is called, either directly or
+through the `enable_metrics` option of `os_vif.initialize()`. While it is
+off, every instrumentation point reduces to a check of an empty tuple.
+
+Measurements are handed to every enabled sink. `MetricsRegistry` keeps
+them in process and exports them in the Prometheus text format, and
+`StatsdSink` sends them to a statsd daemon over UDP. Any object with the
+same `timing()` and `increment()` methods can be used as a sink.
+"""
+
+import socket
+import threading
+import time
+
+# Time taken to find the plugin for a VIF. Labels: plugin.
+LOOKUP = 'os_vif_lookup_seconds'
+# Time taken by a plugin hook. Labels: plugin, operation.
+PLUGIN = 'os_vif_plugin_seconds'
+# Time taken by a root command run by a plugin through
+# `PluginBase.execute_privileged()`, including time spent queued to be
+# merged. Labels: plugin, operation, command.
+PRIVILEGED_COMMAND = 'os_vif_privileged_command_seconds'
+# Failed operations. Labels: plugin, operation, exception.
+FAILURES = 'os_vif_failures_total'
+# Requests replaced by a later request on the same VIF before they ran.
+# Labels: operation.
+COALESCED = 'os_vif_coalesced_total'
+# Time spent waiting for the lock on a resource a VIF operation acts on.
+# Labels: resource, the kind of resource.
+LOCK_WAIT = 'os_vif_lock_wait_seconds'
+# Devices requested from the device pool. Labels: kind, outcome (hit or
+# miss).
+DEVICE_POOL = 'os_vif_device_pool_total'
+
+_HELP = {
+    LOOKUP: 'Time taken to find the plugin for a VIF.',
+    PLUGIN: 'Time taken by VIF plugin operations.',
+    PRIVILEGED_COMMAND: 'Time taken by root commands run by VIF plugins.',
+    FAILURES: 'Number of failed VIF operations, by exception class.',
+    COALESCED: 'Number of VIF operations replaced before they ran.',
+    LOCK_WAIT: 'Time spent waiting for locks on the resources of VIFs.',
+    DEVICE_POOL: 'Number of devices requested from the device pool.',
+}
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0)
+
+_now = getattr(time, 'monotonic', time.time)
+
+# The enabled sinks. Empty while instrumentation is off.
+_SINKS = ()
+_REGISTRY = None
+
+# Labels of the plugin operation the current thread is running, picked up
+# by the privileged commands the plugin runs.
+_context = threading.local()
+
+
+class _Histogram(object):
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(pairs):
+    return ','.join('%s="%s"' % (key, str(value).replace('\\', r'\\')
+                                 .replace('"', r'\"').replace('\n', r'\n'))
+                    for key, value in pairs)
+
+
+class MetricsRegistry(object):
+    """
+    In-process store of timings, as histograms, and counters, keyed by
+    metric name and labels.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Constructs the MetricsRegistry object.
+
+        :param buckets: Upper bounds, in seconds, of the histogram buckets
+                        timings are counted in.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._timings = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def timing(self, name, seconds, labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._timings.get(key)
+            if histogram is None:
+                histogram = self._timings[key] = _Histogram(self.buckets)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram.counts[index] += 1
+                    break
+            histogram.total += seconds
+            histogram.count += 1
+
+    def increment(self, name, labels, value=1):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def get_timing(self, name, **labels):
+        """
+        Returns a (count, total seconds) tuple for the timings recorded
+        under the metric name and labels.
+        """
+        histogram = self._timings.get((name, _label_key(labels)))
+        if histogram is None:
+            return 0, 0.0
+        return histogram.count, histogram.total
+
+    def get_counter(self, name, **labels):
+        """Returns the value of the counter with the name and labels."""
+        return self._counters.get((name, _label_key(labels)), 0)
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+    def to_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            timings = sorted((key, histogram.counts[:], histogram.total,
+                              histogram.count)
+                             for key, histogram in self._timings.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        seen = set()
+
+        def header(name, metric_type):
+            if name not in seen:
+                seen.add(name)
+                if name in _HELP:
+                    lines.append('# HELP %s %s' % (name, _HELP[name]))
+                lines.append('# TYPE %s %s' % (name, metric_type))
+
+        for (name, pairs), counts, total, count in timings:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket{%s} %d' % (
+                    name, _format_labels(pairs + (('le', repr(bound)),)),
+                    cumulative))
+            lines.append('%s_bucket{%s} %d' % (
+                name, _format_labels(pairs + (('le', '+Inf'),)), count))
+            labels = _format_labels(pairs)
+            lines.append('%s_sum{%s} %r' % (name, labels, total))
+            lines.append('%s_count{%s} %d' % (name, labels, count))
+        for (name, pairs), value in counters:
+            header(name, 'counter')
+            lines.append('%s{%s} %d' % (name, _format_labels(pairs), value))
+        return ''.join(line + '\n' for line in lines)
+
+
+class StatsdSink(object):
+    """
+    Sends timings and counters to a statsd daemon over UDP, as
+    `<name>.<label values>`, with label values in label name order.
+    Send errors are ignored, like statsd clients do.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix=None):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _stat(self, name, labels):
+        parts = [name] + [str(value).replace('.', '_')
+                          for _key, value in _label_key(labels)]
+        if self.prefix:
+            parts.insert(0, self.prefix)
+        return '.'.join(parts)
+
+    def _send(self, line):
+        try:
+            self._sock.sendto(line.encode('utf-8'), self.address)
+        except socket.error:
+            pass
+
+    def timing(self, name, seconds, labels):
+        self._send('%s:%.3f|ms' % (self._stat(name, labels), seconds * 1000))
+
+    def increment(self, name, labels, value=1):
+        self._send('%s:%d|c' % (self._stat(name, labels), value))
+
+    def close(self):
+        self._sock.close()
+
+
+def get_registry():
+    """Returns the process-wide `MetricsRegistry`."""
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = MetricsRegistry()
+    return _REGISTRY
+
+
+def enable(*sinks):
+    """
+    Turns instrumentation on, sending measurements to the supplied sinks,
+    or to the process-wide `MetricsRegistry` if there are none.
+    """
+    global _SINKS
+    _SINKS = tuple(sinks) or (get_registry(),)
+
+
+def disable():
+    """Turns instrumentation off."""
+    global _SINKS
+    _SINKS = ()
+
+
+def reset():
+    """
+    Turns instrumentation off and closes the sinks that send measurements
+    out of the process, such as `StatsdSink`. Called by
+    `os_vif.initialize()` before it applies its options.
+    """
+    global _SINKS
+    sinks, _SINKS = _SINKS, ()
+    for sink in sinks:
+        close = getattr(sink, 'close', None)
+        if close is not None:
+            close()
+
+
+def enabled():
+    return bool(_SINKS)
+
+
+def start():
+    """
+    Returns the time to pass to `observe()` once the measured step is
+    done, or None when instrumentation is off.
+    """
+    if _SINKS:
+        return _now()
+    return None
+
+
+def observe(name, started, **labels):
+    """Records the time elapsed since `started`, a value from `start()`."""
+    if started is None:
+        return
+    elapsed = _now() - started
+    for sink in _SINKS:
+        sink.timing(name, elapsed, labels)
+
+
+def increment(name, **labels):
+    """Increments a counter by one."""
+    for sink in _SINKS:
+        sink.increment(name, labels)
+
+
+def count_failure(err, plugin, operation):
+    """Counts a failed operation under the class name of its exception."""
+    if _SINKS:
+        increment(FAILURES, plugin=plugin or '', operation=operation,
+                  exception=type(err).__name__)
+
+
+def current_labels():
+    """
+    Returns the labels of the plugin operation running in the current
+    thread, or an empty dictionary.
+    """
+    return getattr(_context, 'labels', None) or {}
+
+
+def instrument(func, plugin, operation):
+    """
+    Returns a callable that runs `func` and records its duration under
+    `PLUGIN`, with the operation's labels made available to the privileged
+    commands it runs. Returns `func` itself when instrumentation is off.
+    """
+    if not _SINKS:
+        return func
+    labels = {'plugin': plugin, 'operation': operation}
+
+    def wrapper(*args, **kwargs):
+        previous = getattr(_context, 'labels', None)
+        _context.labels = labels
+        started = _now()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _context.labels = previous
+            observe(PLUGIN, started, **labels)
+    return wrapper
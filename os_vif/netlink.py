@@ -0,0 +1,363 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Link operations over an in-process rtnetlink socket.
+
+Plugins can use `IPRoute` to create, delete and configure veth pairs,
+bridges, MTUs and link state without running `ip` or `brctl` in a child
+process. Only the standard library is used; the calling process needs
+CAP_NET_ADMIN in the network namespace it changes, for instance by running
+as root or inside a user and network namespace of its own.
+"""
+
+import errno
+import itertools
+import os
+import socket
+import struct
+import threading
+
+from os_vif import exception
+
+NETLINK_ROUTE = 0
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_MASTER = 10
+IFLA_LINKINFO = 18
+
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+
+VETH_INFO_PEER = 1
+
+IFF_UP = 0x1
+
+# struct nlmsghdr: length, type, flags, sequence number, port id.
+_NLMSGHDR = struct.Struct('=LHHLL')
+# struct ifinfomsg: family, padding, type, index, flags, change mask.
+_IFINFOMSG = struct.Struct('=BxHiII')
+# struct rtattr: length, type.
+_RTATTR = struct.Struct('=HH')
+# struct nlmsgerr starts with the negated errno, 0 for an acknowledgement.
+_NLMSGERR = struct.Struct('=i')
+_U32 = struct.Struct('=I')
+
+_RECV_SIZE = 65536
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _attr(attr_type, payload):
+    """Packs a netlink attribute, padded to a 4 byte boundary."""
+    length = _RTATTR.size + len(payload)
+    padding = b'\0' * (_align(length) - length)
+    return b''.join((_RTATTR.pack(length, attr_type), payload, padding))
+
+
+def _attr_str(attr_type, value):
+    return _attr(attr_type, value.encode('utf-8') + b'\0')
+
+
+def _attr_u32(attr_type, value):
+    return _attr(attr_type, _U32.pack(value))
+
+
+def _ifinfomsg(index=0, flags=0, change=0):
+    return _IFINFOMSG.pack(socket.AF_UNSPEC, 0, index, flags, change)
+
+
+def _parse_attrs(data):
+    """Returns a dictionary mapping attribute types to their payloads."""
+    attrs = {}
+    offset = 0
+    while offset + _RTATTR.size <= len(data):
+        length, attr_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        attrs[attr_type] = data[offset + _RTATTR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def _parse_messages(data):
+    """Yields a (type, flags, seq, payload) tuple per message in `data`."""
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, flags, seq, _pid = _NLMSGHDR.unpack_from(data,
+                                                                   offset)
+        if length < _NLMSGHDR.size:
+            break
+        yield msg_type, flags, seq, data[offset + _NLMSGHDR.size:
+                                         offset + length]
+        offset += _align(length)
+
+
+class IPRoute(object):
+    """
+    Minimal rtnetlink client for the link operations VIF plugins need.
+
+    Every request is acknowledged by the kernel before the call returns,
+    and a failed request raises `exception.NetlinkError` carrying the errno
+    reported by the kernel. Devices are addressed by name. An object can be
+    shared by several threads, which take turns on the socket.
+    """
+
+    def __init__(self, sock=None):
+        """
+        Constructs the IPRoute object.
+
+        :param sock: Optional socket to use instead of opening a
+                     NETLINK_ROUTE socket, such as one opened in another
+                     network namespace, or a fake one for tests.
+        """
+        if sock is None:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                 NETLINK_ROUTE)
+            sock.bind((0, 0))
+        self._sock = sock
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _request(self, operation, device, msg_type, flags, payload):
+        """
+        Sends a request and waits for the kernel's answer.
+
+        :returns: list of the payloads of the messages answering the
+                  request, other than the acknowledgement.
+        :raises `exception.NetlinkError` if the kernel rejects the request.
+        """
+        with self._lock:
+            seq = next(self._seq)
+            header = _NLMSGHDR.pack(_NLMSGHDR.size + len(payload), msg_type,
+                                    flags | NLM_F_REQUEST | NLM_F_ACK, seq, 0)
+            self._sock.send(header + payload)
+            replies = []
+            while True:
+                data = self._sock.recv(_RECV_SIZE)
+                if not data:
+                    raise exception.NetlinkError(
+                        operation=operation, device=device,
+                        err=os.strerror(errno.EPIPE), errno=errno.EPIPE)
+                for reply_type, _flags, reply_seq, reply in _parse_messages(
+                        data):
+                    if reply_seq != seq:
+                        # An answer to an earlier request that timed out or
+                        # was interrupted.
+                        continue
+                    if reply_type == NLMSG_ERROR:
+                        error = -_NLMSGERR.unpack_from(reply)[0]
+                        if error:
+                            raise exception.NetlinkError(
+                                operation=operation, device=device,
+                                err=os.strerror(error), errno=error)
+                        return replies
+                    if reply_type == NLMSG_DONE:
+                        return replies
+                    replies.append(reply)
+
+    def link_index(self, name):
+        """
+        Returns the interface index of the named device.
+
+        :raises `exception.NetlinkError` with errno ENODEV if there is no
+                such device.
+        """
+        replies = self._request('get', name, RTM_GETLINK, 0,
+                                _ifinfomsg() + _attr_str(IFLA_IFNAME, name))
+        return _IFINFOMSG.unpack_from(replies[0])[2]
+
+    def list_links(self):
+        """
+        Returns a dictionary with an entry per device on the host, from a
+        single dump request. Each entry maps the device name to a dictionary
+        with the `index`, `up`, `mtu`, `master` (the index of the bridge the
+        device is enslaved to, or None) and `kind` (such as 'veth' or
+        'bridge', or None for physical devices) of the device.
+        """
+        links = {}
+        for reply in self._request('list', '*', RTM_GETLINK, NLM_F_DUMP,
+                                   _ifinfomsg()):
+            _family, _type, index, flags, _change = (
+                _IFINFOMSG.unpack_from(reply))
+            attrs = _parse_attrs(reply[_IFINFOMSG.size:])
+            if IFLA_IFNAME not in attrs:
+                continue
+            kind = None
+            if IFLA_LINKINFO in attrs:
+                kind = _parse_attrs(attrs[IFLA_LINKINFO]).get(IFLA_INFO_KIND)
+                if kind is not None:
+                    kind = kind.rstrip(b'\0').decode('utf-8')
+            master = attrs.get(IFLA_MASTER)
+            mtu = attrs.get(IFLA_MTU)
+            links[attrs[IFLA_IFNAME].rstrip(b'\0').decode('utf-8')] = {
+                'index': index,
+                'up': bool(flags & IFF_UP),
+                'mtu': _U32.unpack(mtu)[0] if mtu else None,
+                'master': _U32.unpack(master)[0] if master else None,
+                'kind': kind,
+            }
+        return links
+
+    def link_exists(self, name):
+        """Returns True if a device with the given name exists."""
+        try:
+            self.link_index(name)
+        except exception.NetlinkError as err:
+            if err.kwargs['errno'] != errno.ENODEV:
+                raise
+            return False
+        return True
+
+    def _new_link(self, operation, name, kind, info_data=b''):
+        linkinfo = _attr_str(IFLA_INFO_KIND, kind)
+        if info_data:
+            linkinfo += _attr(IFLA_INFO_DATA, info_data)
+        payload = b''.join((_ifinfomsg(), _attr_str(IFLA_IFNAME, name),
+                            _attr(IFLA_LINKINFO, linkinfo)))
+        self._request(operation, name, RTM_NEWLINK,
+                      NLM_F_CREATE | NLM_F_EXCL, payload)
+
+    def add_bridge(self, name):
+        """
+        Creates a Linux bridge.
+
+        :raises `exception.NetlinkError` with errno EEXIST if the device
+                already exists.
+        """
+        self._new_link('add bridge', name, 'bridge')
+
+    def add_veth(self, name, peer_name):
+        """
+        Creates a veth pair.
+
+        :raises `exception.NetlinkError` with errno EEXIST if either device
+                already exists.
+        """
+        peer = _ifinfomsg() + _attr_str(IFLA_IFNAME, peer_name)
+        self._new_link('add veth', name, 'veth',
+                       _attr(VETH_INFO_PEER, peer))
+
+    def delete_link(self, name):
+        """
+        Deletes a device. Deleting one end of a veth pair deletes both.
+
+        :raises `exception.NetlinkError` with errno ENODEV if there is no
+                such device.
+        """
+        self._request('delete', name, RTM_DELLINK, 0,
+                      _ifinfomsg() + _attr_str(IFLA_IFNAME, name))
+
+    def rename(self, name, new_name):
+        """
+        Renames a device, which must be down.
+
+        :raises `exception.NetlinkError` with errno EEXIST if a device with
+                the new name already exists, or EBUSY if the device is up.
+        """
+        index = self.link_index(name)
+        payload = _ifinfomsg(index=index) + _attr_str(IFLA_IFNAME, new_name)
+        self._request('rename', name, RTM_NEWLINK, 0, payload)
+
+    def _set_link(self, operation, name, attrs=b'', flags=0, change=0):
+        payload = b''.join((_ifinfomsg(flags=flags, change=change),
+                            _attr_str(IFLA_IFNAME, name), attrs))
+        self._request(operation, name, RTM_NEWLINK, 0, payload)
+
+    def set_mtu(self, name, mtu):
+        """Sets the MTU of a device."""
+        self._set_link('set mtu', name, _attr_u32(IFLA_MTU, mtu))
+
+    def set_up(self, name):
+        """Brings a device up."""
+        self._set_link('set up', name, flags=IFF_UP, change=IFF_UP)
+
+    def set_down(self, name):
+        """Brings a device down."""
+        self._set_link('set down', name, change=IFF_UP)
+
+    def set_master(self, name, master):
+        """
+        Enslaves a device to a bridge, or releases it from its bridge when
+        `master` is None.
+        """
+        index = 0 if master is None else self.link_index(master)
+        self._set_link('set master', name, _attr_u32(IFLA_MASTER, index))
+
+
+def ensure_bridge(ipr, name, mtu=None):
+    """
+    Creates a Linux bridge unless it already exists, and brings it up.
+
+    :param ipr: `IPRoute` object.
+    :param name: Name of the bridge, such as `VIF.br_name`.
+    :param mtu: Optional MTU to set on the bridge.
+    """
+    try:
+        ipr.add_bridge(name)
+    except exception.NetlinkError as err:
+        if err.kwargs['errno'] != errno.EEXIST:
+            raise
+    if mtu:
+        ipr.set_mtu(name, mtu)
+    ipr.set_up(name)
+
+
+def ensure_veth_pair(ipr, name, peer_name, mtu=None):
+    """
+    Creates a veth pair unless its first device already exists, and brings
+    both ends up.
+
+    :param ipr: `IPRoute` object.
+    :param name: Name of one end, such as `VIF.veth_pair_names[0]`.
+    :param peer_name: Name of the other end.
+    :param mtu: Optional MTU to set on both ends.
+    """
+    if not ipr.link_exists(name):
+        ipr.add_veth(name, peer_name)
+    for dev in (name, peer_name):
+        if mtu:
+            ipr.set_mtu(dev, mtu)
+        ipr.set_up(dev)
+
+
+def delete_link_if_exists(ipr, name):
+    """Deletes a device, ignoring a device that does not exist."""
+    try:
+        ipr.delete_link(name)
+    except exception.NetlinkError as err:
+        if err.kwargs['errno'] != errno.ENODEV:
+            raise
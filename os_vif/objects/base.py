@@ -0,0 +1,340 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+
+from oslo_versionedobjects import base
+
+
+class _Unset(object):
+    def __repr__(self):
+        return '<?>'
+
+
+_UNSET = _Unset()
+
+# Maps object classes to the RecordBase subclasses that represent them.
+_RECORD_CLASSES = {}
+
+
+def _trusted_attrnames(cls):
+    """
+    Returns a dictionary mapping each field of `cls` to the instance
+    attribute its value is stored in.
+
+    Once a class is registered with `VersionedObjectRegistry`, each field is
+    a property that coerces the value on assignment and stores it under
+    `base._get_attrname(field)`. Otherwise the field is a plain attribute.
+    """
+    attrnames = cls.__dict__.get('_obj_trusted_attrnames')
+    if attrnames is None:
+        attrnames = {}
+        for field in cls.fields:
+            if isinstance(getattr(cls, field, None), property):
+                attrnames[field] = base._get_attrname(field)
+            else:
+                attrnames[field] = field
+        cls._obj_trusted_attrnames = attrnames
+    return attrnames
+
+
+class TrustedConstructionMixin(object):
+    """
+    Adds a constructor for field values that have already been validated,
+    such as values copied out of another object of the same class.
+    """
+
+    @classmethod
+    def obj_from_trusted(cls, **values):
+        """
+        Constructs an object directly from field values, without calling
+        `__init__()` and without coercing the values through their fields.
+
+        Unlike the regular constructor, no defaults are filled in and no
+        values are derived from others, so `values` should hold everything
+        the regular constructor would have set. Values are stored as-is and
+        are not copied.
+
+        :param values: Field values, keyed by field name.
+        :raises KeyError if a key in `values` is not a field of the object.
+        """
+        attrnames = _trusted_attrnames(cls)
+        obj = cls.__new__(cls)
+        state = obj.__dict__
+        state['_context'] = None
+        state['_changed_fields'] = set(values)
+        for name, value in values.items():
+            state[attrnames[name]] = value
+        return obj
+
+    def obj_backport(self, target_version):
+        """
+        Returns a copy of the object made compatible with an older version
+        of its class through `obj_make_compatible()`, with its `VERSION` set
+        to `target_version`. The object itself is left unchanged.
+        """
+        cls = type(self)
+        attrnames = _trusted_attrnames(cls)
+        if any(name != attrname for name, attrname in attrnames.items()):
+            # Registered classes go through their primitive form, which is
+            # what obj_make_compatible() expects for their nested objects.
+            return cls.obj_from_primitive(
+                self.obj_to_primitive(target_version=target_version))
+        state = self.__dict__
+        values = dict((name, state[attrname])
+                      for name, attrname in attrnames.items()
+                      if attrname in state)
+        self.obj_make_compatible(values, target_version)
+        obj = cls.obj_from_trusted(**values)
+        obj.VERSION = target_version
+        return obj
+
+
+# Instance attributes an interned object may still change, as they are
+# bookkeeping rather than field values.
+_INTERNED_WRITABLE_ATTRS = frozenset(['_changed_fields', '_context'])
+
+
+def _interned_setattr(self, name, value):
+    if name not in _INTERNED_WRITABLE_ATTRS:
+        raise AttributeError("'%s' object is interned and read-only" %
+                             type(self).__name__)
+    object.__setattr__(self, name, value)
+
+
+def _interned_delattr(self, name):
+    if name not in _INTERNED_WRITABLE_ATTRS:
+        raise AttributeError("'%s' object is interned and read-only" %
+                             type(self).__name__)
+    object.__delattr__(self, name)
+
+
+def _interned_deepcopy(self, memo):
+    cls = type(self).__base__
+    state = self.__dict__
+    values = dict((name, copy.deepcopy(state[attrname], memo))
+                  for name, attrname in _trusted_attrnames(cls).items()
+                  if attrname in state)
+    obj = cls.obj_from_trusted(**values)
+    obj._changed_fields = set(self._changed_fields)
+    if 'VERSION' in state:
+        obj.VERSION = state['VERSION']
+    memo[id(self)] = obj
+    return obj
+
+
+def _detach(obj):
+    """
+    Returns a private copy of an interned object, of the original class.
+    Lists, sets and dictionaries are copied, so that they can be modified in
+    place, while nested objects are left shared until they are read.
+    """
+    cls = type(obj).__base__
+    copied = cls.__new__(cls)
+    state = copied.__dict__
+    for name, value in obj.__dict__.items():
+        if isinstance(value, (list, set, dict)):
+            value = copy.copy(value)
+        state[name] = value
+    return copied
+
+
+class SharedObjectAttribute(object):
+    """
+    Attribute holding the value of a field that may hold interned objects,
+    such as the `network` of a VIF, implementing copy-on-write for them.
+
+    Reading the attribute of an object that is not itself interned replaces
+    an interned value with a private copy, or a list holding interned
+    objects with a list of private copies, and returns it, so that the
+    caller can modify what it gets without affecting the other holders of
+    the interned object. The copy is shallow: objects nested in it are
+    copied in turn when they are read through it. The value is stored in
+    the instance dictionary under the name of the field, like the fields of
+    classes that are not registered with `VersionedObjectRegistry`.
+    """
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        state = obj.__dict__
+        try:
+            value = state[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+        if getattr(obj, '_obj_interned', False):
+            return value
+        if getattr(value, '_obj_interned', False):
+            value = state[self.name] = _detach(value)
+        elif type(value) is list and any(
+                getattr(item, '_obj_interned', False) for item in value):
+            value = state[self.name] = [
+                _detach(item) if getattr(item, '_obj_interned', False)
+                else item for item in value]
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+    def __delete__(self, obj):
+        try:
+            del obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+
+class InternableMixin(object):
+    """
+    Allows objects of a class to be shared through
+    `os_vif.objects.interning.Registry`.
+
+    An interned object is shared by every holder of an equal object, so it
+    is read-only. Its class is a subclass of the same name, returned by
+    `_obj_interned_class()`, which raises AttributeError when a field is set
+    or deleted. Objects that are not interned are not affected. A deep copy
+    of an interned object is an object of the original class, which can be
+    modified.
+
+    Objects holding interned objects, such as VIFs, hand out private copies
+    of them through `SharedObjectAttribute`, so that interned objects are
+    only reached through `Registry.intern()`.
+    """
+    _obj_interned = False
+
+    @classmethod
+    def _obj_interned_class(cls):
+        interned_cls = cls.__dict__.get('_obj_interned_cls')
+        if interned_cls is None:
+            interned_cls = type(cls.__name__, (cls,), {
+                '__module__': cls.__module__,
+                '__doc__': cls.__doc__,
+                '__setattr__': _interned_setattr,
+                '__delattr__': _interned_delattr,
+                '__deepcopy__': _interned_deepcopy,
+                '_obj_interned': True,
+            })
+            cls._obj_interned_cls = interned_cls
+        return interned_cls
+
+
+def _record_class_for(obj_cls):
+    """Returns the `RecordBase` subclass representing `obj_cls`, or None."""
+    try:
+        return _RECORD_CLASSES[obj_cls]
+    except KeyError:
+        pass
+    if getattr(obj_cls, '_obj_interned', False):
+        # Interned objects are represented like those of the class they
+        # were interned from.
+        return _RECORD_CLASSES.setdefault(
+            obj_cls, _record_class_for(obj_cls.__base__))
+    stack = list(RecordBase.__subclasses__())
+    while stack:
+        record_cls = stack.pop()
+        stack.extend(record_cls.__subclasses__())
+        if record_cls.obj_class is not None:
+            _RECORD_CLASSES[record_cls.obj_class] = record_cls
+    return _RECORD_CLASSES.setdefault(obj_cls, None)
+
+
+def _to_record(value):
+    record_cls = _record_class_for(type(value))
+    if record_cls is not None:
+        return record_cls.from_object(value)
+    if isinstance(value, list) and value:
+        records = [_to_record(item) for item in value]
+        if all(isinstance(item, RecordBase) for item in records):
+            return tuple(records)
+    return value
+
+
+def _from_record(value):
+    if isinstance(value, RecordBase):
+        return value.to_object()
+    if isinstance(value, tuple) and value and isinstance(value[0],
+                                                         RecordBase):
+        return [item.to_object() for item in value]
+    return value
+
+
+class RecordBase(object):
+    """
+    Base class for compact, read-only views of os_vif objects.
+
+    A subclass sets `obj_class` to the object class it represents and
+    `__slots__` to that class' field names, so a record carries neither an
+    instance dictionary nor any versioned object bookkeeping. Fields that
+    hold other os_vif objects hold records instead, and lists of objects
+    become tuples of records. All other values are shared with the object,
+    not copied.
+    """
+    __slots__ = ()
+
+    obj_class = None
+
+    @classmethod
+    def from_object(cls, obj):
+        """Constructs a record holding the fields that are set on `obj`."""
+        record = cls.__new__(cls)
+        state = obj.__dict__
+        for name, attrname in _trusted_attrnames(cls.obj_class).items():
+            if attrname in state:
+                object.__setattr__(record, name, _to_record(state[attrname]))
+        return record
+
+    def to_object(self):
+        """Constructs an object of `obj_class` from the record."""
+        values = {}
+        for name in self.__slots__:
+            try:
+                values[name] = _from_record(getattr(self, name))
+            except AttributeError:
+                pass
+        return self.obj_class.obj_from_trusted(**values)
+
+    def obj_attr_is_set(self, name):
+        return hasattr(self, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("'%s' object is read-only" %
+                             type(self).__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("'%s' object is read-only" %
+                             type(self).__name__)
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        for name in self.__slots__:
+            value = getattr(self, name, _UNSET)
+            if value != getattr(other, name, _UNSET):
+                return False
+        return True
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ','.join(
+            '%s=%r' % (name, getattr(self, name, _UNSET))
+            for name in self.__slots__))
@@ -0,0 +1,492 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compact binary encoding of os_vif objects.
+
+An encoded stream is a sequence of msgpack messages:
+
+* A header, `["os_vif", FORMAT_VERSION]`.
+* `[CLASS, name, version, field names]` the first time an object of a
+  given class and version is encoded. Objects of that class list their
+  field values in this order, so field names are sent once per stream.
+* `[DEFINITION, class index, values, changed field indexes]` the first time
+  an object with a given content is encoded. Objects with the same content,
+  such as the `Network` of many VIFs of an instance, are sent once.
+* `[ITEM, reference]` for each object passed to the encoder.
+
+Classes and definitions are numbered in the order they appear. A field
+holding another object holds a reference to the definition of its content.
+A Python object reachable more than once from the encoded objects is
+decoded into a single object again, while objects that merely have the
+same content are decoded into distinct objects, as they were encoded.
+
+Field values are encoded like `obj_to_primitive()` encodes them, so
+converting an object to its versioned primitive gives the same result
+before encoding and after decoding.
+"""
+
+import struct
+
+import msgpack
+from oslo_versionedobjects import base
+from oslo_versionedobjects import fields
+import six
+
+from os_vif import exception
+from os_vif.objects import base as osv_base
+
+FORMAT_VERSION = 1
+
+_MAGIC = 'os_vif'
+
+# Message kinds.
+_CLASS = 0
+_DEFINITION = 1
+_ITEM = 2
+
+# msgpack extension types used in definitions. NEW references a definition
+# to build a new object from, SAME an object already built, by the order in
+# which objects are built, and UNSET stands for a field that is not set.
+_EXT_NEW = 1
+_EXT_SAME = 2
+_EXT_UNSET = 3
+
+_INDEX = struct.Struct('>I')
+
+_UNSET_EXT = msgpack.ExtType(_EXT_UNSET, b'')
+
+_SCALAR_TYPES = six.string_types + six.integer_types + (bool, float)
+
+# Field types whose primitives are the values themselves.
+_PASSTHROUGH_TYPES = (fields.String, fields.UUID, fields.Boolean,
+                      fields.Integer, fields.Float)
+
+# Types of the values of passthrough fields that are their own primitives.
+_PASSTHROUGH_VALUE_TYPES = frozenset(_SCALAR_TYPES + (list, dict))
+
+_CHUNK_SIZE = 65536
+
+# Errors raised when the stream is not valid msgpack.
+_UNPACK_ERRORS = (msgpack.exceptions.UnpackException,
+                  msgpack.exceptions.ExtraData,
+                  msgpack.exceptions.FormatError,
+                  msgpack.exceptions.StackError,
+                  ValueError, struct.error)
+# Errors raised when a message is malformed, or a value is not valid for its
+# field. RuntimeError is raised by Python 2, and RecursionError, a subclass
+# of it, by Python 3, on a chain of definitions too long to resolve.
+_MESSAGE_ERRORS = (AttributeError, IndexError, KeyError, RuntimeError,
+                   TypeError, ValueError, struct.error)
+
+
+class _New(object):
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+
+class _Same(object):
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+
+_UNSET = object()
+
+
+def _ext_hook(code, data):
+    if code == _EXT_NEW:
+        return _New(_INDEX.unpack(data)[0])
+    if code == _EXT_SAME:
+        return _Same(_INDEX.unpack(data)[0])
+    if code == _EXT_UNSET:
+        return _UNSET
+    return msgpack.ExtType(code, data)
+
+
+def _is_object_field(field):
+    return isinstance(field, (fields.ObjectField, fields.ListOfObjectsField))
+
+
+def _is_passthrough(field):
+    field_type = field._type
+    if isinstance(field_type, (fields.List, fields.Dict)):
+        field_type = field_type._element_type._type
+    return isinstance(field_type, _PASSTHROUGH_TYPES)
+
+
+_CLASSES = {}
+
+# Ways of encoding the value of a field.
+_ENCODE_OBJECT = 0
+_ENCODE_PASSTHROUGH = 1
+_ENCODE_FIELD = 2
+
+# Maps classes to their sorted field names and, for each of these, the
+# attribute holding its value, the field and how to encode the value.
+_ENCODING_PLANS = {}
+
+
+def _encoding_plan(cls):
+    plan = _ENCODING_PLANS.get(cls)
+    if plan is None:
+        attrnames = osv_base._trusted_attrnames(cls)
+        names = sorted(cls.fields)
+        steps = []
+        for name in names:
+            field = cls.fields[name]
+            if _is_object_field(field):
+                how = _ENCODE_OBJECT
+            elif _is_passthrough(field):
+                how = _ENCODE_PASSTHROUGH
+            else:
+                how = _ENCODE_FIELD
+            steps.append((name, attrnames[name], field, how))
+        plan = _ENCODING_PLANS[cls] = (names, tuple(steps))
+    return plan
+
+
+def _object_class(name):
+    """Returns the os_vif object class with the given `obj_name()`."""
+    cls = _CLASSES.get(name)
+    if cls is None:
+        stack = list(osv_base.TrustedConstructionMixin.__subclasses__())
+        while stack:
+            candidate = stack.pop()
+            stack.extend(candidate.__subclasses__())
+            if not getattr(candidate, '_obj_interned', False):
+                _CLASSES.setdefault(candidate.obj_name(), candidate)
+        cls = _CLASSES.get(name)
+        if cls is None:
+            raise exception.ObjectDecodingError(
+                reason='unknown object type %s' % name)
+    return cls
+
+
+def _field_to_primitive(obj, name, field, value):
+    if value is None or isinstance(value, _SCALAR_TYPES):
+        return value
+    return field.to_primitive(obj, name, value)
+
+
+def _field_from_primitive(name, field, value):
+    if value is None or _is_passthrough(field):
+        return value
+    return field.from_primitive(None, name, value)
+
+
+def to_primitive(obj):
+    """
+    Returns the versioned primitive of an object, in the format of
+    `obj_to_primitive()`, whether or not its class is registered with
+    `VersionedObjectRegistry`.
+    """
+    cls = type(obj)
+    attrnames = osv_base._trusted_attrnames(cls)
+    state = obj.__dict__
+    data = {}
+    for name, field in cls.fields.items():
+        attrname = attrnames[name]
+        if attrname not in state:
+            continue
+        value = state[attrname]
+        if _is_object_field(field) and value is not None:
+            if isinstance(value, base.VersionedObject):
+                value = to_primitive(value)
+            else:
+                value = [to_primitive(item) for item in value]
+        else:
+            value = _field_to_primitive(obj, name, field, value)
+        data[name] = value
+    primitive = {
+        cls._obj_primitive_key('name'): obj.obj_name(),
+        cls._obj_primitive_key('namespace'): obj.OBJ_PROJECT_NAMESPACE,
+        cls._obj_primitive_key('version'): obj.VERSION,
+        cls._obj_primitive_key('data'): data,
+    }
+    changes = [name for name in obj.obj_what_changed() if name in data]
+    if changes:
+        primitive[cls._obj_primitive_key('changes')] = changes
+    return primitive
+
+
+def from_primitive(primitive):
+    """Constructs an os_vif object from its versioned primitive."""
+    key = base.VersionedObject._obj_primitive_key
+    cls = _object_class(primitive[key('name')])
+    values = {}
+    for name, value in primitive[key('data')].items():
+        field = cls.fields.get(name)
+        if field is None:
+            continue
+        if _is_object_field(field) and value is not None:
+            if isinstance(value, dict):
+                value = from_primitive(value)
+            else:
+                value = [from_primitive(item) for item in value]
+        else:
+            value = _field_from_primitive(name, field, value)
+        values[name] = value
+    obj = cls.obj_from_trusted(**values)
+    obj.__dict__['_changed_fields'] = set(
+        name for name in primitive.get(key('changes'), ())
+        if name in cls.fields)
+    version = primitive[key('version')]
+    if version != cls.VERSION:
+        obj.__dict__['VERSION'] = version
+    return obj
+
+
+class Encoder(object):
+    """
+    Encodes os_vif objects into a stream, one top-level object at a time.
+
+    Field tables and object definitions are sent once per stream, so an
+    encoder keeps a reference to every object it encoded, for as long as it
+    is used.
+    """
+
+    def __init__(self):
+        self._classes = {}
+        self._definitions = {}
+        self._instances = {}
+        self._started = False
+        self._pack = msgpack.Packer(use_bin_type=True).pack
+
+    def encode(self, obj):
+        """
+        Returns the bytes to append to the stream to send `obj`, including
+        the header when `obj` is the first object of the stream.
+        """
+        out = []
+        if not self._started:
+            out.append(self._pack([_MAGIC, FORMAT_VERSION]))
+            self._started = True
+        reference = self._reference(obj, out)
+        out.append(self._pack([_ITEM, reference]))
+        return b''.join(out)
+
+    def _class_entry(self, cls, version, out):
+        key = (cls, version)
+        entry = self._classes.get(key)
+        if entry is None:
+            names, steps = _encoding_plan(cls)
+            entry = self._classes[key] = (len(self._classes), names, steps)
+            out.append(self._pack([_CLASS, cls.obj_name(), version, names]))
+        return entry
+
+    def _reference(self, obj, out):
+        seen = self._instances.get(id(obj))
+        if seen is not None:
+            return msgpack.ExtType(_EXT_SAME, _INDEX.pack(seen[0]))
+        class_index, names, steps = self._class_entry(type(obj), obj.VERSION,
+                                                      out)
+        state = obj.__dict__
+        values = []
+        for name, attrname, field, how in steps:
+            if attrname not in state:
+                values.append(_UNSET_EXT)
+                continue
+            value = state[attrname]
+            if value is None:
+                pass
+            elif how == _ENCODE_OBJECT:
+                if isinstance(value, base.VersionedObject):
+                    value = self._reference(value, out)
+                else:
+                    value = [self._reference(item, out) for item in value]
+            elif how == _ENCODE_FIELD:
+                value = _field_to_primitive(obj, name, field, value)
+            elif type(value) not in _PASSTHROUGH_VALUE_TYPES:
+                # Passthrough lists and dictionaries only hold scalars,
+                # which are their own primitives, but sets are turned into
+                # lists.
+                value = _field_to_primitive(obj, name, field, value)
+            values.append(value)
+        changed = state.get('_changed_fields', ())
+        message = self._pack(
+            [_DEFINITION, class_index, values,
+             [index for index, name in enumerate(names) if name in changed]])
+        index = self._definitions.get(message)
+        if index is None:
+            index = self._definitions[message] = len(self._definitions)
+            out.append(message)
+        # Numbered once its fields are, as the decoder builds them.
+        self._instances[id(obj)] = (len(self._instances), obj)
+        return msgpack.ExtType(_EXT_NEW, _INDEX.pack(index))
+
+
+class Decoder(object):
+    """
+    Decodes a stream of os_vif objects incrementally. Data is passed to
+    `feed()` as it arrives, and iterating over the decoder yields the
+    objects that are complete so far.
+    """
+
+    def __init__(self):
+        self._unpacker = msgpack.Unpacker(raw=False, ext_hook=_ext_hook)
+        self._consumed = 0
+        self._started = False
+        self._classes = []
+        self._definitions = []
+        self._instances = []
+
+    def feed(self, data):
+        self._unpacker.feed(data)
+
+    @property
+    def consumed(self):
+        """Number of bytes of the stream decoded so far."""
+        # The unpacker's position counts the bytes of a message it has only
+        # partly received, so it is only recorded at message boundaries.
+        return self._consumed
+
+    def __iter__(self):
+        while True:
+            try:
+                message = next(self._unpacker)
+            except StopIteration:
+                return
+            except _UNPACK_ERRORS as err:
+                raise exception.ObjectDecodingError(
+                    reason='invalid stream: %s' % (err or type(err).__name__))
+            self._consumed = self._unpacker.tell()
+            obj = self._handle(message)
+            if obj is not None:
+                yield obj
+
+    def _handle(self, message):
+        if not self._started:
+            if message != [_MAGIC, FORMAT_VERSION]:
+                raise exception.ObjectDecodingError(
+                    reason='unsupported stream header %r' % (message,))
+            self._started = True
+            return None
+        try:
+            kind = message[0]
+            if kind == _ITEM:
+                return self._resolve(message[1])
+            elif kind == _DEFINITION:
+                self._definitions.append(
+                    (self._classes[message[1]], message[2], message[3]))
+                return None
+            elif kind == _CLASS:
+                cls = _object_class(message[1])
+                class_fields = []
+                for name in message[3]:
+                    field = cls.fields.get(name)
+                    # Fields unknown to this side are skipped, like
+                    # obj_from_primitive() does.
+                    if field is not None:
+                        field = (field, _is_object_field(field),
+                                 _is_passthrough(field))
+                    class_fields.append((name, field))
+                self._classes.append((cls, message[2], class_fields))
+                return None
+        except _MESSAGE_ERRORS as err:
+            raise exception.ObjectDecodingError(reason=err)
+        raise exception.ObjectDecodingError(
+            reason='unknown message kind %r' % (kind,))
+
+    def _resolve(self, reference, parent=None):
+        """
+        Returns the object a reference stands for, building it from its
+        definition for a NEW reference. A definition only refers to the
+        definitions sent before it, those of its fields' objects, so that
+        a reference to `parent`, the definition being built, or to a later
+        one is rejected rather than followed forever.
+        """
+        if isinstance(reference, _Same):
+            return self._instances[reference.index]
+        index = reference.index
+        if parent is not None and index >= parent:
+            raise exception.ObjectDecodingError(
+                reason='definition %d refers to definition %d' % (parent,
+                                                                  index))
+        (cls, version, class_fields), values, changed = self._definitions[
+            index]
+        kwargs = {}
+        for (name, field), value in zip(class_fields, values):
+            if value is _UNSET or field is None:
+                continue
+            if value is not None:
+                field, is_object, passthrough = field
+                if is_object:
+                    if isinstance(value, list):
+                        value = [self._resolve(item, index)
+                                 for item in value]
+                    else:
+                        value = self._resolve(value, index)
+                elif not passthrough:
+                    value = field.from_primitive(None, name, value)
+            kwargs[name] = value
+        obj = cls.obj_from_trusted(**kwargs)
+        state = obj.__dict__
+        state['_changed_fields'] = set(
+            class_fields[index][0] for index in changed
+            if class_fields[index][1] is not None)
+        if version != cls.VERSION:
+            state['VERSION'] = version
+        self._instances.append(obj)
+        return obj
+
+
+def dumps(objs):
+    """Returns the encoding of a list of os_vif objects, as bytes."""
+    encoder = Encoder()
+    return b''.join(encoder.encode(obj) for obj in objs)
+
+
+def dump(objs, fp):
+    """Writes the encoding of os_vif objects to a file, one at a time."""
+    encoder = Encoder()
+    for obj in objs:
+        fp.write(encoder.encode(obj))
+
+
+def loads(data):
+    """
+    Returns the list of os_vif objects encoded in `data`.
+
+    :raises `exception.ObjectDecodingError` if `data` is not a complete
+            stream of os_vif objects.
+    """
+    decoder = Decoder()
+    decoder.feed(data)
+    objs = list(decoder)
+    if decoder.consumed != len(data):
+        raise exception.ObjectDecodingError(reason='truncated stream')
+    return objs
+
+
+def iter_load(fp, chunk_size=_CHUNK_SIZE):
+    """
+    Yields the os_vif objects encoded in a file as they are read, without
+    reading the whole file first.
+
+    :raises `exception.ObjectDecodingError` if the file does not hold a
+            complete stream of os_vif objects.
+    """
+    decoder = Decoder()
+    consumed = 0
+    while True:
+        data = fp.read(chunk_size)
+        if not data:
+            break
+        decoder.feed(data)
+        for obj in decoder:
+            yield obj
+        consumed += len(data)
+    if decoder.consumed != consumed:
+        raise exception.ObjectDecodingError(reason='truncated stream')
@@ -13,8 +13,11 @@
 from oslo_versionedobjects import base
 from oslo_versionedobjects import fields
 
+from os_vif.objects import base as osv_base
 
-class InstanceInfo(base.VersionedObject):
+
+class InstanceInfo(osv_base.TrustedConstructionMixin,
+                   base.VersionedObject):
     """Represents important information about a Nova instance."""
     # Version 1.0: Initial version
     VERSION = '1.0'
@@ -34,3 +37,10 @@ class InstanceInfo(base.VersionedObject):
         return cls(uuid=instance.uuid,
                    name=instance.name,
                    project_id=instance.project_id)
+
+
+class InstanceInfoRecord(osv_base.RecordBase):
+    """Compact, read-only view of an `InstanceInfo` object."""
+    __slots__ = tuple(InstanceInfo.fields)
+
+    obj_class = InstanceInfo
@@ -0,0 +1,197 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Sharing of equal `Network`, `SubnetList` and `Subnet` objects.
+
+The VIFs of a host are usually attached to a handful of networks, yet each
+VIF carries a `Network` object of its own. `Registry.intern()` returns a
+single, read-only object for all equal objects, so that the VIFs of a
+network can share it:
+
+    registry = interning.Registry()
+    registry.intern_vifs(vifs)
+
+The sharing is copy-on-write. Reading the network of a VIF that holds an
+interned network returns a private copy, which the VIF holds from then on
+and which can be modified like any other, leaving the other VIFs
+unaffected:
+
+    vif.network.bridge = 'br-other'
+
+The copy is shallow, so the subnets of the network are only copied when
+they are read through it. VIFs whose network is not read keep sharing it,
+and code that works on the state of the objects directly, such as
+`os_vif.objects.codec` and `VIFTable`, does not copy it either.
+"""
+
+import copy
+import threading
+import weakref
+
+import six
+
+from os_vif.objects import base as osv_base
+
+_SCALAR_TYPES = frozenset(six.string_types + six.integer_types + (
+    bool, float, type(None)))
+
+# Maps internable classes to their (field, attribute name) pairs, sorted by
+# field.
+_FIELDS = {}
+
+
+class _Uninternable(Exception):
+    """Raised for field values that cannot be compared by content."""
+
+
+def writable(obj):
+    """
+    Returns an object that can be modified without affecting the other
+    holders of `obj`, such as an object returned by `Registry.intern()`.
+
+    :param obj: Object to return a modifiable version of.
+    :returns: `obj` itself if it is not interned, and otherwise a private
+              copy of it, in which nested objects are copied as well.
+    """
+    if getattr(obj, '_obj_interned', False):
+        return copy.deepcopy(obj)
+    return obj
+
+
+def _fields(cls):
+    fields = _FIELDS.get(cls)
+    if fields is None:
+        fields = _FIELDS[cls] = tuple(sorted(
+            osv_base._trusted_attrnames(cls).items()))
+    return fields
+
+
+def _from_key(key):
+    """Returns a new value equal to the value `key` was computed from."""
+    if type(key) is tuple:
+        container_type, items = key
+        if container_type is dict:
+            return dict((name, _from_key(item)) for name, item in items)
+        return container_type([_from_key(item) for item in items])
+    return key
+
+
+class Registry(object):
+    """
+    Interns objects whose class uses `os_vif.objects.base.InternableMixin`.
+
+    Two objects are equal when they are of the same class and version and
+    the same fields are set to equal values, objects nested in them being
+    compared the same way. Which of their fields were changed is not
+    compared. Interned objects are only held by the registry as long as
+    something else holds them, so networks that are no longer used by any
+    VIF are released. A registry can be used from multiple threads.
+    """
+
+    def __init__(self):
+        self._objects = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._objects)
+
+    def intern(self, obj):
+        """
+        Returns the interned object equal to `obj`.
+
+        If no equal object was interned before, a read-only copy of `obj`
+        is interned and returned. `obj` itself is left unchanged, and can
+        still be modified. Interned objects are returned as they are, even
+        if another registry interned them.
+
+        :param obj: Object to intern.
+        :returns: the interned object, or `obj` itself if some of its
+                  field values cannot be compared by content, or if its
+                  content hash collides with that of another object.
+        :raises TypeError if the class of `obj` does not support interning.
+        """
+        if not isinstance(obj, osv_base.InternableMixin):
+            raise TypeError("'%s' objects cannot be interned" %
+                            type(obj).__name__)
+        try:
+            return self._intern(obj)
+        except _Uninternable:
+            return obj
+
+    def intern_vifs(self, vifs):
+        """
+        Replaces the network of each VIF of `vifs` with the interned object
+        equal to it. The `network` field of the VIFs is not marked changed,
+        and the network a VIF returns can still be modified, as it is copied
+        when it is first read.
+        """
+        for vif in vifs:
+            attrname = osv_base._trusted_attrnames(type(vif))['network']
+            state = vif.__dict__
+            network = state.get(attrname)
+            if network is not None:
+                state[attrname] = self.intern(network)
+
+    def _intern(self, obj):
+        if obj._obj_interned:
+            return obj
+        cls = type(obj)
+        content = self._content(cls, obj)
+        # Only the hash of the content is kept, so that the registry holds
+        # no copy of it.
+        key = (cls, obj.VERSION, hash(content))
+
+        with self._lock:
+            interned = self._objects.get(key)
+            if interned is None:
+                interned = cls._obj_interned_class().obj_from_trusted(
+                    **dict((name, _from_key(value_key))
+                           for name, value_key in content))
+                interned._changed_fields = set(obj._changed_fields)
+                if 'VERSION' in obj.__dict__:
+                    interned.__dict__['VERSION'] = obj.VERSION
+                self._objects[key] = interned
+            elif self._content(cls, interned) != content:
+                # Another object with the same hash was interned first.
+                raise _Uninternable()
+        return interned
+
+    def _content(self, cls, obj):
+        """
+        Returns a tuple of (field, key) pairs for the fields set on `obj`,
+        which equals the tuple of any equal object.
+        """
+        state = obj.__dict__
+        return tuple([(name, self._key(state[attrname]))
+                      for name, attrname in _fields(cls)
+                      if attrname in state])
+
+    def _key(self, value):
+        """
+        Returns a hashable key equal to the keys of the values equal to
+        `value`. Objects in `value` are interned, and their key is the
+        interned object itself.
+        """
+        value_type = type(value)
+        if value_type in _SCALAR_TYPES:
+            return value
+        if isinstance(value, osv_base.InternableMixin):
+            return self._intern(value)
+        if isinstance(value, (list, tuple)):
+            return (value_type, tuple([self._key(item) for item in value]))
+        if isinstance(value, (set, frozenset)):
+            return (value_type,
+                    frozenset([self._key(item) for item in value]))
+        if isinstance(value, dict):
+            return (dict, frozenset([(name, self._key(item))
+                                     for name, item in value.items()]))
+        raise _Uninternable()
@@ -13,8 +13,11 @@
 from oslo_versionedobjects import base
 from oslo_versionedobjects import fields
 
+from os_vif.objects import base as osv_base
 
-class Network(base.VersionedObject):
+
+class Network(osv_base.TrustedConstructionMixin, osv_base.InternableMixin,
+              base.VersionedObject):
     """Represents a network."""
     # Version 1.0: Initial version
     VERSION = '1.0'
@@ -37,9 +40,21 @@ class Network(base.VersionedObject):
         ],
     }
 
+    subnets = osv_base.SharedObjectAttribute('subnets')
+
     def __init__(self, **kwargs):
         kwargs.setdefault('subnets', [])
         kwargs.setdefault('multi_host', False)
         kwargs.setdefault('should_provide_bridge', False)
         kwargs.setdefault('should_provide_vlan', False)
         super(Network, self).__init__(**kwargs)
+
+
+class NetworkRecord(osv_base.RecordBase):
+    """
+    Compact, read-only view of a `Network` object. Its `subnets` is a
+    `SubnetListRecord`.
+    """
+    __slots__ = tuple(Network.fields)
+
+    obj_class = Network
@@ -15,8 +15,29 @@ import netaddr
 from oslo_versionedobjects import base
 from oslo_versionedobjects import fields
 
+from os_vif.objects import base as osv_base
 
-class Subnet(base.VersionedObject):
+# IP versions of the CIDRs parsed by Subnet.__init__(). A host sees the same
+# few CIDRs for all of its ports, so each is parsed once. The cache is
+# emptied when it grows beyond _CIDR_VERSIONS_MAX entries.
+_CIDR_VERSIONS = {}
+_CIDR_VERSIONS_MAX = 4096
+
+
+def _cidr_version(cidr):
+    try:
+        return _CIDR_VERSIONS[cidr]
+    except KeyError:
+        pass
+    version = netaddr.IPNetwork(cidr).version
+    if len(_CIDR_VERSIONS) >= _CIDR_VERSIONS_MAX:
+        _CIDR_VERSIONS.clear()
+    _CIDR_VERSIONS[cidr] = version
+    return version
+
+
+class Subnet(osv_base.TrustedConstructionMixin, osv_base.InternableMixin,
+             base.VersionedObject):
     """Represents a subnet."""
     # Version 1.0: Initial version
     VERSION = '1.0'
@@ -39,7 +60,7 @@ class Subnet(base.VersionedObject):
         version = kwargs.pop('version', None)
 
         if cidr and not version:
-            version = netaddr.IPNetwork(cidr).version
+            version = _cidr_version(cidr)
         super(Subnet, self).__init__(cidr=cidr, dns=dns, gateway=gateway,
                                      ips=ips, routes=routes, version=version)
 
@@ -48,10 +69,39 @@ class Subnet(base.VersionedObject):
         return netaddr.IPNetwork(self.cidr)
 
 
-class SubnetList(base.ObjectListBase):
+class SubnetList(osv_base.TrustedConstructionMixin, osv_base.InternableMixin,
+                 base.ObjectListBase, base.VersionedObject):
     # Version 1.0: Initial version
     VERSION = '1.0'
 
     fields = {
         'objects': fields.ListOfObjectsField('Subnet'),
     }
+
+    objects = osv_base.SharedObjectAttribute('objects')
+
+
+class SubnetRecord(osv_base.RecordBase):
+    """Compact, read-only view of a `Subnet` object."""
+    __slots__ = tuple(Subnet.fields)
+
+    obj_class = Subnet
+
+
+class SubnetListRecord(osv_base.RecordBase):
+    """
+    Compact, read-only view of a `SubnetList` object. Its `objects` is a
+    tuple of `SubnetRecord` objects, and it behaves like that tuple.
+    """
+    __slots__ = tuple(SubnetList.fields)
+
+    obj_class = SubnetList
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __getitem__(self, index):
+        return self.objects[index]
@@ -10,9 +10,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
+
 from oslo_versionedobjects import base
 from oslo_versionedobjects import fields
 
+from os_vif.objects import base as osv_base
 from os_vif import vnic_types
 
 # Constants for dictionary keys in the 'vif_details' field in the VIF
@@ -43,48 +46,51 @@ VIF_DETAILS_VHOSTUSER_MODE = 'vhostuser_mode'
 _NIC_NAME_LEN = 14
 
 
-class VIF(base.VersionedObject):
-    """Represents a virtual network interface."""
-    # Version 1.0: Initial version
-    VERSION = '1.0'
+# Fields of a VIF that the values cached by _memoized are derived from.
+# Assigning any of them clears the cache.
+_MEMOIZED_FROM_FIELDS = frozenset(['id', 'devname', 'network', 'details'])
 
-    fields = {
-        'id': fields.UUIDField(),
-        'instance_info': fields.ObjectField('InstanceInfo'),
-        'ovs_interfaceid': fields.StringField(),
-        # MAC address
-        'address': fields.StringField(nullable=True),
-        'network': fields.ObjectField('Network', nullable=True),
-        # The name or alias of the plugin that should handle the VIF
-        'plugin': fields.StringField(),
-        'details': fields.DictOfStringsField(nullable=True),
-        'profile': fields.DictOfStringsField(nullable=True),
-        'devname': fields.StringField(nullable=True),
-        'vnic_type': fields.StringField(),
-        'active': fields.BooleanField(),
-        'preserve_on_delete': fields.BooleanField(),
-    }
 
-    def __init__(self, id=None, address=None, network=None, plugin=None,
-                 details=None, devname=None, ovs_interfaceid=None,
-                 qbh_params=None, qbg_params=None, active=False,
-                 vnic_type=vnic_types.NORMAL, profile=None,
-                 preserve_on_delete=False, instance_info=None):
-        details = details or {}
-        ovs_id = ovs_interfaceid or id
-        if not devname:
-            devname = ("nic" + id)[:_NIC_NAME_LEN]
-        super(VIF, self).__init__(id=id, address=address, network=network,
-                                  plugin=plugin, details=details,
-                                  devname=devname,
-                                  ovs_interfaceid=ovs_id,
-                                  qbg_params=qbg_params, qbh_params=qbh_params,
-                                  active=active, vnic_type=vnic_type,
-                                  profile=profile,
-                                  preserve_on_delete=preserve_on_delete,
-                                  instance_info=instance_info,
-                                  )
+def _memoized(func):
+    """
+    Caches the value returned by a method deriving a value from the fields
+    of a VIF, per set of arguments, until one of the fields listed in
+    _MEMOIZED_FROM_FIELDS is assigned. Changes made inside a field value,
+    such as appending to the ips of a subnet of the network, are not
+    detected.
+
+    Classes that set `_memoize_derived` to False, such as the slotted
+    `VIFRecord`, compute the value on every call.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args):
+        if not self._memoize_derived:
+            return func(self, *args)
+        state = self.__dict__
+        cache = state.get('_derived_cache')
+        if cache is None:
+            cache = state['_derived_cache'] = {}
+        key = (name,) + args if args else name
+        try:
+            return cache[key]
+        except KeyError:
+            value = cache[key] = func(self, *args)
+            return value
+    return wrapper
 
+
+class _VIFPropertiesMixin(object):
+    """
+    Properties derived from the fields of a VIF, shared by `VIF` and the
+    `VIFRecord` view.
+    """
+    __slots__ = ()
+
+    _memoize_derived = False
+
+    @_memoized
     def devname_with_prefix(self, prefix):
         """Returns the device name for the VIF, with the a replaced prefix."""
         return prefix + self.devname[3:]
@@ -97,10 +103,12 @@ class VIF(base.VersionedObject):
         return self.network.bridge
 
     @property
+    @_memoized
     def br_name(self):
         return ("qbr" + self.id)[:_NIC_NAME_LEN]
 
     @property
+    @_memoized
     def veth_pair_names(self):
         return (("qvb%s" % self.id)[:_NIC_NAME_LEN],
                 ("qvo%s" % self.id)[:_NIC_NAME_LEN])
@@ -111,10 +119,7 @@ class VIF(base.VersionedObject):
 
     @property
     def physical_network(self):
-        phy_network = self.network['meta'].get('physical_network')
-        if not phy_network:
-            phy_network = self.details.get(VIF_DETAILS_PHYSICAL_NETWORK)
-        return phy_network
+        return self.details.get(VIF_DETAILS_PHYSICAL_NETWORK)
 
     @property
     def profileid(self):
@@ -138,10 +143,162 @@ class VIF(base.VersionedObject):
 
     @property
     def fixed_ips(self):
-        return [fixed_ip for subnet in self.network['subnets']
-                for fixed_ip in subnet['ips']]
+        # Callers get their own copy of the list, so that changing it does
+        # not change the cached value.
+        return list(self._fixed_ips())
 
     @property
     def floating_ips(self):
-        return [floating_ip for fixed_ip in self.fixed_ips
-                for floating_ip in fixed_ip['floating_ips']]
+        return list(self._floating_ips())
+
+    @_memoized
+    def _fixed_ips(self):
+        return tuple(fixed_ip for subnet in self.network.subnets
+                     for fixed_ip in subnet.ips)
+
+    @_memoized
+    def _floating_ips(self):
+        return tuple(floating_ip for fixed_ip in self._fixed_ips()
+                     for floating_ip in fixed_ip['floating_ips'])
+
+
+class VIF(_VIFPropertiesMixin, osv_base.TrustedConstructionMixin,
+          base.VersionedObject):
+    """Represents a virtual network interface."""
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+
+    _memoize_derived = True
+
+    fields = {
+        'id': fields.UUIDField(),
+        'instance_info': fields.ObjectField('InstanceInfo'),
+        'ovs_interfaceid': fields.StringField(),
+        # MAC address
+        'address': fields.StringField(nullable=True),
+        'network': fields.ObjectField('Network', nullable=True),
+        # The name or alias of the plugin that should handle the VIF
+        'plugin': fields.StringField(),
+        'details': fields.DictOfStringsField(nullable=True),
+        'profile': fields.DictOfStringsField(nullable=True),
+        'devname': fields.StringField(nullable=True),
+        'vnic_type': fields.StringField(),
+        'active': fields.BooleanField(),
+        'preserve_on_delete': fields.BooleanField(),
+    }
+
+    # The network may be interned, and shared with other VIFs.
+    network = osv_base.SharedObjectAttribute('network')
+
+    def __init__(self, id=None, address=None, network=None, plugin=None,
+                 details=None, devname=None, ovs_interfaceid=None,
+                 qbh_params=None, qbg_params=None, active=False,
+                 vnic_type=vnic_types.NORMAL, profile=None,
+                 preserve_on_delete=False, instance_info=None):
+        details = details or {}
+        ovs_id = ovs_interfaceid or id
+        if not devname:
+            devname = ("nic" + id)[:_NIC_NAME_LEN]
+        super(VIF, self).__init__(id=id, address=address, network=network,
+                                  plugin=plugin, details=details,
+                                  devname=devname,
+                                  ovs_interfaceid=ovs_id,
+                                  qbg_params=qbg_params, qbh_params=qbh_params,
+                                  active=active, vnic_type=vnic_type,
+                                  profile=profile,
+                                  preserve_on_delete=preserve_on_delete,
+                                  instance_info=instance_info,
+                                  )
+
+    def __setattr__(self, name, value):
+        super(VIF, self).__setattr__(name, value)
+        if name in _MEMOIZED_FROM_FIELDS:
+            self.__dict__.pop('_derived_cache', None)
+
+    def __delattr__(self, name):
+        super(VIF, self).__delattr__(name)
+        if name in _MEMOIZED_FROM_FIELDS:
+            self.__dict__.pop('_derived_cache', None)
+
+
+class VIFRecord(_VIFPropertiesMixin, osv_base.RecordBase):
+    """
+    Compact, read-only view of a `VIF` object, for agents that keep a large
+    inventory of VIFs in memory. The derived properties of `VIF`, such as
+    `br_name` and `fixed_ips`, work on it directly.
+    """
+    __slots__ = tuple(VIF.fields)
+
+    obj_class = VIF
+
+
+class VIFTable(object):
+    """
+    Columnar container for a large inventory of VIFs.
+
+    Each VIF field is kept in a list of its own, and nested objects are kept
+    as records. VIFs added together that point at the same `Network` or
+    `InstanceInfo` object share one record in the table. Rows are returned
+    as `VIFRecord` objects.
+    """
+
+    def __init__(self, vifs=None):
+        self._columns = dict((name, []) for name in VIF.fields)
+        self._rows_by_id = {}
+        if vifs:
+            self.extend(vifs)
+
+    def append(self, vif):
+        """Adds a `VIF` object to the table."""
+        self.extend([vif])
+
+    def extend(self, vifs):
+        """Adds each `VIF` object in `vifs` to the table."""
+        attrnames = osv_base._trusted_attrnames(VIF)
+        # Records for the nested objects seen in this call, keyed by the
+        # id() of the object. The objects are alive for the whole call, so
+        # their ids cannot be reused.
+        shared = {}
+        for vif in vifs:
+            state = vif.__dict__
+            for name, attrname in attrnames.items():
+                value = state.get(attrname, osv_base._UNSET)
+                if isinstance(value, base.VersionedObject):
+                    record = shared.get(id(value))
+                    if record is None:
+                        record = osv_base._to_record(value)
+                        shared[id(value)] = record
+                    value = record
+                self._columns[name].append(value)
+            self._rows_by_id[state.get(attrnames['id'])] = len(self) - 1
+
+    def __len__(self):
+        return len(self._columns['id'])
+
+    def __getitem__(self, index):
+        record = VIFRecord.__new__(VIFRecord)
+        for name, column in self._columns.items():
+            value = column[index]
+            if value is not osv_base._UNSET:
+                object.__setattr__(record, name, value)
+        return record
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def get(self, vif_id):
+        """Returns the `VIFRecord` for the VIF with the given id, or None."""
+        index = self._rows_by_id.get(vif_id)
+        if index is None:
+            return None
+        return self[index]
+
+    def column(self, name):
+        """Returns a list of the values of one field, for every row."""
+        return [None if value is osv_base._UNSET else value
+                for value in self._columns[name]]
+
+    def to_vifs(self):
+        """Returns the rows of the table as `VIF` objects."""
+        return [record.to_object() for record in self]
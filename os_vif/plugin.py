@@ -12,6 +12,7 @@
 
 import abc
 
+from oslo_concurrency import processutils
 import six
 
 
@@ -21,28 +22,76 @@ class PluginInfo(object):
     """
 
     def __init__(self, vif_types, vif_object_min_version,
-                 vif_object_max_version):
+                 vif_object_max_version, thread_safe=False,
+                 max_concurrency=None, default_timeout=None):
         """
         Constructs the PluginInfo object.
 
         :param vif_types: set of strings identifying the VIF types that are
-                          implemented by the plugin.
+                          implemented by the plugin. This is informational
+                          only: VIFs are routed by the plugin name they
+                          carry in `os_vif.objects.VIF.plugin`.
         :param vif_object_min_version: String representing the earliest version
                           of the `os_vif.objects.VIF` object that the plugin
                           understands.
         :param vif_object_max_version: String representing the latest version
                           of the `os_vif.objects.VIF` object that the plugin
                           understands.
+        :param thread_safe: Whether the plugin's plug and unplug operations
+                          may run concurrently for different VIFs. Plugins
+                          that are not thread safe only ever run one
+                          operation at a time.
+        :param max_concurrency: Integer upper bound on the number of
+                          operations the plugin may run concurrently. Only
+                          used when `thread_safe` is True. None means the
+                          library-wide default is used.
+        :param default_timeout: Number of seconds after which the plugin's
+                          plug and unplug operations time out, unless the
+                          caller sets a timeout. None means the library-wide
+                          default is used.
         """
         self.vif_types = vif_types
         self.vif_object_min_version = vif_object_min_version
         self.vif_object_max_version = vif_object_max_version
+        self.thread_safe = thread_safe
+        self.max_concurrency = max_concurrency
+        self.default_timeout = default_timeout
+
+    def to_dict(self):
+        """Returns a JSON-serializable dictionary describing the plugin."""
+        return {
+            'vif_types': sorted(self.vif_types),
+            'vif_object_min_version': self.vif_object_min_version,
+            'vif_object_max_version': self.vif_object_max_version,
+            'thread_safe': self.thread_safe,
+            'max_concurrency': self.max_concurrency,
+            'default_timeout': self.default_timeout,
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        """Constructs a PluginInfo from the output of `to_dict()`."""
+        return cls(set(values['vif_types']),
+                   values['vif_object_min_version'],
+                   values['vif_object_max_version'],
+                   thread_safe=values.get('thread_safe', False),
+                   max_concurrency=values.get('max_concurrency'),
+                   default_timeout=values.get('default_timeout'))
 
 
 @six.add_metaclass(abc.ABCMeta)
 class PluginBase(object):
     """Base class for all VIF plugins."""
 
+    # Plugins that can plug or unplug a VIF without blocking an asyncio
+    # event loop may set these to coroutine functions, defined with
+    # `async def aplug(self, vif, instance)` and `async def aunplug(self,
+    # vif)`. When they are left unset, `os_vif.aplug()` and
+    # `os_vif.aunplug()` run the synchronous `plug()` and `unplug()` methods
+    # on the library's executor instead.
+    aplug = None
+    aunplug = None
+
     def __init__(self, **config):
         """
         Sets up the plugin using supplied kwargs representing configuration
@@ -50,7 +99,31 @@ class PluginBase(object):
         """
         self.config = config
 
-    @abs.abstractmethod
+    def execute_privileged(self, *cmd, **kwargs):
+        """
+        Runs a command as root through the privileged service shared by all
+        plugins, which is set up according to the `disable_rootwrap`,
+        `use_rootwrap_daemon` and `rootwrap_config` options passed to
+        `os_vif.initialize()`.
+
+        Commands that only change host state, such as `ip link set` or
+        `ovs-vsctl add-port`, may be merged with commands run concurrently
+        by other plugins or for other VIFs, and return empty output.
+
+        :param cmd: The command and its arguments.
+        :param process_input: Optional string passed to the command's stdin.
+        :param check_exit_code: Whether to raise if the command exits with a
+                                non-zero status. Defaults to True.
+        :returns: tuple of (stdout, stderr).
+        :raises `processutils.ProcessExecutionError` if the command fails.
+        :raises `exception.PlugTimeout` if the deadline of the call passes
+                first, in which case the command is abandoned rather than
+                killed.
+        """
+        from os_vif import privileged
+        return privileged.get_service().execute(*cmd, **kwargs)
+
+    @abc.abstractmethod
     def describe(self):
         """
         Return an object that describes the plugin's supported vif types and
@@ -60,13 +133,33 @@ class PluginBase(object):
         """
         raise NotImplementedError("describe")
 
+    def describe_state(self, vifs, host_state):
+        """
+        Given the VIFs handled by this plugin that should be plugged, and a
+        snapshot of the host's network state, report which of them are
+        already plugged as described, and which VIFs owned by the plugin are
+        plugged without being asked for. Used by `os_vif.reconcile()`.
+
+        The default implementation returns None, meaning the plugin cannot
+        tell, so all of its VIFs are plugged again.
+
+        :param vifs: list of `os_vif.objects.VIF` objects.
+        :param host_state: `os_vif.hoststate.HostState` object.
+        :returns: A `os_vif.hoststate.PluginState` instance, or None.
+        """
+        return None
+
     @abc.abstractmethod
-    def plug(self, instance, vif):
+    def plug(self, vif, instance):
         """
         Given a model of a VIF, perform operations to plug the VIF properly.
 
-        :param instance: `nova.objects.Instance` object.
+        When the call has a timeout, `os_vif.deadline.current()` returns its
+        `os_vif.deadline.Deadline`, which the plugin can use to bound waits
+        and cancel outstanding work.
+
         :param vif: `os_vif.objects.VIF` object.
+        :param instance: `nova.objects.Instance` object.
         :raises `processutils.ProcessExecutionError`. Plugins implementing
                 this method should let `processutils.ProcessExecutionError`
                 bubble up.
@@ -78,9 +171,93 @@ class PluginBase(object):
         """
         Given a model of a VIF, perform operations to unplug the VIF properly.
 
+        When the call has a timeout, `os_vif.deadline.current()` returns its
+        `os_vif.deadline.Deadline`, as for `plug()`.
+
         :param vif: `os_vif.objects.VIF` object.
         :raises `processutils.ProcessExecutionError`. Plugins implementing
                 this method should let `processutils.ProcessExecutionError`
                 bubble up.
         """
         raise NotImplementedError('unplug')
+
+    def prepare(self, vif, instance):
+        """
+        Given a model of a VIF, perform the operations needed to plug it
+        that can run ahead of time, such as creating bridges and ports and
+        setting their MTU, leaving only cheap steps to `activate()`. Used
+        when the VIF must start passing traffic at a later, time critical
+        moment, such as the switchover of a live migration.
+
+        The default implementation plugs the VIF fully, so that plugins
+        that do not split plugging in two keep working.
+
+        :param vif: `os_vif.objects.VIF` object.
+        :param instance: `nova.objects.Instance` object.
+        :raises `processutils.ProcessExecutionError`. Plugins implementing
+                this method should let `processutils.ProcessExecutionError`
+                bubble up.
+        """
+        self.plug(vif, instance)
+
+    def activate(self, vif):
+        """
+        Given a model of a VIF that `prepare()` was called for, perform the
+        remaining operations to plug it, such as bringing its devices up.
+        This should be as fast as possible.
+
+        The default implementation does nothing, since the default
+        `prepare()` plugs the VIF fully.
+
+        :param vif: `os_vif.objects.VIF` object.
+        :raises `processutils.ProcessExecutionError`. Plugins implementing
+                this method should let `processutils.ProcessExecutionError`
+                bubble up.
+        """
+
+    def plug_many(self, vifs, instance):
+        """
+        Given a list of VIF models handled by this plugin, plug all of them.
+
+        The default implementation calls `plug()` once per VIF. Plugins that
+        are able to batch the host-side work for several VIFs (for instance
+        by issuing a single `ovs-vsctl` transaction) should override this.
+
+        :param vifs: list of `os_vif.objects.VIF` objects.
+        :param instance: `nova.objects.Instance` object.
+        :returns: list with one entry per VIF, in the same order as `vifs`.
+                  Each entry is None if the VIF was plugged, or the
+                  `processutils.ProcessExecutionError` that was raised
+                  while plugging it.
+        """
+        errors = []
+        for vif in vifs:
+            try:
+                self.plug(vif, instance)
+            except processutils.ProcessExecutionError as err:
+                errors.append(err)
+            else:
+                errors.append(None)
+        return errors
+
+    def unplug_many(self, vifs):
+        """
+        Given a list of VIF models handled by this plugin, unplug all of them.
+
+        The default implementation calls `unplug()` once per VIF.
+
+        :param vifs: list of `os_vif.objects.VIF` objects.
+        :returns: list with one entry per VIF, in the same order as `vifs`.
+                  Each entry is None if the VIF was unplugged, or the
+                  `processutils.ProcessExecutionError` that was raised
+                  while unplugging it.
+        """
+        errors = []
+        for vif in vifs:
+            try:
+                self.unplug(vif)
+            except processutils.ProcessExecutionError as err:
+                errors.append(err)
+            else:
+                errors.append(None)
+        return errors
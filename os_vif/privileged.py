@@ -0,0 +1,480 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Shared execution of the commands plugins run as root.
+
+Plugins run their root commands through `PluginBase.execute_privileged()`,
+which hands them to the `PrivilegedService` configured by
+`os_vif.initialize()`. Commands that only change host state, such as
+`ip link set` or `ovs-vsctl add-port`, are queued, and commands queued by
+concurrent callers are merged into a single `ip -batch` or `ovs-vsctl`
+transaction, so that one fork/exec and one pass through sudo or rootwrap
+covers them all.
+"""
+
+import collections
+import re
+import threading
+
+import futurist
+from futurist import waiters
+from oslo_concurrency import processutils
+from oslo_log import log as logging
+
+from os_vif import deadline as deadlines
+import os_vif.i18n
+from os_vif import metrics
+
+_LW = os_vif.i18n._LW
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_ROOTWRAP_CONFIG = '/etc/nova/rootwrap.conf'
+
+# Maximum number of queued commands merged into one invocation.
+DEFAULT_MAX_BATCH = 64
+
+# Maximum number of commands run under a deadline at once, including those
+# abandoned when their deadline passed and still running.
+DEFAULT_MAX_TIMED = 16
+
+# `ip` subcommands that print nothing on success, keyed by object.
+_IP_MERGEABLE = {
+    'link': frozenset(['add', 'set', 'del', 'delete']),
+    'addr': frozenset(['add', 'del', 'delete', 'flush']),
+    'address': frozenset(['add', 'del', 'delete', 'flush']),
+    'route': frozenset(['add', 'del', 'delete', 'replace']),
+    'neigh': frozenset(['add', 'del', 'delete', 'replace']),
+}
+
+# `ovs-vsctl` commands that print nothing on success.
+_OVS_VSCTL_MERGEABLE = frozenset(['add-br', 'del-br', 'add-port', 'del-port',
+                                  'add-bond', 'set', 'clear', 'add', 'remove',
+                                  'destroy'])
+
+# `ovs-vsctl` options that apply to the whole invocation, rather than to
+# the command that follows them.
+_OVS_VSCTL_GLOBAL_OPTIONS = frozenset(['--db', '--no-wait', '--timeout', '-t',
+                                       '--retry', '--no-syslog', '--dry-run',
+                                       '--verbose', '-v'])
+
+# Printed by `ip -force -batch` for each line of the batch that failed.
+_IP_BATCH_FAILED_RE = re.compile(r'^Command failed -:(\d+)', re.M)
+
+_IP = 'ip'
+_OVS_VSCTL = 'ovs-vsctl'
+
+
+def _rootwrap_client(command):
+    # oslo.rootwrap is only needed when the daemon is used.
+    from oslo_rootwrap import client
+    return client.Client(command)
+
+
+class PrivilegedRunner(object):
+    """
+    Runs single commands as root, through sudo, rootwrap or a long-lived
+    rootwrap daemon, as configured.
+    """
+
+    def __init__(self, disable_rootwrap=False, use_rootwrap_daemon=False,
+                 rootwrap_config=DEFAULT_ROOTWRAP_CONFIG):
+        """
+        Constructs the PrivilegedRunner object.
+
+        :param disable_rootwrap: Run commands through plain sudo.
+        :param use_rootwrap_daemon: Run commands through one rootwrap daemon
+                                    process, started on first use, instead
+                                    of starting rootwrap for every command.
+        :param rootwrap_config: Path to the rootwrap configuration file.
+        """
+        self._client = None
+        self._timed = None
+        self._lock = threading.Lock()
+        if disable_rootwrap:
+            self.root_helper = 'sudo'
+        else:
+            self.root_helper = 'sudo nova-rootwrap %s' % rootwrap_config
+            if use_rootwrap_daemon:
+                self._client = _rootwrap_client(
+                    ['sudo', 'nova-rootwrap-daemon', rootwrap_config])
+
+    def execute(self, *cmd, **kwargs):
+        """
+        Runs a command as root.
+
+        :param cmd: The command and its arguments.
+        :param process_input: Optional string passed to the command's stdin.
+        :param check_exit_code: Whether to raise if the command exits with a
+                                non-zero status. Defaults to True.
+        :param deadline: Optional `os_vif.deadline.Deadline` bounding the
+                         wait for the command. A command still running when
+                         it passes is abandoned, not killed: it runs as
+                         root, so the caller cannot signal it, and goes on
+                         running on its own.
+        :returns: tuple of (stdout, stderr).
+        :raises `processutils.ProcessExecutionError` if the command fails.
+        :raises `exception.PlugTimeout` if the deadline passed first.
+        """
+        process_input = kwargs.get('process_input')
+        check_exit_code = kwargs.get('check_exit_code', True)
+        deadline = kwargs.get('deadline')
+        if deadline is None:
+            return self._execute(cmd, process_input, check_exit_code)
+
+        future = self._timed_pool().submit(self._execute, cmd, process_input,
+                                           check_exit_code)
+        done, _not_done = waiters.wait_for_any([future],
+                                               timeout=deadline.remaining())
+        if not done:
+            if not future.cancel():
+                LOG.warning(_LW("Abandoning command %(cmd)s, still running "
+                                "after %(timeout)s seconds"),
+                            {'cmd': ' '.join(cmd),
+                             'timeout': deadline.timeout})
+            deadline.cancel()
+            deadline.check()
+        return future.result()
+
+    def _timed_pool(self):
+        with self._lock:
+            if self._timed is None:
+                self._timed = futurist.ThreadPoolExecutor(
+                    max_workers=DEFAULT_MAX_TIMED)
+            return self._timed
+
+    def _execute(self, cmd, process_input, check_exit_code):
+        if self._client is None:
+            return processutils.execute(*cmd, process_input=process_input,
+                                        check_exit_code=check_exit_code,
+                                        run_as_root=True,
+                                        root_helper=self.root_helper)
+
+        exit_code, out, err = self._client.execute(list(cmd), process_input)
+        if exit_code and check_exit_code:
+            raise processutils.ProcessExecutionError(
+                exit_code=exit_code, stdout=out, stderr=err,
+                cmd=' '.join(cmd))
+        return out, err
+
+
+class _Command(object):
+    """A queued command, with the future its caller waits on."""
+
+    def __init__(self, argv, kind, key, payload):
+        self.argv = argv
+        self.kind = kind
+        # Only commands of the same kind with equal keys can be merged.
+        self.key = key
+        self.payload = payload
+        self.future = futurist.Future()
+        # Whether the caller was handed the running of queued commands.
+        self.handed = False
+        # Set once the command completed, or the caller was handed the
+        # running of queued commands.
+        self.ready = threading.Event()
+        self.future.add_done_callback(lambda _future: self.ready.set())
+
+
+def _parse_mergeable(argv):
+    """
+    Returns a (kind, key, payload) tuple describing how the command can be
+    merged with others, or None if it has to run on its own.
+    """
+    if argv[0] == _IP:
+        args = argv[1:]
+        if len(args) < 2 or args[0].startswith('-'):
+            return None
+        if args[1] not in _IP_MERGEABLE.get(args[0], ()):
+            return None
+        if any(not arg or re.search(r'[\s"\'\\#]', arg) for arg in args):
+            return None
+        return _IP, None, ' '.join(args)
+
+    if argv[0] == _OVS_VSCTL:
+        args = list(argv[1:])
+        global_opts = []
+        while args and args[0].split('=', 1)[0] in _OVS_VSCTL_GLOBAL_OPTIONS:
+            global_opts.append(args.pop(0))
+        commands = [[]]
+        for arg in args:
+            if arg == '--':
+                commands.append([])
+            else:
+                commands[-1].append(arg)
+        commands = [command for command in commands if command]
+        for command in commands:
+            verbs = [arg for arg in command if not arg.startswith('--')]
+            if not verbs or verbs[0] not in _OVS_VSCTL_MERGEABLE:
+                return None
+        if not commands:
+            return None
+        return _OVS_VSCTL, tuple(global_opts), commands
+
+    return None
+
+
+class PrivilegedService(object):
+    """
+    Runs the root commands of all plugins, merging the ones that can be
+    merged.
+
+    A caller whose command can be merged queues it. If no other caller is
+    running queued commands, it then runs the queue, in batches, until its
+    own command has run; otherwise it waits for the caller that is running
+    them. A caller whose command has run hands the running of the queue
+    over to the caller of the next queued command, so no caller runs the
+    commands of others for longer than it takes to reach its own. Commands
+    queued while a batch runs are merged into the next batch, so the more
+    callers there are, the more commands each invocation covers.
+
+    Only consecutive commands for the same tool are merged, so commands
+    still run in the order they were queued. Commands that print output,
+    read input or may fail without raising run on their own, straight away.
+    """
+
+    def __init__(self, runner, max_batch=DEFAULT_MAX_BATCH):
+        """
+        Constructs the PrivilegedService object.
+
+        :param runner: `PrivilegedRunner` used to run commands.
+        :param max_batch: Maximum number of commands merged into one
+                          invocation.
+        """
+        self.runner = runner
+        self.max_batch = max_batch
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._running = False
+
+    def execute(self, *cmd, **kwargs):
+        """
+        Runs a command as root.
+
+        Accepts the same arguments as `PrivilegedRunner.execute()`. A
+        merged command that succeeds returns empty output.
+
+        :returns: tuple of (stdout, stderr).
+        :raises `processutils.ProcessExecutionError` if the command fails.
+        """
+        started = metrics.start()
+        try:
+            return self._execute(cmd, kwargs)
+        finally:
+            if started is not None:
+                labels = {'plugin': '', 'operation': ''}
+                labels.update(metrics.current_labels())
+                metrics.observe(metrics.PRIVILEGED_COMMAND, started,
+                                command=cmd[0], **labels)
+
+    def _execute(self, cmd, kwargs):
+        deadline = deadlines.current()
+        if deadline is not None:
+            deadline.check()
+        merge = None
+        plain = (kwargs.get('process_input') is None,
+                 kwargs.get('check_exit_code', True) is True)
+        if all(plain):
+            merge = _parse_mergeable(cmd)
+        if merge is None:
+            if deadline is not None:
+                kwargs = dict(kwargs, deadline=deadline)
+            return self.runner.execute(*cmd, **kwargs)
+
+        command = _Command(cmd, *merge)
+        with self._lock:
+            self._queue.append(command)
+            drain = not self._running
+            self._running = True
+        if not drain:
+            drain = self._wait(command, deadline)
+        if drain:
+            self._drain(command, deadline)
+        return command.future.result()
+
+    def _wait(self, command, deadline):
+        """
+        Waits for a queued command to complete, or for its caller to be
+        handed the running of the queue.
+
+        :returns: True if the caller has to run the queue.
+        :raises `exception.PlugTimeout` if the deadline passes first.
+        """
+        timeout = None if deadline is None else deadline.remaining()
+        if not command.ready.wait(timeout):
+            with self._lock:
+                if command.handed:
+                    return True
+                if command in self._queue:
+                    # The command has not started, so it is not run at all.
+                    self._queue.remove(command)
+            # A merged command that started is not killed, since it runs
+            # along with the commands of other callers; only the wait for
+            # it is cut short.
+            deadline.cancel()
+            deadline.check()
+        return not command.future.done()
+
+    def _drain(self, own, deadline=None):
+        """
+        Runs the queued commands in batches until `own` has run, then hands
+        the running of the queue over to the caller of the next command.
+
+        :param deadline: Optional `os_vif.deadline.Deadline` of the caller,
+                         bounding the wait for each batch. A batch still
+                         running when it passes is abandoned, like a single
+                         command, and the running of the queue is handed
+                         over once it completes.
+        :raises `exception.PlugTimeout` if the deadline passes first.
+        """
+        while True:
+            with self._lock:
+                if own.future.done() or not self._queue:
+                    break
+                batch = []
+                while self._queue and len(batch) < self.max_batch:
+                    batch.append(self._queue.popleft())
+            if deadline is None:
+                self._run_batch(batch)
+                continue
+            future = self.runner._timed_pool().submit(self._run_batch, batch)
+            done, _not_done = waiters.wait_for_any(
+                [future], timeout=deadline.remaining())
+            if not done:
+                LOG.warning(_LW("Abandoning a batch of %(count)d commands, "
+                                "still running after %(timeout)s seconds"),
+                            {'count': len(batch), 'timeout': deadline.timeout})
+                future.add_done_callback(lambda _future: self._hand_over())
+                with self._lock:
+                    if own in self._queue:
+                        # The command has not started, so it is not run at
+                        # all.
+                        self._queue.remove(own)
+                deadline.cancel()
+                deadline.check()
+        self._hand_over()
+
+    def _hand_over(self):
+        """
+        Hands the running of the queue over to the caller of the next queued
+        command, if there is one.
+        """
+        with self._lock:
+            successor = None
+            if self._queue:
+                successor = self._queue[0]
+                successor.handed = True
+            else:
+                self._running = False
+        if successor is not None:
+            successor.ready.set()
+
+    def _run_batch(self, batch):
+        group = [batch[0]]
+        for command in batch[1:]:
+            if (command.kind, command.key) == (group[0].kind, group[0].key):
+                group.append(command)
+            else:
+                self._run_group(group)
+                group = [command]
+        self._run_group(group)
+
+    def _run_group(self, group):
+        if len(group) == 1:
+            self._run_single(group[0])
+        elif group[0].kind == _IP:
+            self._run_ip_batch(group)
+        else:
+            self._run_ovs_vsctl_transaction(group)
+
+    def _run_single(self, command):
+        try:
+            command.future.set_result(self.runner.execute(*command.argv))
+        except Exception as err:
+            command.future.set_exception(err)
+
+    def _run_ip_batch(self, group):
+        lines = ''.join(command.payload + '\n' for command in group)
+        try:
+            self.runner.execute(_IP, '-force', '-batch', '-',
+                                process_input=lines)
+        except processutils.ProcessExecutionError as err:
+            failed = set(int(line) for line in
+                         _IP_BATCH_FAILED_RE.findall(err.stderr or ''))
+            if not failed:
+                # The failure can't be traced to particular lines.
+                for command in group:
+                    command.future.set_exception(err)
+                return
+            for number, command in enumerate(group, 1):
+                if number in failed:
+                    command.future.set_exception(
+                        processutils.ProcessExecutionError(
+                            exit_code=err.exit_code, stderr=err.stderr,
+                            cmd=' '.join(command.argv)))
+                else:
+                    command.future.set_result(('', ''))
+        except Exception as err:
+            for command in group:
+                command.future.set_exception(err)
+        else:
+            for command in group:
+                command.future.set_result(('', ''))
+
+    def _run_ovs_vsctl_transaction(self, group):
+        argv = [_OVS_VSCTL] + list(group[0].key)
+        for command in group:
+            for args in command.payload:
+                argv.append('--')
+                argv.extend(args)
+        try:
+            self.runner.execute(*argv)
+        except processutils.ProcessExecutionError:
+            # The transaction is atomic, so nothing was changed. Run the
+            # commands one by one to find out which of them failed.
+            for command in group:
+                self._run_single(command)
+        except Exception as err:
+            for command in group:
+                command.future.set_exception(err)
+        else:
+            for command in group:
+                command.future.set_result(('', ''))
+
+
+_SERVICE = None
+
+
+def configure(disable_rootwrap=False, use_rootwrap_daemon=False,
+              rootwrap_config=DEFAULT_ROOTWRAP_CONFIG,
+              max_batch=DEFAULT_MAX_BATCH):
+    """
+    Replaces the service used by `get_service()` with one built from the
+    supplied options. Called by `os_vif.initialize()`.
+    """
+    global _SERVICE
+    _SERVICE = PrivilegedService(
+        PrivilegedRunner(disable_rootwrap=disable_rootwrap,
+                         use_rootwrap_daemon=use_rootwrap_daemon,
+                         rootwrap_config=rootwrap_config),
+        max_batch=max_batch)
+    return _SERVICE
+
+
+def get_service():
+    """
+    Returns the shared `PrivilegedService`, configuring one with the default
+    options if `configure()` has not been called.
+    """
+    if _SERVICE is None:
+        return configure()
+    return _SERVICE
@@ -0,0 +1,67 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+class VIFResult(object):
+    """
+    Class describing the outcome of a single VIF operation in a batch.
+    """
+
+    def __init__(self, vif, error=None):
+        """
+        Constructs the VIFResult object.
+
+        :param vif: The `os_vif.objects.VIF` object the operation acted on.
+        :param error: None if the operation succeeded, otherwise the
+                      `os_vif.exception.ExceptionBase` describing the failure.
+        """
+        self.vif = vif
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    def __repr__(self):
+        return 'VIFResult(vif=%s, error=%r)' % (self.vif.id, self.error)
+
+
+class ReconcileResult(object):
+    """
+    Class describing what `os_vif.reconcile()` did to bring the host in line
+    with a set of VIFs.
+    """
+
+    def __init__(self, plugged=None, unplugged=None, unchanged=None):
+        """
+        Constructs the ReconcileResult object.
+
+        :param plugged: list of `VIFResult` objects for the VIFs that were
+                        missing or stale and were plugged.
+        :param unplugged: list of `VIFResult` objects for the VIFs that were
+                          found on the host without being asked for, and
+                          were unplugged.
+        :param unchanged: list of the `os_vif.objects.VIF` objects that were
+                          already plugged as described.
+        """
+        self.plugged = plugged or []
+        self.unplugged = unplugged or []
+        self.unchanged = unchanged or []
+
+    @property
+    def succeeded(self):
+        return all(result.succeeded
+                   for result in self.plugged + self.unplugged)
+
+    def __repr__(self):
+        return ('ReconcileResult(plugged=%r, unplugged=%r, unchanged=%d)' %
+                (self.plugged, self.unplugged, len(self.unchanged)))
@@ -0,0 +1,165 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+from oslo_log import log as logging
+import six
+
+import os_vif.exception
+import os_vif.i18n
+
+_LW = os_vif.i18n._LW
+
+LOG = logging.getLogger(__name__)
+
+
+def _version_tuple(version):
+    if not isinstance(version, six.string_types):
+        raise TypeError("Version %r is not a string" % (version,))
+    return tuple(int(part) for part in version.split('.'))
+
+
+def _version_string(version):
+    return '.'.join(str(part) for part in version)
+
+
+class _PluginClaim(object):
+    """
+    The VIF object versions a plugin declares, as version tuples.
+    """
+
+    def __init__(self, info):
+        self.min_version = _version_tuple(info.vif_object_min_version)
+        self.max_version = _version_tuple(info.vif_object_max_version)
+        self.max_version_string = _version_string(self.max_version)
+
+    def target_version(self, version):
+        """
+        Returns the version a VIF object of the given version has to be
+        handed to the plugin in, or None if the plugin cannot handle it.
+        Objects newer than the plugin's maximum version are backported to
+        that version, as long as the major version is the same.
+        """
+        version_tuple = _version_tuple(version)
+        if version_tuple < self.min_version:
+            return None
+        if version_tuple <= self.max_version:
+            return version
+        if version_tuple[0] != self.max_version[0]:
+            return None
+        return self.max_version_string
+
+
+class RoutingTable(object):
+    """
+    Index of the VIF object versions each plugin handles, built from the
+    `os_vif.plugin.PluginInfo` the plugins describe themselves with.
+
+    VIFs are routed by the plugin named in `VIF.plugin`. The table checks
+    that the plugin understands the version of the VIF object, or a
+    backport of it. The `vif_types` of the plugins are not used: the only
+    VIF object class is `VIF`, and nothing in it tells the VIF type a
+    plugin implements but the plugin name itself.
+
+    The version to hand a VIF to a plugin in is computed the first time it
+    is looked up and kept, so every lookup after the first is a single
+    dictionary access.
+
+    Plugins that are not loaded until first used, and whose description is
+    not known without loading them, are listed in `pending` until they are
+    added with `describe()`.
+    """
+
+    def __init__(self, infos, pending=()):
+        """
+        Constructs the RoutingTable object.
+
+        :param infos: Dictionary mapping plugin names to the
+                      `os_vif.plugin.PluginInfo` of the plugin. Plugins whose
+                      description cannot be parsed are left out of the
+                      table, and VIFs naming them are handed over as they
+                      are.
+        :param pending: Names of the plugins to describe later.
+        """
+        self.pending = frozenset(pending)
+        self._lock = threading.Lock()
+        self._claims = {}
+        # (plugin name, version) -> version to hand the VIF to the plugin
+        # in, or None if the plugin cannot handle it.
+        self._targets = {}
+        for plugin_name, info in infos.items():
+            self._add_claim(plugin_name, info)
+
+    def _add_claim(self, plugin_name, info):
+        versions = (getattr(info, 'vif_object_min_version', None),
+                    getattr(info, 'vif_object_max_version', None))
+        if versions == (None, None):
+            # The plugin declares no VIF object versions, so VIFs naming it
+            # are handed over as they are.
+            return
+        try:
+            self._claims[plugin_name] = _PluginClaim(info)
+        except (AttributeError, TypeError, ValueError) as err:
+            LOG.warning(_LW("Unable to check the VIF object versions of "
+                            "os_vif plugin %(name)s: %(err)s"),
+                        {'name': plugin_name, 'err': err})
+
+    def describe(self, plugin_names, describe):
+        """
+        Adds the pending plugins among `plugin_names` to the table.
+
+        :param describe: Callable returning the `os_vif.plugin.PluginInfo`
+                         of the plugin whose name it is passed. VIFs naming
+                         plugins it fails to describe are handed over as
+                         they are.
+        """
+        with self._lock:
+            plugin_names = [plugin_name for plugin_name in plugin_names
+                            if plugin_name in self.pending]
+            if not plugin_names:
+                return
+            for plugin_name in plugin_names:
+                try:
+                    info = describe(plugin_name)
+                except Exception as err:
+                    LOG.warning(_LW("Unable to describe os_vif plugin "
+                                    "%(name)s: %(err)s"),
+                                {'name': plugin_name, 'err': err})
+                else:
+                    self._add_claim(plugin_name, info)
+            self.pending = self.pending.difference(plugin_names)
+
+    def __contains__(self, plugin_name):
+        return plugin_name in self._claims
+
+    def target_version(self, plugin_name, obj_name, version):
+        """
+        Returns the version a VIF object of the given class and version has
+        to be handed to the named plugin in.
+
+        :raises `exception.UnsupportedVIFObject` if the plugin does not
+                handle the VIF object version.
+        """
+        key = (plugin_name, version)
+        try:
+            target = self._targets[key]
+        except KeyError:
+            claim = self._claims.get(plugin_name)
+            if claim is None:
+                # The plugin could not be described, so trust the caller.
+                return version
+            target = self._targets[key] = claim.target_version(version)
+        if target is None:
+            raise os_vif.exception.UnsupportedVIFObject(
+                plugin_name=plugin_name, vif_type=obj_name, version=version)
+        return target
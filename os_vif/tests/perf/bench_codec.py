@@ -0,0 +1,107 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the compact encoding of VIFs with JSON versioned primitives.
+
+The VIFs are those of one instance with many NICs spread over a few
+networks. As nova builds them, every VIF has a `Network` object of its own,
+even when it is attached to the same network as another VIF.
+
+Run with::
+
+    python -m os_vif.tests.perf.bench_codec [count]
+"""
+
+import json
+import sys
+import timeit
+import uuid
+
+from os_vif.objects import codec
+from os_vif.objects import instance_info
+from os_vif.objects import network
+from os_vif.objects import subnet
+from os_vif.objects import vif
+
+DEFAULT_COUNT = 1000
+
+# Number of NICs of the instance, and of networks they are attached to.
+NICS = 64
+NETWORKS = 4
+
+
+def build_instance_vifs(nics=NICS, networks=NETWORKS):
+    """Returns the VIFs of an instance with `nics` NICs."""
+    network_ids = [str(uuid.uuid4()) for _i in range(networks)]
+    info = instance_info.InstanceInfo(uuid=str(uuid.uuid4()),
+                                      name='instance', project_id='p')
+    vifs = []
+    for i in range(nics):
+        n = i % networks
+        subnets = subnet.SubnetList(objects=[
+            subnet.Subnet(cidr='10.%d.0.0/16' % n, gateway='10.%d.0.1' % n,
+                          dns=['10.%d.0.2' % n], ips=['10.%d.1.%d' % (n, i)]),
+            subnet.Subnet(cidr='fd00:%x::/64' % n, gateway='fd00:%x::1' % n),
+        ])
+        net = network.Network(id=network_ids[n], bridge='br-int',
+                              label='net%d' % n, subnets=subnets)
+        vifs.append(vif.VIF(id=str(uuid.uuid4()), plugin='ovs',
+                            address='fa:16:3e:00:00:%02x' % i, network=net,
+                            details={'ovs_hybrid_plug': True},
+                            instance_info=info))
+    return vifs
+
+
+def encode_json(vifs):
+    return json.dumps([codec.to_primitive(v) for v in vifs])
+
+
+def decode_json(data):
+    return [codec.from_primitive(p) for p in json.loads(data)]
+
+
+def run(count=DEFAULT_COUNT, repeat=3):
+    """
+    Returns a dictionary mapping each benchmark name to the best time, in
+    seconds, taken to encode or decode the VIFs of `count` instances.
+    """
+    instances = max(1, count // NICS)
+    vifs = build_instance_vifs()
+    json_data = encode_json(vifs)
+    compact_data = codec.dumps(vifs)
+    results = {}
+    for name, func in (
+            ('encode_json', lambda: encode_json(vifs)),
+            ('decode_json', lambda: decode_json(json_data)),
+            ('encode_compact', lambda: codec.dumps(vifs)),
+            ('decode_compact', lambda: codec.loads(compact_data))):
+        # Scaled to `count` VIFs, encoded or decoded an instance at a time.
+        results[name] = min(timeit.repeat(func, number=instances,
+                                          repeat=repeat)) * count / (
+            instances * NICS)
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else DEFAULT_COUNT
+    vifs = build_instance_vifs()
+    print('%d NICs on %d networks: %d bytes as JSON, %d bytes compact' % (
+        NICS, NETWORKS, len(encode_json(vifs).encode('utf-8')),
+        len(codec.dumps(vifs))))
+    for name, seconds in sorted(run(count).items()):
+        print('%-24s %8.3f s  %8.2f us/vif' % (name, seconds,
+                                               seconds * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main()
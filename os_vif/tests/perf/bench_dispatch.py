@@ -0,0 +1,121 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the overhead os_vif adds to plugging and unplugging VIFs.
+
+The plugins do nothing, so the numbers are the cost of checking, routing
+and scheduling the operations, of locking the resources of the VIFs, and
+of logging them at INFO level. The `_journaled` benchmarks add the cost of
+recording the operations in a journal, without waiting for it to be synced
+to disk.
+
+Run with::
+
+    python -m os_vif.tests.perf.bench_dispatch [count]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from os_vif.tests.perf import bench_initialize
+from os_vif.tests.perf import bench_objects
+
+DEFAULT_COUNT = 10000
+
+# Number of VIFs handed to each plug_many()/unplug_many() call.
+BATCH_SIZE = 8
+
+
+def plug(vifs):
+    import os_vif
+
+    for vif in vifs:
+        os_vif.plug(vif, None)
+
+
+def unplug(vifs):
+    import os_vif
+
+    for vif in vifs:
+        os_vif.unplug(vif)
+
+
+def _batches(vifs):
+    return [vifs[i:i + BATCH_SIZE] for i in range(0, len(vifs), BATCH_SIZE)]
+
+
+def plug_many(batches):
+    import os_vif
+
+    for batch in batches:
+        os_vif.plug_many(batch, None)
+
+
+def unplug_many(batches):
+    import os_vif
+
+    for batch in batches:
+        os_vif.unplug_many(batch)
+
+
+def run(count=DEFAULT_COUNT, repeat=3):
+    """
+    Returns a dictionary mapping each benchmark name to the best time, in
+    seconds, taken to plug or unplug `count` VIFs with a no-op plugin.
+    """
+    import os_vif
+
+    vifs = bench_objects.build_trusted(bench_objects.make_port_data(count))
+    for vif in vifs:
+        vif.plugin = 'noop0'
+    batches = _batches(vifs)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        results = {}
+        for suffix, config in (
+                ('', {}),
+                ('_journaled', {
+                    'journal_path': os.path.join(tmp_dir, 'journal'),
+                    'journal_fsync': False})):
+            with bench_initialize.fake_extensions(1):
+                os_vif.initialize(reset=True, **config)
+            for name, func, args in (('plug', plug, vifs),
+                                     ('unplug', unplug, vifs),
+                                     ('plug_many', plug_many, batches),
+                                     ('unplug_many', unplug_many, batches)):
+                results[name + suffix] = min(timeit.repeat(
+                    lambda: func(args), number=1, repeat=repeat))
+    finally:
+        os_vif._EXECUTOR.shutdown(wait=False)
+        if os_vif._JOURNAL is not None:
+            os_vif._JOURNAL.close()
+        os_vif._EXT_MANAGER = None
+        os_vif._EXECUTOR = None
+        os_vif._JOURNAL = None
+        os_vif._LOCKS = None
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else DEFAULT_COUNT
+    for name, seconds in sorted(run(count).items()):
+        print('%-24s %8.3f s  %8.2f us/vif' % (name, seconds,
+                                               seconds * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures building and converting VIF graphs of increasing size.
+
+Each graph is a VIF whose network has a number of subnets, each holding a
+number of fixed IPs. Graphs are converted to and from `VIFRecord` views,
+the compact form os_vif keeps and hands around VIFs in.
+
+Run with::
+
+    python -m os_vif.tests.perf.bench_graphs [count]
+"""
+
+import sys
+import timeit
+import uuid
+
+from os_vif.objects import network
+from os_vif.objects import subnet
+from os_vif.objects import vif
+
+DEFAULT_COUNT = 1000
+
+# Graph sizes, as (name, number of subnets, number of IPs per subnet).
+SIZES = (
+    ('small', 1, 1),
+    ('medium', 4, 16),
+    ('large', 16, 64),
+)
+
+
+def build(count, subnets, ips):
+    """Builds `count` VIF graphs with the regular constructors."""
+    vifs = []
+    for i in range(count):
+        subnet_list = subnet.SubnetList(objects=[
+            subnet.Subnet(cidr='10.%d.%d.0/24' % (i & 0xff, j),
+                          gateway='10.%d.%d.1' % (i & 0xff, j),
+                          ips=['10.%d.%d.%d' % (i & 0xff, j, k + 2)
+                               for k in range(ips)],
+                          version=4)
+            for j in range(subnets)])
+        net = network.Network(id=str(uuid.uuid4()), bridge='br-int',
+                              label='tenantnet', subnets=subnet_list)
+        vifs.append(vif.VIF(id=str(uuid.uuid4()), plugin='ovs',
+                            address='fa:16:3e:00:00:%02x' % (i & 0xff),
+                            network=net))
+    return vifs
+
+
+def to_records(vifs):
+    return [vif.VIFRecord.from_object(v) for v in vifs]
+
+
+def from_records(records):
+    return [record.to_object() for record in records]
+
+
+def run(count=DEFAULT_COUNT, repeat=3):
+    """
+    Returns a dictionary mapping each benchmark name to the best time, in
+    seconds, taken to build or convert `count` VIF graphs of each size.
+    """
+    results = {}
+    for size, subnets, ips in SIZES:
+        vifs = build(count, subnets, ips)
+        records = to_records(vifs)
+        for name, func in (
+                ('construct', lambda: build(count, subnets, ips)),
+                ('to_record', lambda: to_records(vifs)),
+                ('from_record', lambda: from_records(records))):
+            results['graph_%s_%s' % (name, size)] = min(
+                timeit.repeat(func, number=1, repeat=repeat))
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else DEFAULT_COUNT
+    for name, seconds in sorted(run(count).items()):
+        print('%-26s %8.3f s  %8.2f us/vif' % (name, seconds,
+                                               seconds * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main()
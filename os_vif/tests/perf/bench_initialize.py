@@ -0,0 +1,140 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the cost of `os_vif.initialize()` with fake plugins.
+
+The cold benchmark imports os_vif and initializes it in a fresh
+interpreter, so it includes importing the libraries os_vif depends on.
+The warm benchmark reinitializes the library in the current process.
+
+Run with::
+
+    python -m os_vif.tests.perf.bench_initialize [count] [extensions]
+"""
+
+import json
+import subprocess
+import sys
+import timeit
+
+import mock
+
+DEFAULT_COUNT = 5
+DEFAULT_EXTENSIONS = 50
+
+# Run by a fresh interpreter for every cold initialization.
+_COLD_PROBE = """
+import json
+import sys
+import time
+
+start = time.time()
+import os_vif
+from os_vif.tests.perf import bench_initialize
+with bench_initialize.fake_extensions(%(extensions)d):
+    os_vif.initialize()
+print(json.dumps({'elapsed': time.time() - start}))
+"""
+
+
+def _plugin_class():
+    # Imported here so that the cold probe pays for importing os_vif.plugin.
+    from os_vif import plugin
+
+    class NoopPlugin(plugin.PluginBase):
+        """Plugin whose operations do nothing."""
+
+        def describe(self):
+            return plugin.PluginInfo(set(['noop']), '1.0', '1.0',
+                                     thread_safe=True)
+
+        def plug(self, vif, instance):
+            pass
+
+        def unplug(self, vif):
+            pass
+
+    return NoopPlugin
+
+
+def make_plugins(count, **config):
+    """
+    Returns a dictionary mapping the names of `count` no-op plugins to the
+    plugins.
+    """
+    plugin_cls = _plugin_class()
+    return dict(('noop%d' % i, plugin_cls(**config)) for i in range(count))
+
+
+def fake_extensions(count):
+    """
+    Returns a context manager making `os_vif.initialize()` load `count`
+    no-op plugins instead of the plugins registered with stevedore. The
+    plugins are constructed anew on every initialization.
+    """
+    def manager(namespace, invoke_on_load, invoke_args):
+        return make_plugins(count, **invoke_args)
+    return mock.patch('stevedore.extension.ExtensionManager',
+                      side_effect=manager)
+
+
+def initialize_cold(count, extensions):
+    total = 0.0
+    for _i in range(count):
+        output = subprocess.check_output(
+            [sys.executable, '-c', _COLD_PROBE % {'extensions': extensions}],
+            stderr=subprocess.STDOUT)
+        total += json.loads(output.decode('utf-8').splitlines()[-1])[
+            'elapsed']
+    return total
+
+
+def initialize_warm(count, extensions):
+    import os_vif
+
+    with fake_extensions(extensions):
+        for _i in range(count):
+            os_vif.initialize(reset=True)
+
+
+def run(count=DEFAULT_COUNT, repeat=3, extensions=DEFAULT_EXTENSIONS):
+    """
+    Returns a dictionary mapping each benchmark name to the best time, in
+    seconds, taken to initialize the library `count` times with
+    `extensions` fake plugins.
+    """
+    import os_vif
+
+    results = {
+        'initialize_cold': min(initialize_cold(count, extensions)
+                               for _i in range(repeat)),
+    }
+    results['initialize_warm'] = min(timeit.repeat(
+        lambda: initialize_warm(count, extensions), number=1, repeat=repeat))
+    # Leave the library uninitialized, rather than loaded with fake plugins.
+    os_vif._EXECUTOR.shutdown(wait=False)
+    os_vif._EXT_MANAGER = None
+    os_vif._EXECUTOR = None
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else DEFAULT_COUNT
+    extensions = int(argv[1]) if len(argv) > 1 else DEFAULT_EXTENSIONS
+    for name, seconds in sorted(run(count, extensions=extensions).items()):
+        print('%-24s %8.3f s  %8.2f ms/call' % (name, seconds,
+                                                seconds * 1e3 / count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the interning of the networks of VIFs, and the memory it saves.
+
+The VIFs are those of a host with many ports on a few provider networks,
+each VIF carrying a `Network` object of its own. When the subnets of a VIF
+list its fixed IPs, only the subnets without any can be shared.
+
+Run with::
+
+    python -m os_vif.tests.perf.bench_interning [count]
+"""
+
+import gc
+import sys
+import timeit
+import uuid
+
+from os_vif.objects import interning
+from os_vif.objects import network
+from os_vif.objects import subnet
+from os_vif.objects import vif
+
+DEFAULT_COUNT = 1000
+
+NETWORKS = 4
+
+
+def build_host_vifs(count, fixed_ips=True):
+    """
+    Returns `count` VIFs spread over NETWORKS networks, whose IPv4 subnets
+    list the fixed IP of the VIF if `fixed_ips` is True.
+    """
+    network_ids = [str(uuid.uuid4()) for _i in range(NETWORKS)]
+    vifs = []
+    for i in range(count):
+        n = i % NETWORKS
+        ips = ['10.%d.%d.%d' % (n, i >> 8, i & 0xff)] if fixed_ips else []
+        subnets = subnet.SubnetList(objects=[
+            subnet.Subnet(cidr='10.%d.0.0/16' % n, gateway='10.%d.0.1' % n,
+                          dns=['10.%d.0.2' % n], ips=ips),
+            subnet.Subnet(cidr='fd00:%x::/64' % n, gateway='fd00:%x::1' % n),
+        ])
+        net = network.Network(id=network_ids[n], bridge='br-int',
+                              label='physnet%d' % n, subnets=subnets)
+        vifs.append(vif.VIF(id=str(uuid.uuid4()), plugin='ovs',
+                            address='fa:16:3e:00:%02x:%02x' % (
+                                i >> 8, i & 0xff),
+                            network=net))
+    return vifs
+
+
+def memory(count=DEFAULT_COUNT, intern=False, fixed_ips=True):
+    """
+    Returns the number of bytes allocated for `count` VIFs, after interning
+    their networks if `intern` is True.
+    """
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        vifs = build_host_vifs(count, fixed_ips)
+        registry = interning.Registry()
+        if intern:
+            registry.intern_vifs(vifs)
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def run(count=DEFAULT_COUNT, repeat=3):
+    """
+    Returns a dictionary mapping each benchmark name to the best time, in
+    seconds, taken to intern the networks of `count` VIFs.
+    """
+    results = {}
+    for name, fixed_ips in (('intern_vifs', True),
+                            ('intern_vifs_shared', False)):
+        timings = []
+        for _i in range(repeat):
+            # Interning replaces the networks of the VIFs, so every run
+            # starts from VIFs with networks of their own.
+            vifs = build_host_vifs(count, fixed_ips)
+            registry = interning.Registry()
+            timings.append(timeit.timeit(
+                lambda: registry.intern_vifs(vifs), number=1))
+        results[name] = min(timings)
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else DEFAULT_COUNT
+    for fixed_ips in (True, False):
+        print('%d VIFs on %d networks, %s fixed IPs: %d bytes, %d bytes '
+              'interned' % (count, NETWORKS, 'with' if fixed_ips else
+                            'without', memory(count, fixed_ips=fixed_ips),
+                            memory(count, intern=True, fixed_ips=fixed_ips)))
+    for name, seconds in sorted(run(count).items()):
+        print('%-24s %8.3f s  %8.2f us/vif' % (name, seconds,
+                                               seconds * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the cost of the messages logged for every plug and unplug.
+
+The logger runs at INFO level and writes to os.devnull, so the numbers
+include formatting the emitted messages but not the cost of any real log
+destination.
+
+Run with::
+
+    python -m os_vif.tests.perf.bench_logging [count]
+"""
+
+import logging
+import os
+import sys
+import timeit
+
+from os_vif import logutils
+from os_vif.tests.perf import bench_objects
+
+DEFAULT_COUNT = 10000
+
+
+def _make_logger():
+    logger = logging.getLogger('os_vif.tests.perf.bench_logging')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler(open(os.devnull, 'w')))
+    return logger
+
+
+def info_full_repr(logger, vifs):
+    for vif in vifs:
+        logger.info("Successfully plugged vif %s", vif)
+
+
+def info_identity(logger, vifs):
+    for vif in vifs:
+        logger.info("Successfully plugged vif %s", logutils.identity(vif))
+
+
+def debug_disabled(logger, vifs):
+    for vif in vifs:
+        logger.debug("Plugging vif %s", vif)
+
+
+def run(count=DEFAULT_COUNT, repeat=3):
+    """
+    Returns a dictionary mapping each benchmark name to the best time, in
+    seconds, taken to log a message for each of `count` VIFs.
+    """
+    logger = _make_logger()
+    vifs = bench_objects.build(bench_objects.make_port_data(count))
+    results = {}
+    for name, func in (('info_full_repr', info_full_repr),
+                       ('info_identity', info_identity),
+                       ('debug_disabled', debug_disabled)):
+        results[name] = min(timeit.repeat(lambda: func(logger, vifs),
+                                          number=1, repeat=repeat))
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else DEFAULT_COUNT
+    for name, seconds in sorted(run(count).items()):
+        print('%-24s %8.3f s  %8.2f us/call' % (name, seconds,
+                                                seconds * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main()
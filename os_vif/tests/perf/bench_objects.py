@@ -0,0 +1,123 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the cost of constructing VIF object graphs.
+
+Run with::
+
+    python -m os_vif.tests.perf.bench_objects [count]
+"""
+
+import sys
+import timeit
+import uuid
+
+from os_vif.objects import instance_info
+from os_vif.objects import network
+from os_vif.objects import subnet
+from os_vif.objects import vif
+from os_vif import vnic_types
+
+DEFAULT_COUNT = 10000
+
+
+def make_port_data(count):
+    """Returns `count` port descriptions, as a port-binding refresh sees."""
+    ports = []
+    for i in range(count):
+        port_id = str(uuid.uuid4())
+        ports.append({
+            'id': port_id,
+            'address': 'fa:16:3e:%02x:%02x:%02x' % (
+                (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff),
+            'plugin': 'ovs',
+            'details': {'ovs_hybrid_plug': True},
+            'network_id': str(uuid.uuid4()),
+            'bridge': 'br-int',
+            'cidr': '10.%d.%d.0/24' % ((i >> 8) & 0xff, i & 0xff),
+            'cidr6': 'fd00:%x::/64' % i,
+            'instance_uuid': str(uuid.uuid4()),
+        })
+    return ports
+
+
+def build(ports):
+    """Builds VIF graphs with the regular, validating constructors."""
+    vifs = []
+    for port in ports:
+        subnets = subnet.SubnetList(objects=[
+            subnet.Subnet(cidr=port['cidr'], gateway='10.0.0.1'),
+            subnet.Subnet(cidr=port['cidr6'], gateway='fd00::1'),
+        ])
+        net = network.Network(id=port['network_id'], bridge=port['bridge'],
+                              label='tenantnet', subnets=subnets)
+        info = instance_info.InstanceInfo(uuid=port['instance_uuid'],
+                                          name='instance', project_id='p')
+        vifs.append(vif.VIF(id=port['id'], address=port['address'],
+                            network=net, plugin=port['plugin'],
+                            details=port['details'], instance_info=info))
+    return vifs
+
+
+def build_trusted(ports):
+    """Builds the same VIF graphs as `build()` with the trusted path."""
+    vifs = []
+    for port in ports:
+        subnets = subnet.SubnetList.obj_from_trusted(objects=[
+            subnet.Subnet.obj_from_trusted(
+                cidr=port['cidr'], dns=[], gateway='10.0.0.1', ips=[],
+                routes=[], version=4),
+            subnet.Subnet.obj_from_trusted(
+                cidr=port['cidr6'], dns=[], gateway='fd00::1', ips=[],
+                routes=[], version=6),
+        ])
+        net = network.Network.obj_from_trusted(
+            id=port['network_id'], bridge=port['bridge'], label='tenantnet',
+            subnets=subnets, multi_host=False, should_provide_bridge=False,
+            should_provide_vlan=False)
+        info = instance_info.InstanceInfo.obj_from_trusted(
+            uuid=port['instance_uuid'], name='instance', project_id='p')
+        port_id = port['id']
+        vifs.append(vif.VIF.obj_from_trusted(
+            id=port_id, address=port['address'], network=net,
+            plugin=port['plugin'], details=port['details'],
+            devname=('nic' + port_id)[:vif._NIC_NAME_LEN],
+            ovs_interfaceid=port_id, active=False,
+            vnic_type=vnic_types.NORMAL, profile=None,
+            preserve_on_delete=False, instance_info=info))
+    return vifs
+
+
+def run(count=DEFAULT_COUNT, repeat=3):
+    """
+    Returns a dictionary mapping each benchmark name to the best time, in
+    seconds, taken to construct `count` VIF graphs.
+    """
+    ports = make_port_data(count)
+    results = {}
+    for name, func in (('vif_construct', build),
+                       ('vif_construct_trusted', build_trusted)):
+        results[name] = min(timeit.repeat(lambda: func(ports),
+                                          number=1, repeat=repeat))
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else DEFAULT_COUNT
+    for name, seconds in sorted(run(count).items()):
+        print('%-24s %8.3f s  %8.2f us/vif' % (name, seconds,
+                                               seconds * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main()
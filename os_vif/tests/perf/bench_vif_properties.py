@@ -0,0 +1,84 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the cost of reading derived properties of VIF objects.
+
+The hybrid plug benchmarks read the names an OVS hybrid plug generates for
+every VIF: the Linux bridge, both ends of the veth pair and the tap device.
+
+Run with::
+
+    python -m os_vif.tests.perf.bench_vif_properties [count]
+"""
+
+import sys
+import timeit
+
+from os_vif.objects import vif
+from os_vif.tests.perf import bench_objects
+
+DEFAULT_COUNT = 10000
+
+# Number of times a plugin reads the names of a VIF while plugging it.
+READS_PER_PLUG = 4
+
+
+def hybrid_plug_names(vifs):
+    for _i in range(READS_PER_PLUG):
+        for v in vifs:
+            if v.ovs_hybrid_plug:
+                v.br_name
+                v.veth_pair_names
+                v.devname_with_prefix('tap')
+
+
+def hybrid_plug_names_cold(vifs):
+    for v in vifs:
+        v.__dict__.pop('_derived_cache', None)
+    hybrid_plug_names(vifs)
+
+
+def fixed_ips(vifs):
+    for _i in range(READS_PER_PLUG):
+        for v in vifs:
+            v.fixed_ips
+
+
+def run(count=DEFAULT_COUNT, repeat=3):
+    """
+    Returns a dictionary mapping each benchmark name to the best time, in
+    seconds, taken to read the properties of `count` VIFs.
+    """
+    vifs = bench_objects.build(bench_objects.make_port_data(count))
+    records = [vif.VIFRecord.from_object(v) for v in vifs]
+    results = {}
+    for name, func, args in (
+            ('hybrid_plug_names_cold', hybrid_plug_names_cold, vifs),
+            ('hybrid_plug_names_memoized', hybrid_plug_names, vifs),
+            ('hybrid_plug_names_record', hybrid_plug_names, records),
+            ('fixed_ips_memoized', fixed_ips, vifs),
+            ('fixed_ips_record', fixed_ips, records)):
+        results[name] = min(timeit.repeat(lambda: func(args),
+                                          number=1, repeat=repeat))
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else DEFAULT_COUNT
+    for name, seconds in sorted(run(count).items()):
+        print('%-28s %8.3f s  %8.2f us/vif' % (name, seconds,
+                                               seconds * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main()
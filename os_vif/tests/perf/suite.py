@@ -0,0 +1,176 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Runs every benchmark and compares the results against a baseline.
+
+Run with::
+
+    python -m os_vif.tests.perf.suite [--output FILE] [--baseline FILE]
+                                      [--tolerance RATIO] [--update-baseline]
+
+The results are written as JSON. Each benchmark reports the time taken
+per operation, and that time divided by the time taken by a fixed pure
+Python calibration loop on the same machine.
+Baselines are compared on the latter, so that a baseline recorded on one
+machine remains usable on another. The command exits with status 1 if any
+benchmark is slower than its baseline by more than the tolerance.
+
+Nothing in the suite needs network access or root privileges.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+
+from os_vif.tests.perf import bench_codec
+from os_vif.tests.perf import bench_dispatch
+from os_vif.tests.perf import bench_graphs
+from os_vif.tests.perf import bench_initialize
+from os_vif.tests.perf import bench_interning
+from os_vif.tests.perf import bench_logging
+from os_vif.tests.perf import bench_objects
+from os_vif.tests.perf import bench_vif_properties
+
+FORMAT_VERSION = 1
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# A benchmark regresses when its relative time exceeds the baseline's by
+# more than this fraction.
+DEFAULT_TOLERANCE = 0.5
+
+# Benchmark modules and the number of operations each of their
+# benchmarks performs per run.
+BENCHMARKS = (
+    (bench_initialize, 3),
+    (bench_dispatch, 2000),
+    (bench_objects, 2000),
+    (bench_graphs, 200),
+    (bench_codec, 640),
+    (bench_interning, 512),
+    (bench_vif_properties, 2000),
+    (bench_logging, 2000),
+)
+
+_CALIBRATION_LOOPS = 10000
+
+
+def _calibration_loop():
+    values = {}
+    for i in range(_CALIBRATION_LOOPS):
+        values['key%d' % (i & 0xff)] = [i, str(i)]
+    return values
+
+
+def calibrate(repeat=5):
+    """Returns the best time, in seconds, of the calibration loop."""
+    return min(timeit.repeat(_calibration_loop, number=1, repeat=repeat))
+
+
+def _round(value):
+    return float('%.4g' % value)
+
+
+def run(repeat=5):
+    """
+    Runs every benchmark and returns the results, as the dictionary that
+    is written out as JSON.
+    """
+    calibrations = []
+    timings = {}
+    for module, count in BENCHMARKS:
+        # Calibrated next to every module, and the best calibration is
+        # kept, so that a slow spell of the machine during one calibration
+        # does not skew the results.
+        calibrations.append(calibrate())
+        for name, seconds in module.run(count, repeat=repeat).items():
+            timings[name] = seconds / count
+    calibration = min(calibrations)
+    results = dict((name, {'us_per_op': _round(per_op * 1e6),
+                           'relative': _round(per_op / calibration)})
+                   for name, per_op in timings.items())
+    return {
+        'version': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'calibration_us': _round(calibration * 1e6),
+        'results': results,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares results against a baseline, both as returned by `run()`.
+
+    :returns: list of (name, baseline relative time, relative time) tuples
+              for the benchmarks slower than their baseline by more than
+              `tolerance`, sorted by name. Benchmarks missing from either
+              side are not compared.
+    """
+    regressions = []
+    previous = baseline.get('results', {})
+    for name, result in sorted(results['results'].items()):
+        if name not in previous:
+            continue
+        expected = previous[name]['relative']
+        if result['relative'] > expected * (1 + tolerance):
+            regressions.append((name, expected, result['relative']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Runs the os_vif benchmarks.')
+    parser.add_argument('--output', help='File to write the results to, '
+                        'instead of standard output.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Results to compare against.')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Fraction by which a benchmark may be slower '
+                        'than the baseline.')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Write the results to the baseline file '
+                        'instead of comparing against it.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of runs of each benchmark to keep '
+                        'the best of.')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    results = run(repeat=args.repeat)
+    output = json.dumps(results, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(output)
+        return 0
+    if not os.path.exists(args.baseline):
+        sys.stderr.write('No baseline at %s, nothing to compare.\n' %
+                         args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, expected, actual in regressions:
+        sys.stderr.write('%s regressed: %.3f times slower than the '
+                         'baseline\n' % (name, actual / expected))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
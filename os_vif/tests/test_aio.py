@@ -0,0 +1,182 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+import mock
+from oslo_concurrency import processutils
+import testtools
+
+import os_vif
+from os_vif import exception
+from os_vif import objects
+from os_vif.tests import base
+
+if sys.version_info >= (3, 5):
+    import asyncio
+
+
+@testtools.skipIf(sys.version_info < (3, 8),
+                  'asyncio entry points are tested on Python 3.8 or newer')
+class TestAsyncOSVIF(base.TestCase):
+
+    def setUp(self):
+        super(TestAsyncOSVIF, self).setUp()
+        os_vif._EXT_MANAGER = None
+        os_vif._EXECUTOR = None
+
+    def _initialize(self, plugin, **config):
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize(**config)
+        self.addCleanup(os_vif._EXECUTOR.shutdown, wait=False)
+
+    def test_aplug_not_initialized(self):
+        self.assertRaises(exception.LibraryNotInitialized,
+                          asyncio.run, os_vif.aplug(None, None))
+
+    def test_aplug_sync_plugin(self):
+        plugin = mock.MagicMock()
+        self._initialize(plugin)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        asyncio.run(os_vif.aplug(vif, mock.sentinel.instance))
+        plugin.plug.assert_called_once_with(vif, mock.sentinel.instance)
+
+    def test_aplug_async_plugin(self):
+        plugin = mock.MagicMock()
+        plugin.aplug = mock.AsyncMock()
+        self._initialize(plugin)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        asyncio.run(os_vif.aplug(vif, mock.sentinel.instance))
+        plugin.aplug.assert_awaited_once_with(vif, mock.sentinel.instance)
+        self.assertFalse(plugin.plug.called)
+
+    def test_aplug_failure(self):
+        plugin = mock.MagicMock()
+        plugin.plug.side_effect = processutils.ProcessExecutionError()
+        self._initialize(plugin)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        self.assertRaises(exception.PlugException, asyncio.run,
+                          os_vif.aplug(vif, mock.sentinel.instance))
+
+    def test_aunplug_sync_plugin(self):
+        plugin = mock.MagicMock()
+        self._initialize(plugin)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        asyncio.run(os_vif.aunplug(vif))
+        plugin.unplug.assert_called_once_with(vif)
+
+    def test_aunplug_async_plugin(self):
+        plugin = mock.MagicMock()
+        plugin.aunplug = mock.AsyncMock(
+            side_effect=processutils.ProcessExecutionError())
+        self._initialize(plugin)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        self.assertRaises(exception.UnplugException, asyncio.run,
+                          os_vif.aunplug(vif))
+
+    def test_aplug_async_plugin_timeout(self):
+        plugin = mock.MagicMock()
+        cancelled = []
+
+        async def aplug(vif, instance):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(vif.id)
+                raise
+
+        plugin.aplug = aplug
+        self._initialize(plugin, plug_timeout=0.05)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        self.assertRaises(exception.PlugTimeout, asyncio.run,
+                          os_vif.aplug(vif, mock.sentinel.instance))
+        self.assertEqual(['uniq'], cancelled)
+        self.assertEqual([], os_vif._LOCKS.held())
+
+    def test_aplug_sync_plugin_timeout(self):
+        plugin = mock.MagicMock()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        plugin.plug.side_effect = lambda vif, instance: release.wait(5)
+        self._initialize(plugin)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        err = self.assertRaises(exception.PlugTimeout, asyncio.run,
+                                os_vif.aplug(vif, mock.sentinel.instance,
+                                             timeout=0.05))
+        self.assertEqual(0.05, err.kwargs['timeout'])
+
+    def test_aunplug_lock_wait_bounded(self):
+        plugin = mock.MagicMock()
+        self._initialize(plugin)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        with os_vif._LOCKS.acquire(['vif:uniq']):
+            self.assertRaises(exception.PlugTimeout, asyncio.run,
+                              os_vif.aunplug(vif, timeout=0.05))
+        self.assertFalse(plugin.unplug.called)
+        self.assertEqual([], os_vif._LOCKS.held())
+
+    def test_coalesced(self):
+        plugin = mock.MagicMock()
+        plugin.aplug = mock.AsyncMock()
+        self._initialize(plugin, coalesce_requests=True)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        with mock.patch.object(os_vif._COALESCER, '_submit',
+                               wraps=os_vif._COALESCER._submit) as submit:
+            asyncio.run(os_vif.aplug(vif, mock.sentinel.instance))
+            asyncio.run(os_vif.aunplug(vif))
+        self.assertEqual(['plug', 'unplug'],
+                         [call[0][1].operation
+                          for call in submit.call_args_list])
+        plugin.plug.assert_called_once_with(vif, mock.sentinel.instance)
+        plugin.unplug.assert_called_once_with(vif)
+        self.assertEqual(0, os_vif._COALESCER.pending())
+
+    def test_coalesced_superseded(self):
+        plugin = mock.MagicMock()
+        self._initialize(plugin, coalesce_requests=True)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        with mock.patch.object(
+                os_vif._COALESCER, 'unplug',
+                side_effect=exception.OperationSuperseded(
+                    operation='unplug', vif_id='uniq', final='plug')):
+            self.assertRaises(exception.OperationSuperseded, asyncio.run,
+                              os_vif.aunplug(vif))
+        self.assertFalse(plugin.unplug.called)
+
+    def test_aplug_journaled_under_locks(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        plugin = mock.MagicMock()
+
+        async def aplug(vif, instance):
+            self.assertEqual(['device:nicuniq', 'vif:uniq'],
+                             os_vif._LOCKS.held())
+            entry, = os_vif._JOURNAL.pending()
+            self.assertEqual(('uniq', False), (entry.vif_id, entry.failed))
+            raise processutils.ProcessExecutionError()
+
+        plugin.aplug = aplug
+        self._initialize(plugin,
+                         journal_path=os.path.join(tmp_dir, 'journal'))
+        self.addCleanup(setattr, os_vif, '_JOURNAL', None)
+        self.addCleanup(os_vif._JOURNAL.close)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        self.assertRaises(exception.PlugException, asyncio.run,
+                          os_vif.aplug(vif, mock.sentinel.instance))
+        entry, = os_vif._JOURNAL.pending()
+        self.assertTrue(entry.failed)
+        self.assertEqual([], os_vif._LOCKS.held())
@@ -0,0 +1,199 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+import mock
+
+from os_vif import coalescer
+from os_vif import deadline
+from os_vif import exception
+from os_vif import metrics
+from os_vif.objects import vif as vif_obj
+from os_vif.tests import base
+
+
+class TestCoalescer(base.TestCase):
+
+    def setUp(self):
+        super(TestCoalescer, self).setUp()
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        # Threads blocked in a failed test must not outlive it.
+        self.addCleanup(self.release.set)
+        self.threads = []
+        self.error = None
+        self.coalescer = coalescer.Coalescer(plug=self._plug,
+                                             unplug=self._unplug)
+        self.vif = vif_obj.VIF(id='b679325f-ca89-4ee0-a8be-6db1409b69ea',
+                               plugin='ovs')
+
+    def _call(self, operation, vif):
+        self.calls.append((operation, vif.id))
+        self.started.set()
+        self.release.wait()
+        if self.error is not None:
+            raise self.error
+
+    def _plug(self, vif, instance, **kwargs):
+        self._call('plug', vif)
+
+    def _unplug(self, vif, **kwargs):
+        self._call('unplug', vif)
+
+    def _start(self, func, *args, **kwargs):
+        outcome = {}
+
+        def target():
+            try:
+                func(*args, **kwargs)
+                outcome['error'] = None
+            except Exception as err:
+                outcome['error'] = err
+        thread = threading.Thread(target=target)
+        thread.start()
+        self.threads.append(thread)
+        outcome['thread'] = thread
+        return outcome
+
+    def _join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def _wait_for_waiters(self, count):
+        # The requests being tested wait in other threads, which only
+        # register once they get to run.
+        for _i in range(500):
+            if len(self._queued()) >= count:
+                return
+            time.sleep(0.002)
+        self.fail('requests did not queue up')
+
+    def _queued(self):
+        with self.coalescer._lock:
+            request = self.coalescer._waiting.get(self.vif.id)
+        if request is None:
+            return []
+        return request.replaced + [request]
+
+    def test_no_contention(self):
+        self.coalescer.plug(self.vif, mock.sentinel.instance)
+        self.coalescer.unplug(self.vif)
+        self.assertEqual([('plug', self.vif.id), ('unplug', self.vif.id)],
+                         self.calls)
+        self.assertEqual(0, self.coalescer.pending())
+
+    def test_flap_runs_final_state(self):
+        self.release.clear()
+        first_outcome = self._start(self.coalescer.plug, self.vif, None)
+        self.started.wait()
+        unplug_outcome = self._start(self.coalescer.unplug, self.vif)
+        self._wait_for_waiters(1)
+        plug_outcome = self._start(self.coalescer.plug, self.vif, None)
+        self._wait_for_waiters(2)
+        self.release.set()
+        self._join()
+
+        self.assertEqual([('plug', self.vif.id), ('plug', self.vif.id)],
+                         self.calls)
+        self.assertIsNone(first_outcome['error'])
+        self.assertIsNone(plug_outcome['error'])
+        self.assertIsInstance(unplug_outcome['error'],
+                              exception.OperationSuperseded)
+        self.assertEqual(0, self.coalescer.pending())
+
+    def test_replaced_request_shares_failure(self):
+        self.release.clear()
+        self._start(self.coalescer.unplug, self.vif)
+        self.started.wait()
+        outcomes = []
+        for i in range(3):
+            outcomes.append(self._start(self.coalescer.plug, self.vif, None))
+            self._wait_for_waiters(i + 1)
+        self.error = ValueError('boom')
+        self.release.set()
+        self._join()
+
+        self.assertEqual([('unplug', self.vif.id), ('plug', self.vif.id)],
+                         self.calls)
+        errors = [outcome['error'] for outcome in outcomes]
+        self.assertIsInstance(errors[0], ValueError)
+        self.assertTrue(all(err is errors[0] for err in errors))
+
+    def test_waiting_request_withdrawn_at_deadline(self):
+        self.release.clear()
+        self._start(self.coalescer.plug, self.vif, None)
+        self.started.wait()
+        unplug_outcome = self._start(self.coalescer.unplug, self.vif)
+        self._wait_for_waiters(1)
+        bound = deadline.Deadline(0.2, 'plug', self.vif)
+        plug_outcome = self._start(self.coalescer.plug, self.vif, None,
+                                   deadline=bound)
+        self._wait_for_waiters(2)
+        plug_outcome['thread'].join()
+        self.assertIsInstance(plug_outcome['error'], exception.PlugTimeout)
+        # The request it replaced waits in its place.
+        self.assertEqual(1, len(self._queued()))
+        self.release.set()
+        self._join()
+
+        self.assertEqual([('plug', self.vif.id), ('unplug', self.vif.id)],
+                         self.calls)
+        self.assertIsNone(unplug_outcome['error'])
+        self.assertEqual(0, self.coalescer.pending())
+
+    def test_replaced_request_withdrawn_at_deadline(self):
+        self.release.clear()
+        self._start(self.coalescer.plug, self.vif, None)
+        self.started.wait()
+        bound = deadline.Deadline(0.2, 'unplug', self.vif)
+        unplug_outcome = self._start(self.coalescer.unplug, self.vif,
+                                     deadline=bound)
+        self._wait_for_waiters(1)
+        plug_outcome = self._start(self.coalescer.plug, self.vif, None)
+        self._wait_for_waiters(2)
+        unplug_outcome['thread'].join()
+        self.assertIsInstance(unplug_outcome['error'], exception.PlugTimeout)
+        self.assertEqual(1, len(self._queued()))
+        self.release.set()
+        self._join()
+
+        self.assertEqual([('plug', self.vif.id), ('plug', self.vif.id)],
+                         self.calls)
+        self.assertIsNone(plug_outcome['error'])
+        self.assertEqual(0, self.coalescer.pending())
+
+    def test_vif_without_id(self):
+        vif = mock.Mock(id=None)
+        self.coalescer.plug(vif, None)
+        self.assertEqual([('plug', None)], self.calls)
+
+    def test_coalesced_counted(self):
+        registry = metrics.MetricsRegistry()
+        metrics.enable(registry)
+        self.addCleanup(metrics.disable)
+        self.release.clear()
+        self._start(self.coalescer.plug, self.vif, None)
+        self.started.wait()
+        self._start(self.coalescer.unplug, self.vif)
+        self._wait_for_waiters(1)
+        self._start(self.coalescer.plug, self.vif, None)
+        self._wait_for_waiters(2)
+        self.release.set()
+        self._join()
+        self.assertEqual(1, registry.get_counter(metrics.COALESCED,
+                                                 operation='unplug'))
+        self.assertEqual(0, registry.get_counter(metrics.COALESCED,
+                                                 operation='plug'))
@@ -0,0 +1,217 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import io
+import json
+import sys
+
+import msgpack
+from oslo_versionedobjects import base as ovo_base
+from oslo_versionedobjects import fields
+
+from os_vif import exception
+from os_vif.objects import base as osv_base
+from os_vif.objects import codec
+from os_vif.objects import vif as vif_obj
+from os_vif.tests import base
+from os_vif.tests.perf import bench_codec
+
+
+@ovo_base.VersionedObjectRegistry.register_if(False)
+class CodecTestChild(osv_base.TrustedConstructionMixin,
+                     ovo_base.VersionedObject):
+    VERSION = '1.2'
+
+    fields = {
+        'name': fields.StringField(),
+        'tags': fields.ListOfStringsField(),
+    }
+
+
+@ovo_base.VersionedObjectRegistry.register_if(False)
+class CodecTestParent(osv_base.TrustedConstructionMixin,
+                      ovo_base.VersionedObject):
+    VERSION = '1.0'
+
+    fields = {
+        'child': fields.ObjectField('CodecTestChild', nullable=True),
+        'children': fields.ListOfObjectsField('CodecTestChild'),
+        'count': fields.IntegerField(),
+        'extra': fields.DictOfStringsField(nullable=True),
+    }
+
+
+@ovo_base.VersionedObjectRegistry.register_if(False)
+class CodecTestAddress(osv_base.TrustedConstructionMixin,
+                       ovo_base.VersionedObject):
+    VERSION = '1.0'
+
+    fields = {
+        'address': fields.IPAddressField(),
+    }
+
+
+class TestCodec(base.TestCase):
+
+    def setUp(self):
+        super(TestCodec, self).setUp()
+        self.vifs = bench_codec.build_instance_vifs(nics=8, networks=2)
+
+    def _primitives(self, objs):
+        return [codec.to_primitive(obj) for obj in objs]
+
+    def test_round_trip(self):
+        data = codec.dumps(self.vifs)
+        decoded = codec.loads(data)
+
+        self.assertEqual(self._primitives(self.vifs),
+                         self._primitives(decoded))
+        self.assertLess(len(data), len(json.dumps(
+            self._primitives(self.vifs))) / 2)
+        # Every VIF has a Network of its own, and the instance info is
+        # shared by all of them.
+        self.assertIsNot(decoded[0].network, decoded[2].network)
+        self.assertIs(decoded[0].instance_info, decoded[7].instance_info)
+        self.assertIsInstance(decoded[0], vif_obj.VIF)
+        self.assertEqual(self.vifs[3].br_name, decoded[3].br_name)
+
+    def test_shared_content_sent_once(self):
+        distinct = codec.dumps(self.vifs)
+        network = self.vifs[0].network
+        for v in self.vifs:
+            v.network = network
+        shared = codec.dumps(self.vifs)
+        self.assertLess(len(shared), len(distinct) * 0.75)
+        decoded = codec.loads(shared)
+        self.assertTrue(all(v.network is decoded[0].network
+                            for v in decoded))
+
+    def test_unset_fields_and_changes(self):
+        v = vif_obj.VIF.obj_from_trusted(id='uniq', plugin='ovs',
+                                         network=None)
+        v._changed_fields = set(['plugin'])
+        decoded, = codec.loads(codec.dumps([v]))
+        self.assertEqual(set(['id', 'plugin', 'network']),
+                         set(decoded.__dict__) & set(vif_obj.VIF.fields))
+        self.assertIsNone(decoded.network)
+        self.assertEqual(set(['plugin']), decoded._changed_fields)
+
+    def test_version(self):
+        child = CodecTestChild(name='old', tags=[])
+        child.VERSION = '1.1'
+        decoded, = codec.loads(codec.dumps([child]))
+        self.assertEqual('1.1', decoded.VERSION)
+        self.assertEqual('1.2', CodecTestChild.VERSION)
+
+    def test_matches_obj_to_primitive(self):
+        children = [CodecTestChild(name='a', tags=['x', 'y']),
+                    CodecTestChild(name='b', tags=[])]
+        parent = CodecTestParent(child=children[0], children=children,
+                                 count=3, extra={'k': 'v'})
+        # The order of the changed fields in a primitive is arbitrary.
+        parent.obj_reset_changes(recursive=True)
+        parent.obj_reset_changes(['count'])
+        parent.count = 4
+        expected = parent.obj_to_primitive()
+        self.assertEqual(['count'], expected['versioned_object.changes'])
+
+        self.assertEqual(expected, codec.to_primitive(parent))
+        decoded, = codec.loads(codec.dumps([parent]))
+        self.assertEqual(expected, decoded.obj_to_primitive())
+        self.assertIs(decoded.child, decoded.children[0])
+        self.assertEqual(expected, codec.to_primitive(
+            codec.from_primitive(expected)))
+
+    def test_decoder_incremental(self):
+        data = codec.dumps(self.vifs)
+        decoder = codec.Decoder()
+        decoded = []
+        for i in range(len(data)):
+            decoder.feed(data[i:i + 1])
+            decoded.extend(decoder)
+        self.assertEqual(self._primitives(self.vifs),
+                         self._primitives(decoded))
+
+    def test_dump_iter_load(self):
+        stream = io.BytesIO()
+        codec.dump(self.vifs, stream)
+        stream.seek(0)
+        self.assertEqual(
+            self._primitives(self.vifs),
+            self._primitives(codec.iter_load(stream, chunk_size=100)))
+
+    def test_truncated(self):
+        data = codec.dumps(self.vifs)
+        self.assertRaises(exception.ObjectDecodingError,
+                          codec.loads, data[:-3])
+        self.assertRaises(exception.ObjectDecodingError, list,
+                          codec.iter_load(io.BytesIO(data[:-3])))
+
+    def test_truncated_message(self):
+        header = msgpack.packb(['os_vif', codec.FORMAT_VERSION])
+        data = codec.dumps(self.vifs)[:len(header) + 3]
+        self.assertRaises(exception.ObjectDecodingError, codec.loads, data)
+        self.assertRaises(exception.ObjectDecodingError, codec.loads,
+                          header[:-1])
+
+    def test_garbage(self):
+        header = msgpack.packb(['os_vif', codec.FORMAT_VERSION])
+        for data in (b'\xc1', header + b'\xc1', b'\xff' * 16,
+                     header + msgpack.packb({'kind': 0}),
+                     header + msgpack.packb([codec._ITEM, 7])):
+            self.assertRaises(exception.ObjectDecodingError,
+                              codec.loads, data)
+            self.assertRaises(exception.ObjectDecodingError, list,
+                              codec.iter_load(io.BytesIO(data)))
+
+    def test_invalid_field_value(self):
+        obj = CodecTestAddress.obj_from_trusted(address='192.0.2.1')
+        data = codec.dumps([obj]).replace(b'192.0.2.1', b'192.0.2.x')
+        self.assertRaises(exception.ObjectDecodingError, codec.loads, data)
+
+    def test_bad_header(self):
+        self.assertRaises(exception.ObjectDecodingError, codec.loads,
+                          msgpack.packb(['os_vif', 99]))
+
+    def _parent_stream(self, definitions):
+        def new(index):
+            return msgpack.ExtType(codec._EXT_NEW, codec._INDEX.pack(index))
+
+        messages = [['os_vif', codec.FORMAT_VERSION],
+                    [codec._CLASS, 'CodecTestParent', '1.0',
+                     ['child', 'children', 'count', 'extra']]]
+        for child in definitions:
+            messages.append([codec._DEFINITION, 0,
+                             [None if child is None else new(child), [], 1,
+                              None], []])
+        messages.append([codec._ITEM, new(len(definitions) - 1)])
+        return b''.join(msgpack.packb(message, use_bin_type=True)
+                        for message in messages)
+
+    def test_self_reference(self):
+        self.assertRaises(exception.ObjectDecodingError, codec.loads,
+                          self._parent_stream([0]))
+
+    def test_forward_reference(self):
+        self.assertRaises(exception.ObjectDecodingError, codec.loads,
+                          self._parent_stream([1, 0]))
+
+    def test_chain_too_deep(self):
+        definitions = [None] + list(range(sys.getrecursionlimit() * 2))
+        self.assertRaises(exception.ObjectDecodingError, codec.loads,
+                          self._parent_stream(definitions))
+
+    def test_unknown_object_type(self):
+        data = b''.join(msgpack.packb(message) for message in (
+            ['os_vif', codec.FORMAT_VERSION],
+            [0, 'NoSuchObject', '1.0', []]))
+        self.assertRaises(exception.ObjectDecodingError, codec.loads, data)
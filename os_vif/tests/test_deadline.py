@@ -0,0 +1,87 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+import mock
+
+from os_vif import deadline
+from os_vif import exception
+from os_vif.objects import network
+from os_vif.objects import vif as vif_obj
+from os_vif.tests import base
+
+
+class TestDeadline(base.TestCase):
+
+    def setUp(self):
+        super(TestDeadline, self).setUp()
+        self.vif = mock.Mock(id='uniq')
+
+    def test_current(self):
+        self.assertIsNone(deadline.current())
+        outer = deadline.Deadline(60, 'plug', self.vif)
+        inner = deadline.Deadline(30, 'plug', self.vif)
+        with outer:
+            with inner:
+                self.assertIs(inner, deadline.current())
+            self.assertIs(outer, deadline.current())
+        self.assertIsNone(deadline.current())
+
+    def test_check(self):
+        bound = deadline.Deadline(60, 'unplug', self.vif)
+        bound.check()
+        self.assertLessEqual(bound.remaining(), 60)
+        with mock.patch.object(deadline, '_now',
+                               return_value=bound.expires):
+            self.assertTrue(bound.expired)
+            self.assertEqual(0, bound.remaining())
+            err = self.assertRaises(exception.PlugTimeout, bound.check)
+        self.assertEqual('unplug', err.kwargs['operation'])
+
+    def test_error_names_vif_by_identity(self):
+        vif = vif_obj.VIF(id='uniq', plugin='ovs', network=network.Network(
+            bridge='br-int'))
+        err = deadline.Deadline(5, 'plug', vif).error()
+        self.assertIn('VIF(id=uniq, plugin=ovs, devname=', str(err))
+        self.assertNotIn('br-int', str(err))
+
+    def test_on_cancel_when_deadline_passes(self):
+        bound = deadline.Deadline(0.01, 'plug', self.vif)
+        cancelled = threading.Event()
+        with bound:
+            bound.on_cancel(cancelled.set)
+            self.assertTrue(cancelled.wait(5))
+        self.assertTrue(bound.cancelled)
+        self.assertRaises(exception.PlugTimeout, bound.check)
+
+    def test_on_cancel_unregistered(self):
+        bound = deadline.Deadline(60, 'plug', self.vif)
+        callback = mock.Mock()
+        with bound:
+            unregister = bound.on_cancel(callback)
+            unregister()
+            bound.cancel()
+        self.assertFalse(callback.called)
+        # Callbacks registered once cancelled are called straight away.
+        bound.on_cancel(callback)
+        callback.assert_called_once_with()
+
+    def test_exit_stops_timer(self):
+        bound = deadline.Deadline(60, 'plug', self.vif)
+        with bound:
+            bound.on_cancel(mock.Mock())
+            timer = bound._timer
+        self.assertIsNone(bound._timer)
+        timer.join(5)
+        self.assertFalse(timer.is_alive())
+        self.assertFalse(bound.cancelled)
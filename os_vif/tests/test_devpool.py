@@ -0,0 +1,169 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+
+import mock
+
+from os_vif import devpool
+from os_vif import exception
+from os_vif import metrics
+from os_vif import netlink
+from os_vif.objects import vif as vif_obj
+from os_vif.tests import base
+from os_vif.tests import test_netlink
+
+
+class TestDevicePool(base.TestCase):
+
+    def setUp(self):
+        super(TestDevicePool, self).setUp()
+        self.sock = test_netlink.FakeNetlinkSocket()
+        self.ipr = netlink.IPRoute(sock=self.sock)
+        self.pool = devpool.DevicePool(size=2, ipr=self.ipr)
+        self.vif = vif_obj.VIF(id='b679325f-ca89-4ee0-a8be-6db1409b69ea')
+
+    def _pooled(self):
+        return sorted(name for name in self.sock.links
+                      if name.startswith('ovp'))
+
+    def test_fill(self):
+        self.assertEqual(4, self.pool.fill())
+        self.assertEqual(2, self.pool.free(devpool.VETH))
+        self.assertEqual(2, self.pool.free(devpool.BRIDGE))
+        self.assertEqual(6, len(self._pooled()))
+        self.assertTrue(all(len(name) <= 14 for name in self._pooled()))
+        self.assertEqual(0, self.pool.fill())
+
+    def test_assign(self):
+        self.pool.fill()
+        self.assertTrue(self.pool.assign_veth_pair(self.vif))
+        self.assertTrue(self.pool.assign_bridge(self.vif))
+        qvb, qvo = self.vif.veth_pair_names
+        self.assertEqual([qvb, qvo], self.sock.links[qvb]['peers'])
+        self.assertIn(self.vif.br_name, self.sock.links)
+        self.assertEqual(3, len(self._pooled()))
+        # The devices are left down for the plugin to bring up.
+        netlink.ensure_veth_pair(self.ipr, qvb, qvo)
+
+    def test_assign_empty(self):
+        self.assertFalse(self.pool.assign_veth_pair(self.vif))
+        self.assertFalse(self.pool.assign_bridge(self.vif))
+
+    def test_assign_existing_name(self):
+        self.pool.fill()
+        self.ipr.add_bridge(self.vif.br_name)
+        self.assertFalse(self.pool.assign_bridge(self.vif))
+        # The pooled bridge that could not be renamed is deleted, and the
+        # existing bridge is left alone.
+        self.assertEqual(1, self.pool.free(devpool.BRIDGE))
+        self.assertEqual(5, len(self._pooled()))
+        self.assertIn(self.vif.br_name, self.sock.links)
+
+    def test_fill_failure(self):
+        with mock.patch.object(
+                self.ipr, 'add_bridge',
+                side_effect=exception.NetlinkError(
+                    operation='add bridge', device='ovpb', err='denied',
+                    errno=errno.EPERM)):
+            self.assertEqual(2, self.pool.fill())
+        self.assertEqual(0, self.pool.free(devpool.BRIDGE))
+
+    def test_refill_below_low_watermark(self):
+        self.pool.fill()
+        self.pool._thread = mock.Mock()
+        with mock.patch.object(self.pool, '_wake') as wake:
+            self.assertTrue(self.pool.assign_bridge(self.vif))
+            self.assertFalse(wake.set.called)
+            self.assertTrue(self.pool.assign_bridge(self.vif, name='qbrother'))
+            wake.set.assert_called_once_with()
+
+    def test_refill_thread(self):
+        registry = metrics.MetricsRegistry()
+        metrics.enable(registry)
+        self.addCleanup(metrics.disable)
+        self.pool.start()
+        self.addCleanup(self.pool.shutdown)
+        filled = self.pool._wake
+        while self.pool.free(devpool.BRIDGE) < 2:
+            filled.wait(0.01)
+        self.pool.assign_bridge(self.vif)
+        self.pool.assign_bridge(self.vif, name='qbrother')
+        while self.pool.free(devpool.BRIDGE) < 2:
+            filled.wait(0.01)
+        self.assertEqual(
+            2, registry.get_counter(metrics.DEVICE_POOL, kind=devpool.BRIDGE,
+                                    outcome='hit'))
+
+    def test_reclaim(self):
+        self.pool.fill()
+        self.ipr.add_veth('ovpv0123456789', 'ovpw0123456789')
+        self.ipr.add_bridge('ovpb0123456789')
+        self.ipr.add_bridge('qbrother')
+        self.assertEqual(2, self.pool.reclaim())
+        self.assertEqual(6, len(self._pooled()))
+        self.assertNotIn('ovpb0123456789', self.sock.links)
+        self.assertIn('qbrother', self.sock.links)
+        self.assertEqual(0, self.pool.reclaim())
+
+    def test_start_reclaims(self):
+        self.ipr.add_bridge('ovpb0123456789')
+        self.pool.start()
+        self.addCleanup(self.pool.shutdown)
+        while self.pool.free(devpool.BRIDGE) < 2:
+            self.pool._wake.wait(0.01)
+        self.assertNotIn('ovpb0123456789', self.sock.links)
+        self.assertEqual(6, len(self._pooled()))
+
+    @mock.patch.object(devpool.LOG, 'exception')
+    @mock.patch.object(devpool.LOG, 'warning')
+    def test_refill_survives_socket_errors(self, mock_warning,
+                                           mock_exception):
+        pool = devpool.DevicePool(size=2)
+        with mock.patch.object(netlink, 'IPRoute',
+                               side_effect=[OSError(errno.EPERM, 'denied'),
+                                            OSError(errno.EPERM, 'denied'),
+                                            self.ipr]):
+            self.assertEqual(0, pool.fill())
+            self.assertTrue(mock_warning.called)
+            pool.start()
+            self.addCleanup(pool.shutdown)
+            # The first refill fails to reclaim, the next one fills the
+            # pool.
+            while not mock_exception.called:
+                pool._wake.wait(0.01)
+            pool._wake.set()
+            while pool.free(devpool.BRIDGE) < 2:
+                pool._wake.wait(0.01)
+        self.assertEqual(6, len(self._pooled()))
+
+    def test_shutdown(self):
+        self.pool.start()
+        self.pool.shutdown()
+        self.pool.fill()
+        self.assertEqual([], self._pooled())
+        self.pool.assign_bridge(self.vif)
+        self.assertEqual([], self._pooled())
+
+
+class TestConfigure(base.TestCase):
+
+    def test_configure(self):
+        self.addCleanup(devpool.configure)
+        with mock.patch.object(devpool, 'DevicePool') as pool_cls:
+            pool = devpool.configure(size=4, mtu=1450)
+            pool_cls.assert_called_once_with(4, low_watermark=None, mtu=1450)
+            pool.start.assert_called_once_with()
+            self.assertIs(pool, devpool.get_pool())
+            self.assertIsNone(devpool.configure())
+            pool.shutdown.assert_called_once_with()
+        self.assertIsNone(devpool.get_pool())
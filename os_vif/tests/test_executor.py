@@ -0,0 +1,147 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+import mock
+
+from os_vif import deadline
+from os_vif import exception
+from os_vif import executor
+from os_vif import plugin
+from os_vif.tests import base
+
+
+def _fake_plugin(**kwargs):
+    fake = mock.MagicMock()
+    fake.describe.return_value = plugin.PluginInfo(
+        set(['fake']), '1.0', '1.0', **kwargs)
+    return fake
+
+
+class TestPlugExecutor(base.TestCase):
+
+    def setUp(self):
+        super(TestPlugExecutor, self).setUp()
+        self.executor = executor.PlugExecutor(max_workers=8,
+                                              plugin_concurrency=3)
+        self.addCleanup(self.executor.shutdown, wait=False)
+
+    def test_concurrency_not_thread_safe(self):
+        fake = _fake_plugin(max_concurrency=5)
+        self.assertEqual(1, self.executor.concurrency('fake', fake))
+
+    def test_concurrency_declared(self):
+        fake = _fake_plugin(thread_safe=True, max_concurrency=5)
+        self.assertEqual(5, self.executor.concurrency('fake', fake))
+
+    def test_concurrency_default(self):
+        fake = _fake_plugin(thread_safe=True)
+        self.assertEqual(3, self.executor.concurrency('fake', fake))
+        self.executor.concurrency('fake', fake)
+        fake.describe.assert_called_once_with()
+
+    def _max_in_flight(self, fake, count):
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+
+        def op():
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+
+        futures = [self.executor.submit('fake', fake, op)
+                   for _i in range(count)]
+        for future in futures:
+            future.result()
+        return state['max']
+
+    def test_submit_bounded_by_plugin(self):
+        fake = _fake_plugin(thread_safe=True, max_concurrency=2)
+        self.assertEqual(2, self._max_in_flight(fake, 8))
+
+    def test_submit_serial_plugin(self):
+        fake = _fake_plugin()
+        self.assertEqual(1, self._max_in_flight(fake, 4))
+
+    def test_run_returns_result(self):
+        fake = _fake_plugin()
+        self.assertEqual(42, self.executor.run('fake', fake, lambda: 42))
+
+    def test_run_within(self):
+        fake = _fake_plugin()
+        vif = mock.Mock(id='uniq')
+        self.assertEqual(42, self.executor.run_within(
+            deadline.Deadline(1, 'plug', vif), 'fake', fake, lambda: 42))
+        started = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            started.set()
+            release.wait()
+
+        future = self.executor.submit('fake', fake, hold)
+        self.addCleanup(future.result)
+        self.addCleanup(release.set)
+        started.wait()
+        # The plugin's only slot is busy until the deadline passes.
+        func = mock.Mock()
+        self.assertRaises(exception.PlugTimeout, self.executor.run_within,
+                          deadline.Deadline(0.05, 'plug', vif), 'fake', fake,
+                          func)
+        self.assertFalse(func.called)
+
+    def test_saturated_plugin_does_not_starve_others(self):
+        pool = executor.PlugExecutor(max_workers=2)
+        self.addCleanup(pool.shutdown, wait=False)
+        slow = _fake_plugin()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        blocked = [pool.submit('slow', slow, release.wait)
+                   for _i in range(4)]
+        # Only one of the serial plugin's operations holds a worker.
+        self.assertEqual(42, pool.submit('fast', _fake_plugin(),
+                                         lambda: 42).result(5))
+        self.assertFalse(any(future.done() for future in blocked))
+        release.set()
+        for future in blocked:
+            self.assertTrue(future.result(5))
+
+    def test_submit_cancelled_before_slot(self):
+        fake = _fake_plugin()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        running = self.executor.submit('fake', fake, release.wait)
+        func = mock.Mock()
+        queued = self.executor.submit('fake', fake, func)
+        self.assertTrue(queued.cancel())
+        release.set()
+        running.result(5)
+        self.assertEqual(42, self.executor.submit('fake', fake,
+                                                  lambda: 42).result(5))
+        self.assertFalse(func.called)
+
+    def test_submit_failure(self):
+        fake = _fake_plugin()
+        future = self.executor.submit('fake', fake, mock.Mock(
+            side_effect=ValueError('boom')))
+        self.assertRaises(ValueError, future.result, 5)
+        # The slot was released.
+        self.assertEqual(42, self.executor.run('fake', fake, lambda: 42))
+
+    def test_spawn(self):
+        future = self.executor.spawn(lambda value: value * 2, 21)
+        self.assertEqual(42, future.result())
@@ -0,0 +1,83 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+import mock
+from oslo_concurrency import processutils
+
+from os_vif import hoststate
+from os_vif.tests import base
+
+LINKS = {
+    'eth0': {'index': 2, 'up': True, 'mtu': 1500, 'master': None,
+             'kind': None},
+    'qbruniq': {'index': 3, 'up': True, 'mtu': 1450, 'master': None,
+                'kind': 'bridge'},
+    'qvbuniq': {'index': 4, 'up': True, 'mtu': 1450, 'master': 3,
+                'kind': 'veth'},
+    'tapuniq': {'index': 5, 'up': False, 'mtu': 1450, 'master': 3,
+                'kind': 'tun'},
+}
+
+OVS_INTERFACES = {
+    'headings': ['name', 'external_ids'],
+    'data': [
+        ['qvouniq', ['map', [['iface-id', 'uniq'],
+                             ['attached-mac', 'ca:fe:de:ad:be:ef']]]],
+        ['br-int', ['map', []]],
+    ],
+}
+
+
+class TestHostState(base.TestCase):
+
+    def setUp(self):
+        super(TestHostState, self).setUp()
+        self.ipr = mock.Mock()
+        self.ipr.list_links.return_value = LINKS
+        self.service = mock.Mock()
+        self.service.execute.return_value = (json.dumps(OVS_INTERFACES), '')
+
+    def test_capture(self):
+        state = hoststate.HostState.capture(ipr=self.ipr,
+                                            service=self.service)
+
+        self.service.execute.assert_called_once_with(
+            'ovs-vsctl', '--format=json', '--columns=name,external_ids',
+            'list', 'Interface')
+        link = state.link('qvbuniq')
+        self.assertEqual('qbruniq', link.master)
+        self.assertEqual('veth', link.kind)
+        self.assertEqual(1450, link.mtu)
+        self.assertIsNone(state.link('missing'))
+        self.assertEqual(['qvbuniq', 'tapuniq'],
+                         sorted(state.bridge_ports('qbruniq')))
+        self.assertEqual([], state.bridge_ports('eth0'))
+        self.assertEqual('qvouniq', state.ovs_interface_for_vif('uniq'))
+        self.assertIsNone(state.ovs_interface_for_vif('other'))
+        self.assertEqual({}, state.ovs_interfaces['br-int'])
+
+    def test_capture_without_ovs(self):
+        self.service.execute.side_effect = OSError('No such file')
+        state = hoststate.HostState.capture(ipr=self.ipr,
+                                            service=self.service)
+        self.assertIsNone(state.ovs_interfaces)
+        self.assertIsNone(state.ovs_interface_for_vif('uniq'))
+        self.assertEqual('qbruniq', state.link('qvbuniq').master)
+
+    def test_capture_ovs_failure(self):
+        self.service.execute.side_effect = (
+            processutils.ProcessExecutionError(exit_code=1))
+        state = hoststate.HostState.capture(ipr=self.ipr,
+                                            service=self.service)
+        self.assertIsNone(state.ovs_interfaces)
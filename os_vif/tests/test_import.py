@@ -0,0 +1,66 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import subprocess
+import sys
+
+from os_vif.tests import base
+
+# Measured in a fresh interpreter, so that modules imported by the test
+# runner do not hide what `import os_vif` pulls in by itself.
+_PROBE = """
+import json
+import sys
+
+before = set(sys.modules)
+import os_vif
+print(json.dumps({'modules': sorted(set(sys.modules) - before)}))
+"""
+
+# Maximum number of modules, including os_vif itself, that importing the
+# package may add to sys.modules.
+MODULE_BUDGET = 5
+
+HEAVY_MODULES = (
+    'eventlet',
+    'futurist',
+    'netaddr',
+    'oslo_concurrency',
+    'oslo_i18n',
+    'oslo_log',
+    'oslo_versionedobjects',
+    'pkg_resources',
+    'stevedore',
+    'os_vif.exception',
+    'os_vif.i18n',
+    'os_vif.objects',
+)
+
+
+class TestImportBudget(base.TestCase):
+
+    def setUp(self):
+        super(TestImportBudget, self).setUp()
+        output = subprocess.check_output([sys.executable, '-c', _PROBE])
+        self.probe = json.loads(output.decode('utf-8').splitlines()[-1])
+
+    def test_no_heavy_modules(self):
+        for name in self.probe['modules']:
+            for heavy in HEAVY_MODULES:
+                self.assertFalse(
+                    name == heavy or name.startswith(heavy + '.'),
+                    "'import os_vif' imported %s" % name)
+
+    def test_module_budget(self):
+        self.assertLessEqual(len(self.probe['modules']), MODULE_BUDGET,
+                             self.probe['modules'])
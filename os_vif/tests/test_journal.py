@@ -0,0 +1,179 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from os_vif import exception
+from os_vif import journal
+from os_vif.objects import instance_info
+from os_vif.objects import vif as vif_obj
+from os_vif.tests import base
+
+
+class TestJournal(base.TestCase):
+
+    def setUp(self):
+        super(TestJournal, self).setUp()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.path = os.path.join(tmp_dir, 'state', 'journal')
+        self.instance = instance_info.InstanceInfo(
+            uuid='d7a730ca-3c28-49c3-8f26-4662b909fe8a', name='vm',
+            project_id='p')
+
+    def _open(self, **kwargs):
+        j = journal.Journal(self.path, **kwargs)
+        self.addCleanup(j.close)
+        return j
+
+    def _vif(self, vif_id):
+        return vif_obj.VIF(id=vif_id, plugin='ovs')
+
+    def test_begin_end(self):
+        j = self._open()
+        seqs = j.begin(journal.PLUG, [('ovs', self._vif('one'), None),
+                                      ('ovs', self._vif('two'), None)])
+        self.assertEqual([1, 2], seqs)
+        self.assertEqual(['one', 'two'],
+                         [entry.vif_id for entry in j.pending()])
+        j.end([seqs[0]])
+        entry, = j.pending()
+        self.assertEqual((2, 'plug', 'ovs'),
+                         (entry.seq, entry.operation, entry.plugin_name))
+        vif, instance = entry.decode()
+        self.assertEqual('two', vif.id)
+        self.assertIsNone(instance)
+
+    def test_reopen(self):
+        j = self._open()
+        j.begin(journal.PLUG, [('ovs', self._vif('one'), self.instance),
+                               ('ovs', self._vif('two'), mock.Mock())])
+        j.end([2])
+        j.begin(journal.UNPLUG, [('ovs', self._vif('three'), None)])
+        j.close()
+
+        j = self._open()
+        self.assertEqual([(1, 'plug', 'one'), (3, 'unplug', 'three')],
+                         [(entry.seq, entry.operation, entry.vif_id)
+                          for entry in j.pending()])
+        vif, instance = j.pending()[0].decode()
+        self.assertEqual(self.instance.uuid, instance.uuid)
+        self.assertEqual([4], j.begin(journal.PLUG,
+                                      [('ovs', self._vif('four'), None)]))
+
+    def test_later_operation_supersedes(self):
+        j = self._open()
+        j.begin(journal.PLUG, [('ovs', self._vif('one'), None)])
+        seq, = j.begin(journal.UNPLUG, [('ovs', self._vif('one'), None)])
+        self.assertEqual([(seq, 'unplug')],
+                         [(entry.seq, entry.operation)
+                          for entry in j.pending()])
+        # Completing the earlier operation does not complete the later one.
+        j.end([1])
+        self.assertEqual(1, len(j.pending()))
+        j.end([seq])
+        self.assertEqual([], j.pending())
+
+    def test_failed_operation_stays_pending(self):
+        j = self._open()
+        seqs = j.begin(journal.PLUG, [('ovs', self._vif('one'), None),
+                                      ('ovs', self._vif('two'), None)])
+        j.end(seqs, failed=[seqs[1]])
+        entry, = j.pending()
+        self.assertEqual(('two', True), (entry.vif_id, entry.failed))
+        j.close()
+
+        j = self._open()
+        entry, = j.pending()
+        self.assertEqual(('two', True), (entry.vif_id, entry.failed))
+        # Compacting keeps the outcome.
+        j.compact()
+        j.close()
+        entry, = self._open().pending()
+        self.assertEqual(('two', True), (entry.vif_id, entry.failed))
+
+    def test_end_without_outcome(self):
+        j = self._open()
+        j.begin(journal.PLUG, [('ovs', self._vif('one'), None)])
+        j.close()
+        with open(self.path, 'ab') as f:
+            f.write(journal._pack([journal._END, 1]))
+        self.assertEqual([], self._open().pending())
+
+    def test_incomplete_message_cut_off(self):
+        j = self._open()
+        j.begin(journal.PLUG, [('ovs', self._vif('one'), None)])
+        j.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(journal._pack([journal._END, 1])[:-1])
+
+        j = self._open()
+        self.assertEqual(size, os.path.getsize(self.path))
+        self.assertEqual(['one'], [entry.vif_id for entry in j.pending()])
+        j.end([1])
+        j.close()
+        self.assertEqual([], self._open().pending())
+
+    def test_not_a_journal(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as f:
+            f.write(b'{"version": 1}')
+        self.assertRaises(exception.JournalError, journal.Journal,
+                          self.path)
+
+    def test_compact(self):
+        j = self._open(compact_threshold=4)
+        j.begin(journal.PLUG, [('ovs', self._vif('pending'), None)])
+        for i in range(3):
+            j.end(j.begin(journal.PLUG,
+                          [('ovs', self._vif('vif%d' % i), None)]))
+        size = os.path.getsize(self.path)
+        j.end(j.begin(journal.PLUG, [('ovs', self._vif('last'), None)]))
+        self.assertLess(os.path.getsize(self.path), size)
+        self.assertEqual(['pending'],
+                         [entry.vif_id for entry in j.pending()])
+        j.end(j.begin(journal.PLUG, [('ovs', self._vif('after'), None)]))
+        j.close()
+
+        j = self._open()
+        self.assertEqual([(1, 'pending')],
+                         [(entry.seq, entry.vif_id)
+                          for entry in j.pending()])
+        self.assertEqual([7], j.begin(journal.PLUG,
+                                      [('ovs', self._vif('next'), None)]))
+
+    def test_closed(self):
+        j = self._open()
+        seqs = j.begin(journal.PLUG, [('ovs', self._vif('one'), None)])
+        j.close()
+        self.assertRaises(IOError, j.begin, journal.PLUG,
+                          [('ovs', self._vif('two'), None)])
+        self.assertRaises(IOError, j.end, seqs)
+        self.assertRaises(IOError, j.compact)
+        j.close()
+
+    @mock.patch('os.fsync')
+    def test_fsync(self, mock_fsync):
+        j = self._open()
+        mock_fsync.reset_mock()
+        j.end(j.begin(journal.PLUG, [('ovs', self._vif('one'), None)]))
+        # Only the BEGIN message is synced.
+        self.assertEqual(1, mock_fsync.call_count)
+        mock_fsync.reset_mock()
+        j.fsync = False
+        j.begin(journal.PLUG, [('ovs', self._vif('two'), None)])
+        self.assertFalse(mock_fsync.called)
@@ -0,0 +1,207 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import mock
+
+from os_vif import loader
+from os_vif import plugin
+from os_vif.tests import base
+
+
+def _fake_entry_point(name, plugin_cls):
+    ep = mock.MagicMock()
+    ep.name = name
+    ep.module_name = 'os_vif.tests.test_loader'
+    ep.attrs = ('FakePlugin',)
+    ep.resolve.return_value = plugin_cls
+    return ep
+
+
+class FakePlugin(plugin.PluginBase):
+
+    def describe(self):
+        return plugin.PluginInfo(set(['fake']), '1.0', '1.0',
+                                 thread_safe=True, max_concurrency=4)
+
+    def plug(self, vif, instance):
+        pass
+
+    def unplug(self, vif):
+        pass
+
+
+class TestLazyPluginManager(base.TestCase):
+
+    def setUp(self):
+        super(TestLazyPluginManager, self).setUp()
+        self.foo_cls = mock.MagicMock()
+        self.bar_cls = mock.MagicMock()
+        self.foo_ep = _fake_entry_point('foo', self.foo_cls)
+        self.bar_ep = _fake_entry_point('bar', self.bar_cls)
+        patcher = mock.patch('pkg_resources.iter_entry_points',
+                             return_value=[self.foo_ep, self.bar_ep])
+        self.mock_iter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nothing_loaded_up_front(self):
+        manager = loader.LazyPluginManager('os_vif', {'opt': 1})
+        self.mock_iter.assert_called_once_with('os_vif')
+        self.assertEqual(set(['foo', 'bar']), set(manager.names()))
+        self.assertEqual([], manager.loaded_names())
+        self.assertIsNone(manager.indexed_info('foo'))
+        self.assertFalse(self.foo_ep.resolve.called)
+        self.assertFalse(self.bar_ep.resolve.called)
+
+    def test_getitem_loads_once(self):
+        manager = loader.LazyPluginManager('os_vif', {'opt': 1})
+        plugin = manager['foo']
+        self.assertEqual(self.foo_cls.return_value, plugin)
+        self.assertIs(plugin, manager['foo'])
+        self.foo_cls.assert_called_once_with(opt=1)
+        self.assertEqual(['foo'], manager.loaded_names())
+        self.assertFalse(self.bar_ep.resolve.called)
+
+    def test_getitem_missing(self):
+        manager = loader.LazyPluginManager('os_vif')
+        self.assertRaises(KeyError, manager.__getitem__, 'missing')
+        self.assertNotIn('missing', manager)
+
+    def test_getitem_thread_safe(self):
+        def slow_plugin(**config):
+            time.sleep(0.01)
+            return mock.sentinel.plugin
+
+        self.foo_ep.resolve.return_value = mock.MagicMock(
+            side_effect=slow_plugin)
+        manager = loader.LazyPluginManager('os_vif')
+        plugins = []
+        threads = [threading.Thread(target=lambda: plugins.append(
+            manager['foo'])) for _i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([mock.sentinel.plugin] * 8, plugins)
+        self.assertEqual(1, self.foo_ep.resolve.return_value.call_count)
+
+
+class TestPluginIndex(base.TestCase):
+
+    def setUp(self):
+        super(TestPluginIndex, self).setUp()
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.path = os.path.join(tmpdir, 'cache', 'index.json')
+        self.fake_ep = _fake_entry_point('fake', FakePlugin)
+        patcher = mock.patch('pkg_resources.iter_entry_points',
+                             return_value=[self.fake_ep])
+        self.mock_iter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_load_missing(self):
+        index = loader.PluginIndex(self.path, 'os_vif')
+        self.assertIsNone(index.load())
+
+    def test_save_and_load(self):
+        index = loader.PluginIndex(self.path, 'os_vif')
+        index.save({'fake': {'module': 'm', 'attrs': ['a'], 'info': None}})
+        self.assertEqual({'fake': {'module': 'm', 'attrs': ['a'],
+                                   'info': None}}, index.load())
+        self.assertIsNone(loader.PluginIndex(self.path, 'other').load())
+
+    def test_load_stale(self):
+        index = loader.PluginIndex(self.path, 'os_vif')
+        index.save({})
+        with mock.patch.object(loader.PluginIndex, 'fingerprint',
+                               return_value='changed'):
+            self.assertIsNone(index.load())
+
+    def test_load_corrupt(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as index_file:
+            index_file.write('{not json')
+        self.assertIsNone(loader.PluginIndex(self.path, 'os_vif').load())
+
+    def test_fingerprint_tracks_sys_path(self):
+        fingerprint = loader.PluginIndex.fingerprint()
+        with mock.patch('sys.path', ['/nonexistent/site-packages']):
+            self.assertNotEqual(fingerprint, loader.PluginIndex.fingerprint())
+
+    def test_load_plugins_not_a_dict(self):
+        index = loader.PluginIndex(self.path, 'os_vif')
+        index.save(['fake'])
+        self.assertIsNone(index.load())
+
+    def test_fingerprint_tracks_entry_points(self):
+        site = os.path.dirname(self.path)
+        os.makedirs(os.path.join(site, 'foo-1.0.dist-info'))
+        entry_points = os.path.join(site, 'foo-1.0.dist-info',
+                                    'entry_points.txt')
+        with open(entry_points, 'w') as ep_file:
+            ep_file.write('[os_vif]\n')
+        with mock.patch('sys.path', [site]):
+            fingerprint = loader.PluginIndex.fingerprint()
+            # Neither bytecode nor a distribution without entry points
+            # changes it.
+            open(os.path.join(site, 'foo.pyc'), 'w').close()
+            os.makedirs(os.path.join(site, 'bar-1.0.dist-info'))
+            self.assertEqual(fingerprint, loader.PluginIndex.fingerprint())
+
+            with open(entry_points, 'a') as ep_file:
+                ep_file.write('foo = foo:FooPlugin\n')
+            changed = loader.PluginIndex.fingerprint()
+            self.assertNotEqual(fingerprint, changed)
+            os.makedirs(os.path.join(site, 'baz-1.0.egg-info'))
+            open(os.path.join(site, 'baz-1.0.egg-info', 'entry_points.txt'),
+                 'w').close()
+            self.assertNotEqual(changed, loader.PluginIndex.fingerprint())
+
+    def test_manager_rebuilds_malformed_index(self):
+        index = loader.PluginIndex(self.path, 'os_vif')
+        for records in ({'fake': {'module': 'm'}},
+                        {'fake': {'module': 'm', 'attrs': 'a',
+                                  'info': None}},
+                        {'fake': {'module': 'm', 'attrs': ['a'],
+                                  'info': {'vif_types': ['fake']}}},
+                        {'fake': None}):
+            index.save(records)
+            self.mock_iter.reset_mock()
+            manager = loader.LazyPluginManager('os_vif', index_path=self.path)
+            self.assertEqual(1, self.mock_iter.call_count)
+            self.assertEqual(['fake'], manager.names())
+            self.assertEqual('os_vif.tests.test_loader',
+                             index.load()['fake']['module'])
+
+    def test_manager_builds_then_reads_index(self):
+        manager = loader.LazyPluginManager('os_vif', index_path=self.path)
+        self.assertEqual(1, self.mock_iter.call_count)
+        self.assertEqual(['fake'], manager.loaded_names())
+
+        manager = loader.LazyPluginManager('os_vif', index_path=self.path)
+        self.assertEqual(1, self.mock_iter.call_count)
+        self.assertEqual(['fake'], manager.names())
+        self.assertEqual([], manager.loaded_names())
+
+        self.assertIsNotNone(manager.indexed_info('fake'))
+        info = manager.describe('fake')
+        self.assertEqual(set(['fake']), info.vif_types)
+        self.assertTrue(info.thread_safe)
+        self.assertEqual(4, info.max_concurrency)
+        self.assertEqual([], manager.loaded_names())
+
+        self.assertIsInstance(manager['fake'], FakePlugin)
@@ -0,0 +1,179 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from os_vif import deadline
+from os_vif import exception
+from os_vif import locking
+from os_vif import metrics
+from os_vif.objects import network
+from os_vif.objects import vif as vif_obj
+from os_vif.tests import base
+
+
+class TestResources(base.TestCase):
+
+    def test_vif(self):
+        vif = vif_obj.VIF(id='b679325f-ca89-4ee0-a8be-6db1409b69ea')
+        self.assertEqual(['device:nicb679325f-ca', 'vif:' + vif.id],
+                         locking.resources(vif))
+
+    def test_hybrid_plug_bridge(self):
+        vif = vif_obj.VIF(id='b679325f-ca89-4ee0-a8be-6db1409b69ea',
+                          details={'ovs_hybrid_plug': True},
+                          network=network.Network(bridge='br-int'))
+        self.assertEqual(['bridge:qbrb679325f-ca', 'device:nicb679325f-ca',
+                          'vif:' + vif.id], locking.resources(vif))
+
+    def test_provided_bridge_and_vlan(self):
+        net = network.Network(bridge='brq0', should_provide_bridge=True,
+                              should_provide_vlan=True,
+                              bridge_interface='eth1', vlan='100')
+        vif = vif_obj.VIF(id='b679325f-ca89-4ee0-a8be-6db1409b69ea',
+                          devname='tap0', network=net)
+        self.assertEqual(['bridge:brq0', 'device:tap0', 'physnet:eth1',
+                          'vif:' + vif.id], locking.resources(vif))
+        vif.details = {'physical_network': 'physnet1'}
+        self.assertIn('physnet:physnet1', locking.resources(vif))
+
+    def test_resources_of_all(self):
+        net = network.Network(bridge='brq0', should_provide_bridge=True)
+        vifs = [vif_obj.VIF(id=vif_id, devname='tap' + vif_id, network=net)
+                for vif_id in ('b', 'a')]
+        self.assertEqual(['bridge:brq0', 'device:tapa', 'device:tapb',
+                          'vif:a', 'vif:b'], locking.resources_of_all(vifs))
+
+
+class TestLockManager(base.TestCase):
+
+    def setUp(self):
+        super(TestLockManager, self).setUp()
+        self.manager = locking.LockManager()
+
+    def _hold_in_thread(self, names, events):
+        def target():
+            with self.manager.acquire(names):
+                events['held'].set()
+                events['release'].wait()
+        thread = threading.Thread(target=target)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(events['release'].set)
+        events['held'].wait()
+        return thread
+
+    def _events(self):
+        return {'held': threading.Event(), 'release': threading.Event()}
+
+    def test_locks_forgotten_when_released(self):
+        held = self.manager.acquire(['vif:b', 'vif:a', 'vif:a'])
+        self.assertEqual(['vif:a', 'vif:b'], held.names)
+        self.assertEqual(['vif:a', 'vif:b'], self.manager.held())
+        held.release()
+        held.release()
+        self.assertEqual([], self.manager.held())
+
+    def test_unrelated_resources_do_not_wait(self):
+        events = self._events()
+        self._hold_in_thread(['vif:a', 'bridge:br0'], events)
+        with self.manager.acquire(['vif:b']):
+            self.assertEqual(['bridge:br0', 'vif:a', 'vif:b'],
+                             self.manager.held())
+
+    def test_shared_resource_waits(self):
+        events = self._events()
+        thread = self._hold_in_thread(['vif:a', 'bridge:br0'], events)
+        order = []
+
+        def target():
+            with self.manager.acquire(['vif:b', 'bridge:br0']):
+                order.append('second')
+        waiter = threading.Thread(target=target)
+        waiter.start()
+        time.sleep(0.05)
+        order.append('first')
+        events['release'].set()
+        thread.join()
+        waiter.join()
+        self.assertEqual(['first', 'second'], order)
+        self.assertEqual([], self.manager.held())
+
+    def test_wait_bounded_by_deadline(self):
+        events = self._events()
+        self._hold_in_thread(['bridge:br0'], events)
+        bound = deadline.Deadline(0.05, 'plug', vif_obj.VIF(id='a'))
+        self.assertRaises(exception.PlugTimeout, self.manager.acquire,
+                          ['bridge:br0', 'vif:a'], bound)
+        # The lock taken before the one that timed out was released.
+        self.assertEqual(['bridge:br0'], self.manager.held())
+        with self.manager.acquire(['vif:a'], deadline.Deadline(
+                1, 'plug', vif_obj.VIF(id='a'))):
+            self.assertEqual(['bridge:br0', 'vif:a'], self.manager.held())
+
+    def test_wait_bounded_after_free_locks(self):
+        events = self._events()
+        self._hold_in_thread(['vif:b'], events)
+        bound = deadline.Deadline(0.05, 'plug', vif_obj.VIF(id='a'))
+        self.assertRaises(exception.PlugTimeout, self.manager.acquire,
+                          ['vif:a', 'vif:b'], bound)
+        # The free lock taken before the held one was released.
+        self.assertEqual(['vif:b'], self.manager.held())
+        with self.manager.acquire(['vif:a']):
+            self.assertEqual(['vif:a', 'vif:b'], self.manager.held())
+
+    def test_no_deadlock_in_any_order(self):
+        # Without ordered acquisition, threads taking the same resources
+        # in opposite orders deadlock.
+        errors = []
+
+        def target(names):
+            try:
+                for _i in range(200):
+                    with self.manager.acquire(names):
+                        pass
+            except Exception as err:
+                errors.append(err)
+        threads = [threading.Thread(target=target, args=(names,))
+                   for names in (['vif:a', 'bridge:br0'],
+                                 ['bridge:br0', 'vif:a'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual([], errors)
+        self.assertEqual([], self.manager.held())
+
+    def test_lock_wait_metrics(self):
+        registry = metrics.MetricsRegistry()
+        metrics.enable(registry)
+        self.addCleanup(metrics.disable)
+        with self.manager.acquire(['vif:a', 'bridge:br0']):
+            pass
+        self.assertEqual(1, registry.get_timing(metrics.LOCK_WAIT,
+                                                resource='vif')[0])
+        self.assertEqual(1, registry.get_timing(metrics.LOCK_WAIT,
+                                                resource='bridge')[0])
+
+    def test_file_locks(self):
+        lock_path = os.path.join(tempfile.mkdtemp(), 'locks')
+        self.addCleanup(shutil.rmtree, os.path.dirname(lock_path))
+        manager = locking.LockManager(lock_path=lock_path)
+        with manager.acquire(['vif:a']):
+            self.assertTrue(os.path.exists(
+                os.path.join(lock_path, 'os_vif-vif:a')))
+        self.assertEqual([], manager.held())
@@ -0,0 +1,67 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+import mock
+import six
+
+from os_vif import logutils
+from os_vif.objects import vif as vif_obj
+from os_vif.tests import base
+
+
+class TestLogUtils(base.TestCase):
+
+    def setUp(self):
+        super(TestLogUtils, self).setUp()
+        self.stream = six.StringIO()
+        handler = logging.StreamHandler(self.stream)
+        self.logger = logging.getLogger('os_vif.tests.logutils')
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.logger.setLevel(logging.INFO)
+        self.addCleanup(self.logger.setLevel, logging.NOTSET)
+
+    def test_identity(self):
+        vif = vif_obj.VIF(id='uniq', plugin='ovs', devname='tapuniq')
+        self.assertEqual('VIF(id=uniq, plugin=ovs, devname=tapuniq)',
+                         str(logutils.identity(vif)))
+
+    def test_identity_unset_fields(self):
+        self.assertEqual('VIF(id=uniq, plugin=None, devname=nicuniq)',
+                         str(logutils.identity(vif_obj.VIF(id='uniq'))))
+        self.assertEqual('object(id=None, plugin=None, devname=None)',
+                         str(logutils.identity(object())))
+
+    def test_rendered_when_emitted(self):
+        vif = vif_obj.VIF(id='uniq', plugin='ovs')
+        with mock.patch.object(logutils, 'format_identity',
+                               wraps=logutils.format_identity) as mock_fmt:
+            self.logger.debug('Plugged vif %s', logutils.identity(vif))
+            self.assertFalse(mock_fmt.called)
+            self.logger.info('Plugged vif %s', logutils.identity(vif))
+            mock_fmt.assert_called_with(vif)
+        self.assertEqual(
+            'Plugged vif VIF(id=uniq, plugin=ovs, devname=nicuniq)\n',
+            self.stream.getvalue())
+
+    def test_full_repr_only_at_debug(self):
+        vif = vif_obj.VIF(id='uniq', plugin='ovs')
+        with mock.patch.object(vif_obj.VIF, '__repr__',
+                               return_value='VIF(full)') as mock_repr:
+            self.logger.debug('Plugging vif %s', vif)
+            self.logger.info('Plugged vif %s', logutils.identity(vif))
+            self.assertFalse(mock_repr.called)
+            self.logger.setLevel(logging.DEBUG)
+            self.logger.debug('Plugging vif %s', vif)
+            self.assertTrue(mock_repr.called)
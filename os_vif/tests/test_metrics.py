@@ -0,0 +1,216 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+
+import mock
+from oslo_concurrency import processutils
+
+import os_vif
+from os_vif import exception
+from os_vif import metrics
+from os_vif import objects
+from os_vif import privileged
+from os_vif.tests import base
+
+
+class TestMetricsRegistry(base.TestCase):
+
+    def test_timing(self):
+        registry = metrics.MetricsRegistry(buckets=(0.1, 1.0))
+        registry.timing('op_seconds', 0.05, {'plugin': 'ovs'})
+        registry.timing('op_seconds', 0.5, {'plugin': 'ovs'})
+        registry.timing('op_seconds', 5.0, {'plugin': 'ovs'})
+        self.assertEqual((3, 5.55), registry.get_timing('op_seconds',
+                                                        plugin='ovs'))
+        self.assertEqual((0, 0.0), registry.get_timing('op_seconds',
+                                                       plugin='linux'))
+
+    def test_counter(self):
+        registry = metrics.MetricsRegistry()
+        registry.increment('failures_total', {'exception': 'PlugException'})
+        registry.increment('failures_total', {'exception': 'PlugException'})
+        self.assertEqual(2, registry.get_counter('failures_total',
+                                                 exception='PlugException'))
+        registry.reset()
+        self.assertEqual(0, registry.get_counter('failures_total',
+                                                 exception='PlugException'))
+
+    def test_to_prometheus(self):
+        registry = metrics.MetricsRegistry(buckets=(0.1, 1.0))
+        registry.timing(metrics.PLUGIN, 0.05,
+                        {'plugin': 'ovs', 'operation': 'plug'})
+        registry.timing(metrics.PLUGIN, 0.5,
+                        {'plugin': 'ovs', 'operation': 'plug'})
+        registry.increment(metrics.FAILURES,
+                           {'plugin': 'o"vs', 'exception': 'PlugException'})
+        self.assertEqual(
+            '# HELP os_vif_plugin_seconds Time taken by VIF plugin '
+            'operations.\n'
+            '# TYPE os_vif_plugin_seconds histogram\n'
+            'os_vif_plugin_seconds_bucket{operation="plug",plugin="ovs",'
+            'le="0.1"} 1\n'
+            'os_vif_plugin_seconds_bucket{operation="plug",plugin="ovs",'
+            'le="1.0"} 2\n'
+            'os_vif_plugin_seconds_bucket{operation="plug",plugin="ovs",'
+            'le="+Inf"} 2\n'
+            'os_vif_plugin_seconds_sum{operation="plug",plugin="ovs"} 0.55\n'
+            'os_vif_plugin_seconds_count{operation="plug",plugin="ovs"} 2\n'
+            '# HELP os_vif_failures_total Number of failed VIF operations, '
+            'by exception class.\n'
+            '# TYPE os_vif_failures_total counter\n'
+            'os_vif_failures_total{exception="PlugException",'
+            'plugin="o\\"vs"} 1\n',
+            registry.to_prometheus())
+
+
+class TestStatsdSink(base.TestCase):
+
+    def test_send(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(server.close)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        sink = metrics.StatsdSink(*server.getsockname(), prefix='nova')
+        self.addCleanup(sink.close)
+
+        sink.timing(metrics.PLUGIN, 0.25, {'plugin': 'ovs',
+                                           'operation': 'plug'})
+        self.assertEqual(b'nova.os_vif_plugin_seconds.plug.ovs:250.000|ms',
+                         server.recv(512))
+        sink.increment(metrics.FAILURES, {'exception': 'PlugException'})
+        self.assertEqual(b'nova.os_vif_failures_total.PlugException:1|c',
+                         server.recv(512))
+
+
+class TestInstrumentation(base.TestCase):
+
+    def setUp(self):
+        super(TestInstrumentation, self).setUp()
+        self.registry = metrics.MetricsRegistry()
+        self.addCleanup(metrics.disable)
+
+    def test_disabled(self):
+        metrics.disable()
+        func = mock.Mock()
+        self.assertIs(func, metrics.instrument(func, 'ovs', 'plug'))
+        self.assertIsNone(metrics.start())
+        metrics.observe(metrics.LOOKUP, None, plugin='ovs')
+        metrics.count_failure(ValueError(), 'ovs', 'plug')
+        self.assertFalse(metrics.enabled())
+
+    def test_enable_defaults_to_process_registry(self):
+        metrics.enable()
+        self.assertEqual((metrics.get_registry(),), metrics._SINKS)
+
+    def test_instrument(self):
+        metrics.enable(self.registry)
+        seen = []
+
+        def hook(vif):
+            seen.append(metrics.current_labels())
+            return vif
+
+        wrapped = metrics.instrument(hook, 'ovs', 'plug')
+        self.assertEqual(mock.sentinel.vif, wrapped(mock.sentinel.vif))
+        self.assertEqual([{'plugin': 'ovs', 'operation': 'plug'}], seen)
+        self.assertEqual({}, metrics.current_labels())
+        self.assertEqual(1, self.registry.get_timing(
+            metrics.PLUGIN, plugin='ovs',
+            operation='plug')[0])
+
+    def test_privileged_command(self):
+        metrics.enable(self.registry)
+        runner = mock.Mock(spec=privileged.PrivilegedRunner)
+        runner.execute.return_value = ('', '')
+        service = privileged.PrivilegedService(runner)
+        hook = metrics.instrument(
+            lambda: service.execute('ip', 'link', 'show'), 'linux', 'plug')
+        hook()
+        self.assertEqual(1, self.registry.get_timing(
+            metrics.PRIVILEGED_COMMAND, plugin='linux',
+            operation='plug', command='ip')[0])
+
+
+class TestPlugMetrics(base.TestCase):
+
+    def setUp(self):
+        super(TestPlugMetrics, self).setUp()
+        os_vif._EXT_MANAGER = None
+        os_vif._EXECUTOR = None
+        self.registry = metrics.MetricsRegistry()
+        self.addCleanup(metrics.disable)
+
+    def _initialize(self, plugin):
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize()
+        self.addCleanup(os_vif._EXECUTOR.shutdown, wait=False)
+        # Enabled after initializing, which turns off metrics that are not
+        # asked for.
+        metrics.enable(self.registry)
+
+    def test_plug(self):
+        plugin = mock.MagicMock()
+        plugin.plug.side_effect = [None, processutils.ProcessExecutionError()]
+        self._initialize(plugin)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        os_vif.plug(vif, mock.sentinel.instance)
+        self.assertRaises(exception.PlugException,
+                          os_vif.plug, vif, mock.sentinel.instance)
+        self.assertRaises(exception.NoMatchingPlugin, os_vif.plug,
+                          objects.vif.VIF(id='uniq', plugin='missing'),
+                          mock.sentinel.instance)
+
+        self.assertEqual(2, self.registry.get_timing(
+            metrics.LOOKUP, plugin='foobar')[0])
+        self.assertEqual(2, self.registry.get_timing(
+            metrics.PLUGIN, plugin='foobar',
+            operation='plug')[0])
+        self.assertEqual(1, self.registry.get_counter(
+            metrics.FAILURES, plugin='foobar',
+            operation='plug', exception='PlugException'))
+        self.assertEqual(1, self.registry.get_counter(
+            metrics.FAILURES, plugin='missing',
+            operation='plug', exception='NoMatchingPlugin'))
+
+    def test_unplug_many(self):
+        plugin = mock.MagicMock()
+        plugin.unplug_many.return_value = [
+            processutils.ProcessExecutionError()]
+        self._initialize(plugin)
+        os_vif.unplug_many([objects.vif.VIF(id='uniq', plugin='foobar')])
+
+        self.assertEqual(1, self.registry.get_timing(
+            metrics.PLUGIN, plugin='foobar',
+            operation='unplug_many')[0])
+        self.assertEqual(1, self.registry.get_counter(
+            metrics.FAILURES, plugin='foobar',
+            operation='unplug', exception='UnplugException'))
+
+    def test_initialize_enables_metrics(self):
+        metrics.disable()
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={}):
+            os_vif.initialize(enable_metrics=True)
+        self.addCleanup(os_vif._EXECUTOR.shutdown, wait=False)
+        self.assertEqual((metrics.get_registry(),), metrics._SINKS)
+
+    def test_initialize_reset_disables_metrics(self):
+        sink = mock.Mock()
+        metrics.enable(sink)
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={}):
+            os_vif.initialize(reset=True)
+        self.addCleanup(os_vif._EXECUTOR.shutdown, wait=False)
+        self.assertFalse(metrics.enabled())
+        sink.close.assert_called_once_with()
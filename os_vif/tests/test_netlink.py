@@ -0,0 +1,256 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+
+import mock
+
+from os_vif import exception
+from os_vif import netlink
+from os_vif.tests import base
+
+
+def _message(msg_type, seq, payload):
+    return netlink._NLMSGHDR.pack(netlink._NLMSGHDR.size + len(payload),
+                                  msg_type, 0, seq, 0) + payload
+
+
+class FakeNetlinkSocket(object):
+    """
+    Answers link requests like the kernel would, keeping a table of devices
+    instead of changing the host.
+    """
+
+    def __init__(self):
+        self.links = {'lo': {'index': 1, 'flags': 0}}
+        self.requests = []
+        self._replies = []
+        self.closed = False
+
+    def _ack(self, seq, error=0):
+        return _message(netlink.NLMSG_ERROR, seq,
+                        netlink._NLMSGERR.pack(-error) + b'\0' * 16)
+
+    def send(self, data):
+        msg_type, flags, seq, payload = next(netlink._parse_messages(data))
+        _family, _type, index, ifi_flags, change = (
+            netlink._IFINFOMSG.unpack_from(payload))
+        attrs = netlink._parse_attrs(payload[netlink._IFINFOMSG.size:])
+        if msg_type == netlink.RTM_GETLINK and flags & netlink.NLM_F_DUMP:
+            self.requests.append((msg_type, None, attrs))
+            self._replies.append(self._dump(seq))
+            return
+        name = attrs[netlink.IFLA_IFNAME].rstrip(b'\0').decode('utf-8')
+        self.requests.append((msg_type, name, attrs))
+        if index and msg_type == netlink.RTM_NEWLINK:
+            self._replies.append(self._rename(seq, index, name))
+            return
+        link = self.links.get(name)
+
+        error = 0
+        replies = []
+        if msg_type == netlink.RTM_NEWLINK and flags & netlink.NLM_F_CREATE:
+            linkinfo = netlink._parse_attrs(attrs[netlink.IFLA_LINKINFO])
+            kind = linkinfo[netlink.IFLA_INFO_KIND].rstrip(b'\0')
+            names = [name]
+            if kind == b'veth':
+                peer = netlink._parse_attrs(linkinfo[netlink.IFLA_INFO_DATA])
+                peer_attrs = netlink._parse_attrs(
+                    peer[netlink.VETH_INFO_PEER][netlink._IFINFOMSG.size:])
+                names.append(peer_attrs[netlink.IFLA_IFNAME].rstrip(
+                    b'\0').decode('utf-8'))
+            if any(dev in self.links for dev in names):
+                error = errno.EEXIST
+            else:
+                for dev in names:
+                    self.links[dev] = {'index': len(self.links) + 1,
+                                       'flags': 0, 'kind': kind,
+                                       'peers': names}
+        elif link is None:
+            error = errno.ENODEV
+        elif msg_type == netlink.RTM_GETLINK:
+            replies.append(_message(netlink.RTM_NEWLINK, seq,
+                                    netlink._ifinfomsg(index=link['index'])))
+        elif msg_type == netlink.RTM_DELLINK:
+            for dev in link.get('peers', [name]):
+                self.links.pop(dev, None)
+        else:
+            link['flags'] = (link['flags'] & ~change) | (ifi_flags & change)
+            if netlink.IFLA_MTU in attrs:
+                link['mtu'] = netlink._U32.unpack(attrs[netlink.IFLA_MTU])[0]
+            if netlink.IFLA_MASTER in attrs:
+                link['master'] = netlink._U32.unpack(
+                    attrs[netlink.IFLA_MASTER])[0]
+        replies.append(self._ack(seq, error))
+        self._replies.append(b''.join(replies))
+
+    def _dump(self, seq):
+        replies = []
+        for name, link in sorted(self.links.items()):
+            attrs = netlink._attr_str(netlink.IFLA_IFNAME, name)
+            if link.get('kind'):
+                kind = link['kind'].decode('utf-8')
+                attrs += netlink._attr(
+                    netlink.IFLA_LINKINFO,
+                    netlink._attr_str(netlink.IFLA_INFO_KIND, kind))
+            replies.append(_message(
+                netlink.RTM_NEWLINK, seq,
+                netlink._ifinfomsg(index=link['index'],
+                                   flags=link['flags']) + attrs))
+        replies.append(_message(netlink.NLMSG_DONE, seq, b'\0' * 4))
+        return b''.join(replies)
+
+    def _rename(self, seq, index, new_name):
+        for name, link in self.links.items():
+            if link['index'] == index:
+                break
+        else:
+            return self._ack(seq, errno.ENODEV)
+        if new_name in self.links:
+            return self._ack(seq, errno.EEXIST)
+        if link['flags'] & netlink.IFF_UP:
+            return self._ack(seq, errno.EBUSY)
+        self.links[new_name] = self.links.pop(name)
+        peers = link.get('peers')
+        if peers:
+            peers[peers.index(name)] = new_name
+        return self._ack(seq)
+
+    def recv(self, size):
+        return self._replies.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+class TestIPRoute(base.TestCase):
+
+    def setUp(self):
+        super(TestIPRoute, self).setUp()
+        self.sock = FakeNetlinkSocket()
+        self.ipr = netlink.IPRoute(sock=self.sock)
+
+    def test_attr_padding(self):
+        attr = netlink._attr_str(netlink.IFLA_IFNAME, 'tap0')
+        self.assertEqual(12, len(attr))
+        self.assertEqual({netlink.IFLA_IFNAME: b'tap0\0'},
+                         netlink._parse_attrs(attr))
+
+    def test_link_index(self):
+        self.assertEqual(1, self.ipr.link_index('lo'))
+        self.assertTrue(self.ipr.link_exists('lo'))
+        self.assertFalse(self.ipr.link_exists('missing'))
+
+    def test_link_index_missing(self):
+        err = self.assertRaises(exception.NetlinkError,
+                                self.ipr.link_index, 'missing')
+        self.assertEqual(errno.ENODEV, err.kwargs['errno'])
+        self.assertIn('missing', str(err))
+
+    def test_add_veth(self):
+        self.ipr.add_veth('qvbuniq', 'qvouniq')
+        self.assertEqual(b'veth', self.sock.links['qvouniq']['kind'])
+        err = self.assertRaises(exception.NetlinkError,
+                                self.ipr.add_veth, 'qvbuniq', 'qvouniq')
+        self.assertEqual(errno.EEXIST, err.kwargs['errno'])
+
+    def test_delete_veth(self):
+        self.ipr.add_veth('qvbuniq', 'qvouniq')
+        self.ipr.delete_link('qvbuniq')
+        self.assertNotIn('qvouniq', self.sock.links)
+
+    def test_set_link(self):
+        self.ipr.add_bridge('qbruniq')
+        self.ipr.add_veth('qvbuniq', 'qvouniq')
+        self.ipr.set_mtu('qvbuniq', 9000)
+        self.ipr.set_up('qvbuniq')
+        self.ipr.set_master('qvbuniq', 'qbruniq')
+        link = self.sock.links['qvbuniq']
+        self.assertEqual(9000, link['mtu'])
+        self.assertEqual(netlink.IFF_UP, link['flags'])
+        self.assertEqual(self.sock.links['qbruniq']['index'], link['master'])
+
+        self.ipr.set_down('qvbuniq')
+        self.ipr.set_master('qvbuniq', None)
+        self.assertEqual(0, link['flags'])
+        self.assertEqual(0, link['master'])
+
+    def test_rename(self):
+        self.ipr.add_veth('ovpv0', 'ovpw0')
+        self.ipr.rename('ovpv0', 'qvbuniq')
+        self.assertNotIn('ovpv0', self.sock.links)
+        self.assertEqual(['qvbuniq', 'ovpw0'],
+                         self.sock.links['qvbuniq']['peers'])
+        self.ipr.set_up('ovpw0')
+        err = self.assertRaises(exception.NetlinkError,
+                                self.ipr.rename, 'ovpw0', 'qvouniq')
+        self.assertEqual(errno.EBUSY, err.kwargs['errno'])
+
+    def test_list_links(self):
+        sock = mock.Mock()
+        bridge = b''.join((
+            netlink._ifinfomsg(index=3, flags=netlink.IFF_UP),
+            netlink._attr_str(netlink.IFLA_IFNAME, 'qbruniq'),
+            netlink._attr_u32(netlink.IFLA_MTU, 1450),
+            netlink._attr(netlink.IFLA_LINKINFO, netlink._attr_str(
+                netlink.IFLA_INFO_KIND, 'bridge'))))
+        port = b''.join((
+            netlink._ifinfomsg(index=4),
+            netlink._attr_str(netlink.IFLA_IFNAME, 'qvbuniq'),
+            netlink._attr_u32(netlink.IFLA_MASTER, 3)))
+        sock.recv.side_effect = [
+            _message(netlink.RTM_NEWLINK, 1, bridge),
+            b''.join((_message(netlink.RTM_NEWLINK, 1, port),
+                      _message(netlink.NLMSG_DONE, 1, b'\0' * 4))),
+        ]
+        links = netlink.IPRoute(sock=sock).list_links()
+
+        flags = netlink._NLMSGHDR.unpack_from(sock.send.call_args[0][0])[2]
+        self.assertEqual(netlink.NLM_F_DUMP,
+                         flags & netlink.NLM_F_DUMP)
+        self.assertEqual({'index': 3, 'up': True, 'mtu': 1450,
+                          'master': None, 'kind': 'bridge'},
+                         links['qbruniq'])
+        self.assertEqual({'index': 4, 'up': False, 'mtu': None,
+                          'master': 3, 'kind': None}, links['qvbuniq'])
+
+    def test_context_manager(self):
+        with self.ipr as ipr:
+            self.assertIs(self.ipr, ipr)
+        self.assertTrue(self.sock.closed)
+
+
+class TestHelpers(base.TestCase):
+
+    def setUp(self):
+        super(TestHelpers, self).setUp()
+        self.sock = FakeNetlinkSocket()
+        self.ipr = netlink.IPRoute(sock=self.sock)
+
+    def test_ensure_bridge(self):
+        netlink.ensure_bridge(self.ipr, 'qbruniq', mtu=1450)
+        netlink.ensure_bridge(self.ipr, 'qbruniq')
+        self.assertEqual(1450, self.sock.links['qbruniq']['mtu'])
+        self.assertEqual(netlink.IFF_UP, self.sock.links['qbruniq']['flags'])
+
+    def test_ensure_veth_pair(self):
+        netlink.ensure_veth_pair(self.ipr, 'qvbuniq', 'qvouniq', mtu=1450)
+        netlink.ensure_veth_pair(self.ipr, 'qvbuniq', 'qvouniq')
+        for dev in ('qvbuniq', 'qvouniq'):
+            self.assertEqual(1450, self.sock.links[dev]['mtu'])
+            self.assertEqual(netlink.IFF_UP, self.sock.links[dev]['flags'])
+
+    def test_delete_link_if_exists(self):
+        netlink.delete_link_if_exists(self.ipr, 'missing')
+        netlink.ensure_bridge(self.ipr, 'qbruniq')
+        netlink.delete_link_if_exists(self.ipr, 'qbruniq')
+        self.assertNotIn('qbruniq', self.sock.links)
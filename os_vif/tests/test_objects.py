@@ -0,0 +1,345 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_versionedobjects import base as ovo_base
+from oslo_versionedobjects import fields
+
+from os_vif import objects
+from os_vif.objects import base as osv_base
+from os_vif.objects import codec
+from os_vif.objects import interning
+from os_vif.tests import base
+
+
+class TestTrustedConstruction(base.TestCase):
+
+    def setUp(self):
+        super(TestTrustedConstruction, self).setUp()
+        objects.register_all()
+
+    def test_vif_matches_constructor(self):
+        network = objects.network.Network(id='net', bridge='br0')
+        expected = objects.vif.VIF(id='uniq', plugin='foobar',
+                                   network=network)
+        values = dict((name, getattr(expected, name))
+                      for name in objects.vif.VIF.fields)
+        vif = objects.vif.VIF.obj_from_trusted(**values)
+        for name in objects.vif.VIF.fields:
+            self.assertEqual(getattr(expected, name), getattr(vif, name))
+        self.assertIs(network, vif.network)
+        self.assertEqual(set(values), vif.obj_what_changed())
+        self.assertEqual('qbruniq', vif.br_name)
+
+    @mock.patch('netaddr.IPNetwork')
+    def test_subnet_skips_cidr_parse(self, mock_ipnetwork):
+        subnet = objects.subnet.Subnet.obj_from_trusted(
+            cidr='10.0.0.0/24', dns=[], gateway='10.0.0.1', ips=[],
+            routes=[], version=4)
+        self.assertEqual(4, subnet.version)
+        self.assertFalse(mock_ipnetwork.called)
+
+    @mock.patch.dict('os_vif.objects.subnet._CIDR_VERSIONS', clear=True)
+    def test_subnet_cidr_parsed_once(self):
+        with mock.patch('netaddr.IPNetwork') as mock_ipnetwork:
+            mock_ipnetwork.return_value.version = 6
+            for _i in range(3):
+                subnet = objects.subnet.Subnet(cidr='fd00::/64')
+        self.assertEqual(6, subnet.version)
+        mock_ipnetwork.assert_called_once_with('fd00::/64')
+
+    def test_subnet_list(self):
+        subnet = objects.subnet.Subnet(cidr='10.0.0.0/24')
+        subnets = objects.subnet.SubnetList.obj_from_trusted(
+            objects=[subnet])
+        self.assertEqual([subnet], list(subnets))
+        self.assertEqual(1, len(subnets))
+
+    def test_unknown_field(self):
+        self.assertRaises(KeyError,
+                          objects.instance_info.InstanceInfo.obj_from_trusted,
+                          uuid='fake', bogus=True)
+
+    def test_registered_object_skips_coercion(self):
+        class FakeObject(osv_base.TrustedConstructionMixin,
+                         ovo_base.VersionedObject):
+            fields = {'count': fields.IntegerField()}
+
+        ovo_base.VersionedObjectRegistry.register(FakeObject)
+        with mock.patch.object(fields.Integer, 'coerce') as mock_coerce:
+            obj = FakeObject.obj_from_trusted(count=3)
+            self.assertEqual(3, obj.count)
+            self.assertFalse(mock_coerce.called)
+        self.assertTrue(obj.obj_attr_is_set('count'))
+
+
+class TestRecords(base.TestCase):
+
+    def setUp(self):
+        super(TestRecords, self).setUp()
+        objects.register_all()
+        subnet = objects.subnet.Subnet(cidr='10.0.0.0/24',
+                                       ips=['10.0.0.2', '10.0.0.3'])
+        self.network = objects.network.Network(
+            id='net', bridge='br0',
+            subnets=objects.subnet.SubnetList(objects=[subnet]))
+        self.vifs = [
+            objects.vif.VIF(id='vif%d' % i, plugin='ovs',
+                            network=self.network,
+                            details={'physical_network': 'physnet1'})
+            for i in range(3)]
+
+    def _assertVIFEqual(self, expected, actual):
+        for name in objects.vif.VIF.fields:
+            if name != 'network':
+                self.assertEqual(getattr(expected, name),
+                                 getattr(actual, name))
+        self.assertEqual(expected.network.bridge, actual.network.bridge)
+        self.assertEqual(
+            [subnet.cidr for subnet in expected.network.subnets],
+            [subnet.cidr for subnet in actual.network.subnets])
+
+    def test_record_is_slotted_and_read_only(self):
+        record = objects.vif.VIFRecord.from_object(self.vifs[0])
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertFalse(hasattr(record.network, '__dict__'))
+        self.assertRaises(AttributeError, setattr, record, 'id', 'other')
+        self.assertRaises(AttributeError, delattr, record, 'id')
+
+    def test_record_round_trip(self):
+        record = objects.vif.VIFRecord.from_object(self.vifs[0])
+        self.assertIsInstance(record.network, objects.network.NetworkRecord)
+        vif = record.to_object()
+        self.assertIsInstance(vif, objects.vif.VIF)
+        self.assertIsInstance(vif.network.subnets,
+                              objects.subnet.SubnetList)
+        self._assertVIFEqual(self.vifs[0], vif)
+        self.assertEqual(record, objects.vif.VIFRecord.from_object(vif))
+
+    def test_record_unset_field(self):
+        network = objects.network.Network(id='net', bridge='br0')
+        record = objects.network.NetworkRecord.from_object(network)
+        self.assertFalse(record.obj_attr_is_set('label'))
+        self.assertRaises(AttributeError, getattr, record, 'label')
+        self.assertFalse(hasattr(record.to_object(), 'label'))
+
+    def test_record_derived_properties(self):
+        record = objects.vif.VIFRecord.from_object(self.vifs[0])
+        for name in ('br_name', 'veth_pair_names', 'fixed_ips',
+                     'physical_network', 'bridge_name'):
+            self.assertEqual(getattr(self.vifs[0], name),
+                             getattr(record, name))
+        self.assertEqual(['10.0.0.2', '10.0.0.3'], record.fixed_ips)
+        self.assertEqual('physnet1', record.physical_network)
+        self.assertEqual('tapvif0', record.devname_with_prefix('tap'))
+
+    def test_table(self):
+        table = objects.vif.VIFTable(self.vifs)
+        self.assertEqual(3, len(table))
+        self.assertEqual(['vif0', 'vif1', 'vif2'], table.column('id'))
+        self.assertIs(table[0].network, table[2].network)
+        self.assertEqual('qbrvif1', table.get('vif1').br_name)
+        self.assertIsNone(table.get('missing'))
+        self.assertEqual(['vif0', 'vif1', 'vif2'],
+                         [record.id for record in table])
+        for expected, actual in zip(self.vifs, table.to_vifs()):
+            self._assertVIFEqual(expected, actual)
+
+    def test_table_append(self):
+        table = objects.vif.VIFTable()
+        table.append(self.vifs[1])
+        self.assertEqual(
+            objects.vif.VIFRecord.from_object(self.vifs[1]), table[0])
+
+
+class TestVIFMemoizedProperties(base.TestCase):
+
+    def setUp(self):
+        super(TestVIFMemoizedProperties, self).setUp()
+        objects.register_all()
+        subnet = objects.subnet.Subnet(cidr='10.0.0.0/24', ips=['10.0.0.2'])
+        self.network = objects.network.Network(
+            id='net', bridge='br0',
+            subnets=objects.subnet.SubnetList(objects=[subnet]))
+        self.vif = objects.vif.VIF(id='0123456789abcdef', plugin='ovs',
+                                   network=self.network)
+
+    def test_names_cached(self):
+        self.assertEqual('qbr0123456789a', self.vif.br_name)
+        self.assertIs(self.vif.veth_pair_names, self.vif.veth_pair_names)
+        self.assertEqual('tap0123456789a',
+                         self.vif.devname_with_prefix('tap'))
+        self.assertEqual('tap0123456789a',
+                         self.vif.devname_with_prefix('tap'))
+        self.assertEqual('qvo0123456789a',
+                         self.vif.devname_with_prefix('qvo'))
+
+    def test_id_change_invalidates(self):
+        self.assertEqual('qbr0123456789a', self.vif.br_name)
+        self.vif.id = 'fedcba9876543210'
+        self.assertEqual('qbrfedcba98765', self.vif.br_name)
+        self.assertEqual(('qvbfedcba98765', 'qvofedcba98765'),
+                         self.vif.veth_pair_names)
+
+    def test_devname_change_invalidates(self):
+        self.assertEqual('tap0123456789a',
+                         self.vif.devname_with_prefix('tap'))
+        self.vif.devname = 'nicother'
+        self.assertEqual('tapother', self.vif.devname_with_prefix('tap'))
+
+    def test_network_change_invalidates(self):
+        self.assertEqual(['10.0.0.2'], self.vif.fixed_ips)
+        subnet = objects.subnet.Subnet(cidr='10.1.0.0/24', ips=['10.1.0.9'])
+        self.vif.network = objects.network.Network(
+            id='net2', bridge='br1',
+            subnets=objects.subnet.SubnetList(objects=[subnet]))
+        self.assertEqual(['10.1.0.9'], self.vif.fixed_ips)
+
+    def test_fixed_ips_returns_copy(self):
+        self.vif.fixed_ips.append('192.168.0.1')
+        self.assertEqual(['10.0.0.2'], self.vif.fixed_ips)
+
+    def test_other_field_change_keeps_cache(self):
+        self.vif.br_name
+        cache = self.vif._derived_cache
+        self.vif.active = True
+        self.assertIs(cache, self.vif._derived_cache)
+
+    def test_record_not_cached(self):
+        record = objects.vif.VIFRecord.from_object(self.vif)
+        self.assertEqual(self.vif.br_name, record.br_name)
+        self.assertEqual(self.vif.fixed_ips, record.fixed_ips)
+
+
+class TestInterning(base.TestCase):
+
+    def setUp(self):
+        super(TestInterning, self).setUp()
+        objects.register_all()
+        self.registry = interning.Registry()
+
+    def _network(self, label='net'):
+        subnet = objects.subnet.Subnet(cidr='10.0.0.0/24', ips=['10.0.0.2'],
+                                       dns=['10.0.0.3'])
+        return objects.network.Network(
+            id='net', bridge='br0', label=label,
+            subnets=objects.subnet.SubnetList(objects=[subnet]))
+
+    def test_equal_objects_shared(self):
+        first = self._network()
+        interned = self.registry.intern(first)
+        self.assertIsNot(first, interned)
+        self.assertIs(interned, self.registry.intern(self._network()))
+        self.assertIs(interned, self.registry.intern(interned))
+        self.assertIsNot(interned, self.registry.intern(
+            self._network(label='other')))
+        self.assertEqual('net', interned.label)
+        self.assertEqual(['10.0.0.2'], interned.subnets.objects[0].ips)
+        # The original object is left as it was, and is still writable.
+        first.label = 'changed'
+        self.assertEqual('net', interned.label)
+
+    def test_nested_objects_shared(self):
+        one = self.registry.intern(self._network())
+        other = self.registry.intern(self._network(label='other'))
+        self.assertIs(one.subnets, other.subnets)
+        self.assertIs(one.subnets.objects[0], self.registry.intern(
+            objects.subnet.Subnet(cidr='10.0.0.0/24', ips=['10.0.0.2'],
+                                  dns=['10.0.0.3'])))
+
+    def test_unset_fields_compared(self):
+        network = objects.network.Network(id='net', bridge='br0')
+        labelled = objects.network.Network(id='net', bridge='br0',
+                                           label=None)
+        self.assertIsNot(self.registry.intern(network),
+                         self.registry.intern(labelled))
+        self.assertFalse(hasattr(self.registry.intern(network), 'label'))
+
+    def test_interned_read_only(self):
+        interned = self.registry.intern(self._network())
+        self.assertRaises(AttributeError, setattr, interned, 'label', 'x')
+        self.assertRaises(AttributeError, delattr, interned, 'label')
+        self.assertRaises(AttributeError, setattr,
+                          interned.subnets.objects[0], 'gateway', '10.0.0.1')
+        interned.obj_reset_changes()
+        self.assertEqual(set(), interned.obj_what_changed())
+
+    def test_copy_on_write(self):
+        vifs = [objects.vif.VIF(id='vif%d' % i, network=self._network())
+                for i in range(3)]
+        self.registry.intern_vifs(vifs)
+        interned = vifs[0].__dict__['network']
+        self.assertTrue(interned._obj_interned)
+        self.assertIs(interned, vifs[1].__dict__['network'])
+
+        vifs[0].network.label = 'changed'
+        vifs[0].network.subnets.objects[0].ips.append('10.0.0.9')
+        vifs[1].network.subnets.objects[0].gateway = '10.0.0.1'
+        self.assertEqual('changed', vifs[0].network.label)
+        self.assertEqual(['10.0.0.2', '10.0.0.9'],
+                         vifs[0].network.subnets.objects[0].ips)
+        self.assertEqual('10.0.0.1',
+                         vifs[1].network.subnets.objects[0].gateway)
+        self.assertIs(objects.network.Network, type(vifs[0].network))
+        self.assertEqual(set(), vifs[0].obj_what_changed())
+        # The interned network, and the VIF that only held it, are left
+        # unchanged.
+        self.assertIs(interned, vifs[2].__dict__['network'])
+        self.assertEqual('net', interned.label)
+        self.assertEqual(['10.0.0.2'], interned.subnets.objects[0].ips)
+        self.assertIsNone(interned.subnets.objects[0].gateway)
+        self.assertEqual('net', vifs[2].network.label)
+
+    def test_writable_copy(self):
+        interned = self.registry.intern(self._network())
+        network = interning.writable(interned)
+        network.label = 'changed'
+        network.subnets.objects[0].ips.append('10.0.0.9')
+        self.assertEqual('net', interned.label)
+        self.assertEqual(['10.0.0.2'], interned.subnets.objects[0].ips)
+        network = objects.network.Network(id='net')
+        self.assertIs(network, interning.writable(network))
+
+    def test_interned_class(self):
+        interned = self.registry.intern(self._network())
+        self.assertIsInstance(interned, objects.network.Network)
+        self.assertEqual('Network', interned.obj_name())
+        self.assertIs(objects.network.Network,
+                      type(interning.writable(interned)))
+        # Objects that are not interned keep their class.
+        self.assertIs(objects.network.Network, type(self._network()))
+
+    def test_records_and_codec(self):
+        vifs = [objects.vif.VIF(id='vif%d' % i, network=self._network())
+                for i in range(2)]
+        self.registry.intern_vifs(vifs)
+        table = objects.vif.VIFTable(vifs)
+        self.assertIsInstance(table[0].network,
+                              objects.network.NetworkRecord)
+        self.assertIs(table[0].network, table[1].network)
+        decoded = codec.loads(codec.dumps(vifs))
+        self.assertIs(objects.network.Network, type(decoded[0].network))
+        self.assertIs(decoded[0].network, decoded[1].network)
+        self.assertEqual(codec.to_primitive(vifs[1]),
+                         codec.to_primitive(decoded[1]))
+
+    def test_released(self):
+        interned = self.registry.intern(self._network())
+        self.assertEqual(3, len(self.registry))
+        del interned
+        self.assertEqual(0, len(self.registry))
+
+    def test_uninternable(self):
+        subnet = objects.subnet.Subnet(cidr='10.0.0.0/24', ips=[object()])
+        self.assertIs(subnet, self.registry.intern(subnet))
+        self.assertRaises(TypeError, self.registry.intern,
+                          objects.vif.VIF(id='vif'))
@@ -10,11 +10,23 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import os
+import shutil
+import tempfile
+import threading
+import time
+
 import mock
+from oslo_concurrency import processutils
 
 import os_vif
+from os_vif import deadline
 from os_vif import exception
+from os_vif import hoststate
+from os_vif import journal
+from os_vif import metrics
 from os_vif import objects
+from os_vif import plugin
 from os_vif.tests import base
 
 
@@ -23,6 +35,14 @@ class TestOSVIF(base.TestCase):
     def setUp(self):
         super(TestOSVIF, self).setUp()
         os_vif._EXT_MANAGER = None
+        os_vif._EXECUTOR = None
+        os_vif._JOURNAL = None
+        os_vif._LOCKS = None
+        os_vif._COALESCER = None
+        os_vif._TIMEOUT = None
+        os_vif._PLUGIN_TIMEOUTS = {}
+        metrics.reset()
+        self.addCleanup(metrics.reset)
 
     @mock.patch('stevedore.extension.ExtensionManager')
     def test_initialize(self, mock_EM):
@@ -53,6 +73,24 @@ class TestOSVIF(base.TestCase):
             os_vif.plug(vif, instance)
             plugin.plug.assert_called_once_with(vif, instance)
 
+    @mock.patch.object(os_vif, 'LOG')
+    def test_plug_failure(self, mock_log):
+        plugin = mock.MagicMock()
+        err = processutils.ProcessExecutionError()
+        plugin.plug.side_effect = err
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize()
+            vif = objects.vif.VIF(id='uniq', plugin='foobar')
+            self.assertRaises(exception.PlugException,
+                              os_vif.plug, vif, mock.MagicMock())
+
+        (msg, args), kwargs = mock_log.error.call_args
+        self.assertEqual({}, kwargs)
+        self.assertEqual(
+            'Failed to plug vif VIF(id=uniq, plugin=foobar, devname=nicuniq). '
+            'Got error: %s' % err, msg % args)
+
     def test_unplug(self):
         plugin = mock.MagicMock()
         with mock.patch('stevedore.extension.ExtensionManager',
@@ -61,3 +99,524 @@ class TestOSVIF(base.TestCase):
             vif = objects.vif.VIF(id='uniq', plugin='foobar')
             os_vif.unplug(vif)
             plugin.unplug.assert_called_once_with(vif)
+
+    def test_prepare_activate(self):
+        plugin = mock.MagicMock()
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize()
+            instance = mock.MagicMock()
+            vif = objects.vif.VIF(id='uniq', plugin='foobar')
+            os_vif.prepare(vif, instance)
+            plugin.prepare.assert_called_once_with(vif, instance)
+            self.assertFalse(plugin.activate.called)
+            os_vif.activate(vif)
+            plugin.activate.assert_called_once_with(vif)
+            self.assertFalse(plugin.plug.called)
+
+    def test_activate_failure(self):
+        plugin = mock.MagicMock()
+        plugin.activate.side_effect = processutils.ProcessExecutionError()
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize()
+            vif = objects.vif.VIF(id='uniq', plugin='foobar')
+            self.assertRaises(exception.PlugException, os_vif.activate, vif)
+
+    def test_plug_timeout(self):
+        plugin = mock.MagicMock()
+        bounds = []
+
+        def plug(vif, instance):
+            bounds.append(deadline.current())
+            bounds[-1].cancel()
+            raise processutils.ProcessExecutionError()
+
+        plugin.plug.side_effect = plug
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize()
+            vif = objects.vif.VIF(id='uniq', plugin='foobar')
+            err = self.assertRaises(exception.PlugTimeout, os_vif.plug, vif,
+                                    mock.sentinel.instance, timeout=30)
+        self.assertEqual(30, err.kwargs['timeout'])
+        self.assertEqual(30, bounds[0].timeout)
+        self.assertIsNone(deadline.current())
+
+    def test_plugin_default_timeout(self):
+        class SlowPlugin(plugin.PluginBase):
+            def describe(self):
+                return plugin.PluginInfo(set(['VIF']), '1.0', '1.0',
+                                         default_timeout=10)
+
+            plug = mock.MagicMock()
+            unplug = mock.MagicMock()
+
+        fake = SlowPlugin()
+        fake.unplug.side_effect = (
+            lambda vif: bounds.append(deadline.current()))
+        bounds = []
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'slow': fake}):
+            os_vif.initialize(plug_timeout=60)
+            vif = objects.vif.VIF(id='uniq', plugin='slow')
+            os_vif.unplug(vif)
+            os_vif.unplug(vif, timeout=0.5)
+            # The deadline passed while waiting for the plugin.
+            self.assertRaises(exception.PlugTimeout, os_vif.plug, vif,
+                              mock.sentinel.instance, timeout=0)
+        self.assertEqual([10, 0.5], [bound.timeout for bound in bounds])
+        self.assertFalse(fake.plug.called)
+
+    def test_plug_timeout_bounds_lock_wait(self):
+        plugin = mock.MagicMock()
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize(reset=True)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        with os_vif._LOCKS.acquire(['vif:uniq']):
+            self.assertRaises(exception.PlugTimeout, os_vif.plug, vif,
+                              mock.sentinel.instance, timeout=0.05)
+            self.assertRaises(exception.PlugTimeout, os_vif.unplug, vif,
+                              timeout=0.05)
+        self.assertFalse(plugin.plug.called)
+        self.assertFalse(plugin.unplug.called)
+        self.assertEqual([], os_vif._LOCKS.held())
+
+    def test_prepare_activate_timeout(self):
+        plugin = mock.MagicMock()
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize(reset=True, plug_timeout=60)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        bounds = []
+        plugin.activate.side_effect = (
+            lambda vif: bounds.append(deadline.current()))
+        os_vif.activate(vif)
+        self.assertEqual(60, bounds[0].timeout)
+        with os_vif._LOCKS.acquire(['vif:uniq']):
+            self.assertRaises(exception.PlugTimeout, os_vif.prepare, vif,
+                              mock.sentinel.instance, timeout=0.05)
+            self.assertRaises(exception.PlugTimeout, os_vif.activate, vif,
+                              timeout=0.05)
+        self.assertFalse(plugin.prepare.called)
+        self.assertEqual(1, plugin.activate.call_count)
+        self.assertEqual([], os_vif._LOCKS.held())
+
+    def test_coalesced_wait_bounded(self):
+        plugin = mock.MagicMock()
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def plug(vif, instance):
+            started.set()
+            release.wait()
+
+        plugin.plug.side_effect = plug
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize(coalesce_requests=True)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        thread = threading.Thread(target=os_vif.plug,
+                                  args=(vif, mock.sentinel.instance))
+        thread.start()
+        self.addCleanup(thread.join)
+        started.wait()
+        # The unplug waits for the running plug within its own timeout.
+        self.assertRaises(exception.PlugTimeout, os_vif.unplug, vif,
+                          timeout=0.05)
+        release.set()
+        thread.join()
+        self.assertFalse(plugin.unplug.called)
+        self.assertEqual(0, os_vif._COALESCER.pending())
+
+    def test_coalesce_requests(self):
+        plugin = mock.MagicMock()
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def plug(vif, instance):
+            started.set()
+            release.wait()
+
+        plugin.plug.side_effect = plug
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize(coalesce_requests=True)
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        errors = []
+
+        def request(func, *args):
+            try:
+                func(*args)
+            except exception.OperationSuperseded as err:
+                errors.append(err)
+
+        def wait_for_waiting(operation):
+            for _i in range(500):
+                waiting = os_vif._COALESCER._waiting.get('uniq')
+                if getattr(waiting, 'operation', None) == operation:
+                    return
+                time.sleep(0.002)
+            self.fail('requests did not queue up')
+
+        threads = [threading.Thread(target=os_vif.plug,
+                                    args=(vif, mock.sentinel.instance))]
+        threads[0].start()
+        started.wait()
+        # Made while the first plug runs, the unplug is replaced by the
+        # second plug before it starts.
+        threads.append(threading.Thread(target=request,
+                                        args=(os_vif.unplug, vif)))
+        threads[1].start()
+        wait_for_waiting('unplug')
+        threads.append(threading.Thread(
+            target=request, args=(os_vif.plug, vif, mock.sentinel.instance)))
+        threads[2].start()
+        wait_for_waiting('plug')
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(2, plugin.plug.call_count)
+        self.assertFalse(plugin.unplug.called)
+        self.assertEqual(1, len(errors))
+
+    def test_plug_holds_locks(self):
+        plugin = mock.MagicMock()
+        held = []
+        plugin.plug.side_effect = lambda vif, instance: held.extend(
+            os_vif._LOCKS.held())
+        plugin.unplug_many.side_effect = lambda vifs: held.extend(
+            os_vif._LOCKS.held()) or [None]
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize(reset=True)
+            vif = objects.vif.VIF(id='uniq', plugin='foobar')
+            os_vif.plug(vif, mock.MagicMock())
+            self.assertEqual(['device:nicuniq', 'vif:uniq'], held)
+            del held[:]
+            os_vif.unplug_many([vif])
+            self.assertEqual(['device:nicuniq', 'vif:uniq'], held)
+            self.assertEqual([], os_vif._LOCKS.held())
+
+            os_vif.initialize(reset=True, lock_resources=False)
+            self.assertIsNone(os_vif._LOCKS)
+
+    def test_plug_many(self):
+        foo = mock.MagicMock()
+        bar = mock.MagicMock()
+        err = processutils.ProcessExecutionError()
+        foo.plug_many.return_value = [None, err]
+        bar.plug_many.return_value = [None]
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foo': foo, 'bar': bar}):
+            os_vif.initialize()
+            instance = mock.MagicMock()
+            vif1 = objects.vif.VIF(id='one', plugin='foo')
+            vif2 = objects.vif.VIF(id='two', plugin='bar')
+            vif3 = objects.vif.VIF(id='three', plugin='foo')
+            vif4 = objects.vif.VIF(id='four', plugin='missing')
+            results = os_vif.plug_many([vif1, vif2, vif3, vif4], instance)
+
+        foo.plug_many.assert_called_once_with([vif1, vif3], instance)
+        bar.plug_many.assert_called_once_with([vif2], instance)
+        self.assertEqual([vif1, vif2, vif3, vif4],
+                         [result.vif for result in results])
+        self.assertEqual([True, True, False, False],
+                         [result.succeeded for result in results])
+        self.assertIsInstance(results[2].error, exception.PlugException)
+        self.assertIsInstance(results[3].error, exception.NoMatchingPlugin)
+
+    def test_plug_many_whole_batch_failure(self):
+        plugin = mock.MagicMock()
+        plugin.plug_many.side_effect = processutils.ProcessExecutionError()
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize()
+            vif1 = objects.vif.VIF(id='one', plugin='foobar')
+            vif2 = objects.vif.VIF(id='two', plugin='foobar')
+            results = os_vif.plug_many([vif1, vif2], mock.MagicMock())
+
+        for result in results:
+            self.assertIsInstance(result.error, exception.PlugException)
+
+    def test_plug_many_not_initialized(self):
+        self.assertRaises(
+            exception.LibraryNotInitialized,
+            os_vif.plug_many, [], None)
+
+    def test_unplug_many(self):
+        plugin = mock.MagicMock()
+        err = processutils.ProcessExecutionError()
+        plugin.unplug_many.return_value = [err, None]
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize()
+            vif1 = objects.vif.VIF(id='one', plugin='foobar')
+            vif2 = objects.vif.VIF(id='two', plugin='foobar')
+            results = os_vif.unplug_many([vif1, vif2])
+
+        plugin.unplug_many.assert_called_once_with([vif1, vif2])
+        self.assertIsInstance(results[0].error, exception.UnplugException)
+        self.assertTrue(results[1].succeeded)
+
+    def test_plug_many_fans_out_thread_safe_plugin(self):
+        class ThreadSafePlugin(plugin.PluginBase):
+            def describe(self):
+                return plugin.PluginInfo(set(['VIF']), '1.0', '1.0',
+                                         thread_safe=True)
+
+            plug = mock.MagicMock()
+            unplug = mock.MagicMock()
+
+        fake = ThreadSafePlugin()
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'fake': fake}):
+            os_vif.initialize()
+            vifs = [objects.vif.VIF(id='vif%d' % i, plugin='fake')
+                    for i in range(4)]
+            with mock.patch.object(fake, 'plug_many',
+                                   wraps=fake.plug_many) as mock_many:
+                results = os_vif.plug_many(vifs, mock.sentinel.instance)
+
+        self.assertTrue(all(result.succeeded for result in results))
+        self.assertEqual(4, mock_many.call_count)
+        self.assertEqual(4, fake.plug.call_count)
+
+    @mock.patch('stevedore.extension.ExtensionManager')
+    @mock.patch('os_vif.loader.LazyPluginManager')
+    def test_initialize_lazy(self, mock_LPM, mock_EM):
+        os_vif.initialize(lazy=True, opt=1)
+        mock_LPM.assert_called_once_with(namespace='os_vif',
+                                         invoke_args={'opt': 1},
+                                         index_path=None)
+        self.assertFalse(mock_EM.called)
+        self.assertEqual(mock_LPM.return_value, os_vif._EXT_MANAGER)
+
+    @mock.patch.object(hoststate.HostState, 'capture')
+    def test_reconcile(self, mock_capture):
+        foo = mock.MagicMock()
+        bar = mock.MagicMock()
+        instance = objects.instance_info.InstanceInfo(
+            uuid='d7a730ca-3c28-49c3-8f26-4662b909fe8a', name='vm',
+            project_id='p')
+        vif1 = objects.vif.VIF(id='one', plugin='foo', instance_info=instance)
+        vif2 = objects.vif.VIF(id='two', plugin='foo', instance_info=instance)
+        vif3 = objects.vif.VIF(id='three', plugin='bar')
+        stray = objects.vif.VIF(id='stray')
+        foo.describe_state.return_value = hoststate.PluginState(
+            states={'one': hoststate.VIF_STATE_PLUGGED,
+                    'two': hoststate.VIF_STATE_STALE})
+        foo.plug_many.return_value = [None]
+        # bar can't tell, so its VIF is plugged again.
+        bar.describe_state.return_value = None
+        bar.plug_many.return_value = [None]
+        baz = mock.MagicMock()
+        baz.describe_state.return_value = hoststate.PluginState(
+            extra=[stray])
+        baz.unplug_many.return_value = [None]
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foo': foo, 'bar': bar, 'baz': baz}):
+            os_vif.initialize()
+            result = os_vif.reconcile([vif1, vif2, vif3])
+
+        host_state = mock_capture.return_value
+        foo.describe_state.assert_called_once_with([vif1, vif2], host_state)
+        baz.describe_state.assert_called_once_with([], host_state)
+        self.assertEqual([vif1], result.unchanged)
+        foo.plug_many.assert_called_once_with([vif2], instance)
+        bar.plug_many.assert_called_once_with([vif3], None)
+        self.assertEqual([vif2, vif3],
+                         [vif_result.vif for vif_result in result.plugged])
+        baz.unplug_many.assert_called_once_with([stray])
+        self.assertEqual('baz', stray.plugin)
+        self.assertEqual([stray],
+                         [vif_result.vif for vif_result in result.unplugged])
+        self.assertTrue(result.succeeded)
+
+    @mock.patch.object(hoststate.HostState, 'capture')
+    def test_reconcile_describe_state_failure(self, mock_capture):
+        plugin = mock.MagicMock()
+        plugin.describe_state.side_effect = ValueError()
+        plugin.plug_many.return_value = [None]
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize()
+            vif = objects.vif.VIF(id='one', plugin='foobar')
+            result = os_vif.reconcile([vif])
+
+        plugin.plug_many.assert_called_once_with([vif], None)
+        self.assertEqual([vif], [r.vif for r in result.plugged])
+
+    def _initialize_journal(self, plugins):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'journal')
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value=plugins):
+            os_vif.initialize(journal_path=path)
+        self.addCleanup(os_vif._JOURNAL.close)
+        self.addCleanup(setattr, os_vif, '_JOURNAL', None)
+        return path
+
+    def test_plug_journaled(self):
+        plugin = mock.MagicMock()
+        self._initialize_journal({'foobar': plugin})
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+
+        def plug(vif, instance):
+            entry, = os_vif._JOURNAL.pending()
+            self.assertEqual(('plug', 'foobar', 'uniq'), (
+                entry.operation, entry.plugin_name, entry.vif_id))
+
+        plugin.plug.side_effect = plug
+        os_vif.plug(vif, mock.MagicMock())
+        plugin.unplug.side_effect = processutils.ProcessExecutionError()
+        self.assertRaises(exception.UnplugException, os_vif.unplug, vif)
+        plugin.unplug_many.return_value = [None]
+        os_vif.unplug_many([vif])
+        self.assertTrue(plugin.plug.called)
+        self.assertEqual([], os_vif._JOURNAL.pending())
+
+    def test_failed_plug_stays_journaled(self):
+        plugin = mock.MagicMock()
+        plugin.plug.side_effect = processutils.ProcessExecutionError()
+        self._initialize_journal({'foobar': plugin})
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        self.assertRaises(exception.PlugException, os_vif.plug, vif,
+                          mock.MagicMock())
+        entry, = os_vif._JOURNAL.pending()
+        self.assertEqual(('plug', 'uniq', True),
+                         (entry.operation, entry.vif_id, entry.failed))
+
+    def test_plug_many_journaled_under_locks(self):
+        plugin = mock.MagicMock()
+        self._initialize_journal({'foobar': plugin})
+        vifs = [objects.vif.VIF(id=vif_id, plugin='foobar')
+                for vif_id in ('one', 'two')]
+
+        def plug_many(vifs, instance):
+            # Both operations were journaled once the locks were taken.
+            self.assertEqual(['device:nicone', 'device:nictwo',
+                              'vif:one', 'vif:two'], os_vif._LOCKS.held())
+            self.assertEqual(['one', 'two'], [
+                entry.vif_id for entry in os_vif._JOURNAL.pending()])
+            return [None, processutils.ProcessExecutionError()]
+
+        plugin.plug_many.side_effect = plug_many
+        results = os_vif.plug_many(vifs, mock.MagicMock())
+        self.assertEqual([None, exception.PlugException],
+                         [result.error and type(result.error)
+                          for result in results])
+        entry, = os_vif._JOURNAL.pending()
+        self.assertEqual(('two', True), (entry.vif_id, entry.failed))
+
+    def test_recover(self):
+        plugin = mock.MagicMock()
+        path = self._initialize_journal({'foobar': plugin})
+        instance = objects.instance_info.InstanceInfo(
+            uuid='d7a730ca-3c28-49c3-8f26-4662b909fe8a', name='vm',
+            project_id='p')
+        vifs = [objects.vif.VIF(id=vif_id, plugin='foobar',
+                                instance_info=instance)
+                for vif_id in ('one', 'two', 'three', 'four')]
+        # The process stopped while plugging the first three VIFs, after
+        # the second was unplugged again and the third was plugged.
+        os_vif._JOURNAL.begin('plug', [('foobar', vif, mock.Mock())
+                                       for vif in vifs[:3]])
+        os_vif._JOURNAL.end([3])
+        os_vif._JOURNAL.begin('unplug', [('foobar', vifs[1], None)])
+        os_vif._JOURNAL.close()
+
+        plugin.plug_many.return_value = [None]
+        plugin.unplug_many.return_value = [None]
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize(reset=True, journal_path=path)
+        results = os_vif.recover()
+
+        self.assertEqual(['two', 'one'],
+                         [result.vif.id for result in results])
+        (plugged, plug_instance), _kwargs = plugin.plug_many.call_args
+        self.assertEqual(['one'], [vif.id for vif in plugged])
+        self.assertEqual(instance.uuid, plug_instance.uuid)
+        (unplugged,), _kwargs = plugin.unplug_many.call_args
+        self.assertEqual(['two'], [vif.id for vif in unplugged])
+        self.assertEqual([], os_vif._JOURNAL.pending())
+        self.assertEqual([], os_vif.recover())
+
+    def test_recover_corrupt_entry(self):
+        plugin = mock.MagicMock()
+        path = self._initialize_journal({'foobar': plugin})
+        vif = objects.vif.VIF(id='one', plugin='foobar')
+        os_vif._JOURNAL.begin('plug', [('foobar', vif, None)])
+        os_vif._JOURNAL.close()
+        # An entry whose payload was damaged on disk.
+        entry = journal.Entry(2, 'plug', 'foobar', 'two',
+                              b'\x92\xa6os_vif\x01\xc1')
+        with open(path, 'ab') as journal_file:
+            journal_file.write(journal._pack(entry._message()))
+
+        plugin.plug_many.return_value = [None]
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': plugin}):
+            os_vif.initialize(reset=True, journal_path=path)
+        with mock.patch.object(os_vif.LOG, 'warning') as mock_warning:
+            results = os_vif.recover()
+
+        self.assertEqual(['one'], [result.vif.id for result in results])
+        self.assertEqual(1, mock_warning.call_count)
+        self.assertEqual('two', mock_warning.call_args[0][1]['vif_id'])
+        self.assertEqual([], os_vif._JOURNAL.pending())
+
+    def test_recover_undecodable_entry(self):
+        plugin = mock.MagicMock()
+        self._initialize_journal({'foobar': plugin})
+        vif = objects.vif.VIF(id='one', plugin='foobar')
+        os_vif._JOURNAL.begin('plug', [('foobar', vif, None)])
+        os_vif._JOURNAL.begin('plug', [('foobar', objects.vif.VIF(
+            id='two', plugin='foobar'), None)])
+        plugin.plug_many.return_value = [None]
+
+        def decode(entry):
+            # A payload that is valid msgpack but holds no VIF.
+            if entry.vif_id == 'two':
+                raise IndexError('list index out of range')
+            return vif, None
+
+        with mock.patch.object(journal.Entry, 'decode', autospec=True,
+                               side_effect=decode):
+            with mock.patch.object(os_vif.LOG, 'warning') as mock_warning:
+                results = os_vif.recover()
+
+        self.assertEqual(['one'], [result.vif.id for result in results])
+        self.assertEqual('two', mock_warning.call_args[0][1]['vif_id'])
+        self.assertEqual([], os_vif._JOURNAL.pending())
+
+    def test_plug_journal_closed_while_plugging(self):
+        plugin = mock.MagicMock()
+        self._initialize_journal({'foobar': plugin})
+        vif = objects.vif.VIF(id='uniq', plugin='foobar')
+        plugin.plug.side_effect = lambda vif, instance: (
+            os_vif._JOURNAL.close())
+
+        with mock.patch.object(os_vif.LOG, 'warning') as mock_warning:
+            os_vif.plug(vif, mock.MagicMock())
+
+        self.assertTrue(plugin.plug.called)
+        self.assertEqual(1, mock_warning.call_count)
+
+    def test_recover_without_journal(self):
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={}):
+            os_vif.initialize()
+        self.assertEqual([], os_vif.recover())
+        os_vif._EXT_MANAGER = None
+        self.assertRaises(exception.LibraryNotInitialized, os_vif.recover)
+
+    def test_reconcile_not_initialized(self):
+        self.assertRaises(
+            exception.LibraryNotInitialized,
+            os_vif.reconcile, [])
@@ -0,0 +1,99 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import tempfile
+
+import mock
+
+import os_vif
+from os_vif.tests import base
+from os_vif.tests.perf import bench_dispatch
+from os_vif.tests.perf import bench_graphs
+from os_vif.tests.perf import bench_initialize
+from os_vif.tests.perf import bench_interning
+from os_vif.tests.perf import suite
+
+
+def _results(**relative):
+    return {'results': dict((name, {'relative': value, 'us_per_op': 1.0})
+                            for name, value in relative.items())}
+
+
+class TestPerfSuite(base.TestCase):
+
+    def test_compare(self):
+        baseline = _results(plug=1.0, unplug=1.0, gone=1.0)
+        results = _results(plug=1.4, unplug=1.6, new=9.0)
+        self.assertEqual([('unplug', 1.0, 1.6)],
+                         suite.compare(results, baseline, tolerance=0.5))
+        self.assertEqual([], suite.compare(results, baseline, tolerance=1.0))
+
+    def _main(self, results, baseline, *args):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+        if baseline is not None:
+            with open(path, 'w') as f:
+                json.dump(baseline, f)
+        with mock.patch.object(suite, 'run', return_value=results), \
+                mock.patch('sys.stdout'), mock.patch('sys.stderr'):
+            return path, suite.main(['--baseline', path] + list(args))
+
+    def test_main_update_baseline(self):
+        results = _results(plug=1.0)
+        path, status = self._main(results, None, '--update-baseline')
+        self.assertEqual(0, status)
+        with open(path) as f:
+            self.assertEqual(results, json.load(f))
+
+    def test_main_regression(self):
+        _path, status = self._main(_results(plug=1.0), _results(plug=0.5))
+        self.assertEqual(1, status)
+        _path, status = self._main(_results(plug=1.0), _results(plug=0.5),
+                                   '--tolerance', '1.5')
+        self.assertEqual(0, status)
+
+
+class TestBenchmarks(base.TestCase):
+    """Runs the benchmarks briefly, so that they keep working."""
+
+    def setUp(self):
+        super(TestBenchmarks, self).setUp()
+        os_vif._EXT_MANAGER = None
+        os_vif._EXECUTOR = None
+
+    def test_initialize_warm(self):
+        bench_initialize.initialize_warm(1, 3)
+        self.addCleanup(os_vif._EXECUTOR.shutdown, wait=False)
+        self.assertEqual(['noop0', 'noop1', 'noop2'],
+                         sorted(os_vif._plugin_names()))
+        self.assertIn('noop0', os_vif._ROUTES)
+
+    def test_dispatch(self):
+        results = bench_dispatch.run(count=2, repeat=1)
+        names = ['plug', 'unplug', 'plug_many', 'unplug_many']
+        self.assertEqual(set(names + [name + '_journaled' for name in names]),
+                         set(results))
+        self.assertIsNone(os_vif._JOURNAL)
+        self.assertIsNone(os_vif._EXT_MANAGER)
+
+    def test_graphs(self):
+        self.assertEqual(9, len(bench_graphs.run(count=1, repeat=1)))
+
+    def test_interning(self):
+        self.assertEqual(set(['intern_vifs', 'intern_vifs_shared']),
+                         set(bench_interning.run(count=8, repeat=1)))
+        self.assertLess(bench_interning.memory(64, intern=True,
+                                               fixed_ips=False),
+                        bench_interning.memory(64, fixed_ips=False))
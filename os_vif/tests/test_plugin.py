@@ -0,0 +1,71 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_concurrency import processutils
+
+from os_vif import objects
+from os_vif import plugin
+from os_vif.tests import base
+
+
+class FakePlugin(plugin.PluginBase):
+
+    def describe(self):
+        return plugin.PluginInfo(set(['fake']), '1.0', '1.0')
+
+    def plug(self, vif, instance):
+        pass
+
+    def unplug(self, vif):
+        pass
+
+
+class TestPluginBase(base.TestCase):
+
+    def test_plug_many_default(self):
+        fake = FakePlugin()
+        err = processutils.ProcessExecutionError()
+        vif1 = objects.vif.VIF(id='one', plugin='fake')
+        vif2 = objects.vif.VIF(id='two', plugin='fake')
+        instance = mock.sentinel.instance
+        with mock.patch.object(fake, 'plug',
+                               side_effect=[err, None]) as mock_plug:
+            self.assertEqual([err, None],
+                             fake.plug_many([vif1, vif2], instance))
+        mock_plug.assert_has_calls([mock.call(vif1, instance),
+                                    mock.call(vif2, instance)])
+
+    def test_unplug_many_default(self):
+        fake = FakePlugin()
+        err = processutils.ProcessExecutionError()
+        vif1 = objects.vif.VIF(id='one', plugin='fake')
+        vif2 = objects.vif.VIF(id='two', plugin='fake')
+        with mock.patch.object(fake, 'unplug',
+                               side_effect=[None, err]) as mock_unplug:
+            self.assertEqual([None, err], fake.unplug_many([vif1, vif2]))
+        mock_unplug.assert_has_calls([mock.call(vif1), mock.call(vif2)])
+
+    def test_describe_state_default(self):
+        fake = FakePlugin()
+        vif = objects.vif.VIF(id='one', plugin='fake')
+        self.assertIsNone(fake.describe_state([vif], mock.sentinel.state))
+
+    def test_prepare_activate_default(self):
+        fake = FakePlugin()
+        vif = objects.vif.VIF(id='one', plugin='fake')
+        instance = mock.sentinel.instance
+        with mock.patch.object(fake, 'plug') as mock_plug:
+            fake.prepare(vif, instance)
+            mock_plug.assert_called_once_with(vif, instance)
+            fake.activate(vif)
+            mock_plug.assert_called_once_with(vif, instance)
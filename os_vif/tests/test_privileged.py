@@ -0,0 +1,330 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+import futurist
+import mock
+from oslo_concurrency import processutils
+
+from os_vif import deadline
+from os_vif import exception
+from os_vif import plugin
+from os_vif import privileged
+from os_vif.tests import base
+
+
+class TestPrivilegedRunner(base.TestCase):
+
+    @mock.patch.object(processutils, 'execute', return_value=('out', ''))
+    def test_execute_rootwrap(self, mock_execute):
+        runner = privileged.PrivilegedRunner(rootwrap_config='/etc/rw.conf')
+        self.assertEqual(('out', ''), runner.execute('ip', 'link'))
+        mock_execute.assert_called_once_with(
+            'ip', 'link', process_input=None, check_exit_code=True,
+            run_as_root=True, root_helper='sudo nova-rootwrap /etc/rw.conf')
+
+    @mock.patch.object(processutils, 'execute', return_value=('', ''))
+    def test_execute_sudo(self, mock_execute):
+        runner = privileged.PrivilegedRunner(disable_rootwrap=True)
+        runner.execute('ip', 'link')
+        self.assertEqual('sudo', mock_execute.call_args[1]['root_helper'])
+
+    @mock.patch.object(privileged, '_rootwrap_client')
+    def test_execute_daemon(self, mock_client):
+        client = mock_client.return_value
+        client.execute.return_value = (0, 'out', '')
+        runner = privileged.PrivilegedRunner(use_rootwrap_daemon=True,
+                                             rootwrap_config='/etc/rw.conf')
+        self.assertEqual(('out', ''), runner.execute('ip', 'link'))
+        mock_client.assert_called_once_with(
+            ['sudo', 'nova-rootwrap-daemon', '/etc/rw.conf'])
+        client.execute.assert_called_once_with(['ip', 'link'], None)
+
+        client.execute.return_value = (2, '', 'boom')
+        err = self.assertRaises(processutils.ProcessExecutionError,
+                                runner.execute, 'ip', 'link')
+        self.assertEqual(2, err.exit_code)
+
+    @mock.patch.object(processutils, 'execute', return_value=('out', ''))
+    def test_execute_under_deadline(self, mock_execute):
+        runner = privileged.PrivilegedRunner()
+        bound = deadline.Deadline(60, 'plug', mock.Mock(id='uniq'))
+        self.assertEqual(('out', ''),
+                         runner.execute('ip', 'link', deadline=bound))
+        mock_execute.assert_called_once_with(
+            'ip', 'link', process_input=None, check_exit_code=True,
+            run_as_root=True, root_helper=runner.root_helper)
+
+    @mock.patch.object(privileged.LOG, 'warning')
+    @mock.patch.object(processutils, 'execute')
+    def test_execute_abandoned_at_deadline(self, mock_execute, mock_warning):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        mock_execute.side_effect = lambda *cmd, **kwargs: release.wait()
+        runner = privileged.PrivilegedRunner()
+        bound = deadline.Deadline(0.05, 'plug', mock.Mock(id='uniq'))
+        self.assertRaises(exception.PlugTimeout, runner.execute, 'ip',
+                          'link', deadline=bound)
+        self.assertTrue(bound.cancelled)
+        # The command runs as root, so it is left running.
+        self.assertEqual(1, mock_warning.call_count)
+
+
+class TestParseMergeable(base.TestCase):
+
+    def test_ip(self):
+        self.assertEqual(
+            ('ip', None, 'link set tap0 up'),
+            privileged._parse_mergeable(('ip', 'link', 'set', 'tap0', 'up')))
+
+    def test_ip_not_mergeable(self):
+        for argv in (('ip', 'link', 'show'),
+                     ('ip', '-o', 'link', 'set', 'tap0', 'up'),
+                     ('ip', 'link', 'set', 'tap 0', 'up'),
+                     ('ip', 'link')):
+            self.assertIsNone(privileged._parse_mergeable(argv))
+
+    def test_ovs_vsctl(self):
+        self.assertEqual(
+            ('ovs-vsctl', ('--timeout=120',),
+             [['--may-exist', 'add-port', 'br-int', 'tap0'],
+              ['set', 'Interface', 'tap0', 'type=internal']]),
+            privileged._parse_mergeable(
+                ('ovs-vsctl', '--timeout=120', '--', '--may-exist',
+                 'add-port', 'br-int', 'tap0', '--', 'set', 'Interface',
+                 'tap0', 'type=internal')))
+
+    def test_ovs_vsctl_not_mergeable(self):
+        for argv in (('ovs-vsctl', 'list-ports', 'br-int'),
+                     ('ovs-vsctl', 'add-port', 'br-int', 'tap0', '--',
+                      'get', 'Interface', 'tap0', 'ofport'),
+                     ('ovs-vsctl', '--timeout=120')):
+            self.assertIsNone(privileged._parse_mergeable(argv))
+
+    def test_other(self):
+        self.assertIsNone(privileged._parse_mergeable(('brctl', 'addbr')))
+
+
+class TestPrivilegedService(base.TestCase):
+
+    def setUp(self):
+        super(TestPrivilegedService, self).setUp()
+        self.runner = mock.Mock(spec=privileged.PrivilegedRunner)
+        self.runner.execute.return_value = ('', '')
+        self.service = privileged.PrivilegedService(self.runner)
+
+    def _queue(self, *argvs):
+        commands = []
+        for argv in argvs:
+            command = privileged._Command(argv,
+                                          *privileged._parse_mergeable(argv))
+            commands.append(command)
+        return commands
+
+    def test_execute_not_mergeable(self):
+        self.runner.execute.return_value = ('eth0', '')
+        self.assertEqual(('eth0', ''),
+                         self.service.execute('ip', 'link', 'show'))
+        self.runner.execute.assert_called_once_with('ip', 'link', 'show')
+
+    def test_execute_with_input_not_merged(self):
+        self.service.execute('ip', 'link', 'set', 'tap0', 'up',
+                             process_input='x')
+        self.runner.execute.assert_called_once_with(
+            'ip', 'link', 'set', 'tap0', 'up', process_input='x')
+
+    def test_execute_single_mergeable(self):
+        self.assertEqual(('', ''),
+                         self.service.execute('ip', 'link', 'set', 'tap0',
+                                              'up'))
+        self.runner.execute.assert_called_once_with('ip', 'link', 'set',
+                                                    'tap0', 'up')
+
+    def test_execute_under_deadline(self):
+        bound = deadline.Deadline(60, 'plug', mock.Mock(id='uniq'))
+        with bound:
+            self.service.execute('ip', 'link', 'show')
+            self.runner.execute.assert_called_once_with('ip', 'link', 'show',
+                                                        deadline=bound)
+            bound.cancel()
+            self.assertRaises(exception.PlugTimeout, self.service.execute,
+                              'ip', 'link', 'set', 'tap0', 'up')
+        self.assertEqual(1, self.runner.execute.call_count)
+
+    def test_merged_command_wait_cut_short(self):
+        # Another caller is running the queued commands.
+        self.service._running = True
+        bound = deadline.Deadline(0.01, 'plug', mock.Mock(id='uniq'))
+        with bound:
+            self.assertRaises(exception.PlugTimeout, self.service.execute,
+                              'ip', 'link', 'set', 'tap0', 'up')
+        # The command had not started, so it is dropped.
+        self.assertEqual(0, len(self.service._queue))
+        self.assertFalse(self.runner.execute.called)
+
+    def test_drainer_hands_over_once_own_command_ran(self):
+        waiting = self._queue(('ip', 'link', 'set', 'tap1', 'up'))[0]
+
+        def execute(*cmd, **kwargs):
+            # Another caller queues a command while this one runs.
+            self.service._queue.append(waiting)
+            return '', ''
+
+        self.runner.execute.side_effect = execute
+        self.service.execute('ip', 'link', 'set', 'tap0', 'up')
+        self.assertEqual(1, self.runner.execute.call_count)
+        self.assertEqual([waiting], list(self.service._queue))
+        self.assertTrue(waiting.handed)
+        self.assertTrue(waiting.ready.is_set())
+        self.assertTrue(self.service._running)
+
+        # The caller of the waiting command runs the queue in turn.
+        self.runner.execute.side_effect = None
+        self.assertTrue(self.service._wait(waiting, None))
+        self.service._drain(waiting)
+        self.assertEqual(('', ''), waiting.future.result())
+        self.assertFalse(self.service._running)
+
+    @mock.patch.object(privileged.LOG, 'warning')
+    def test_drain_bounded_by_deadline(self, mock_warning):
+        pool = futurist.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        self.runner._timed_pool.return_value = pool
+        waiting = self._queue(('ip', 'link', 'set', 'tap1', 'up'))[0]
+        release = threading.Event()
+
+        def execute(*cmd, **kwargs):
+            # Another caller queues a command while this one runs.
+            self.service._queue.append(waiting)
+            release.wait(5)
+            return '', ''
+
+        self.runner.execute.side_effect = execute
+        bound = deadline.Deadline(0.05, 'plug', mock.Mock(id='uniq'))
+        with bound:
+            self.assertRaises(exception.PlugTimeout, self.service.execute,
+                              'ip', 'link', 'set', 'tap0', 'up')
+        self.assertTrue(mock_warning.called)
+        # The running of the queue is handed over once the abandoned batch
+        # completes.
+        self.assertFalse(waiting.ready.is_set())
+        release.set()
+        self.assertTrue(waiting.ready.wait(5))
+        self.assertTrue(waiting.handed)
+
+    def test_run_batch_merges_consecutive_commands(self):
+        commands = self._queue(
+            ('ip', 'link', 'set', 'tap0', 'up'),
+            ('ip', 'link', 'set', 'tap1', 'up'),
+            ('ovs-vsctl', '--', 'add-port', 'br-int', 'tap0'),
+            ('ovs-vsctl', '--', 'add-port', 'br-int', 'tap1'),
+            ('ip', 'link', 'set', 'tap0', 'mtu', '9000'))
+        self.service._run_batch(commands)
+
+        self.assertEqual([
+            mock.call('ip', '-force', '-batch', '-',
+                      process_input='link set tap0 up\nlink set tap1 up\n'),
+            mock.call('ovs-vsctl', '--', 'add-port', 'br-int', 'tap0',
+                      '--', 'add-port', 'br-int', 'tap1'),
+            mock.call('ip', 'link', 'set', 'tap0', 'mtu', '9000'),
+        ], self.runner.execute.call_args_list)
+        for command in commands:
+            self.assertEqual(('', ''), command.future.result())
+
+    def test_run_batch_ovs_vsctl_global_options_differ(self):
+        commands = self._queue(
+            ('ovs-vsctl', '--timeout=10', 'add-port', 'br-int', 'tap0'),
+            ('ovs-vsctl', '--timeout=20', 'add-port', 'br-int', 'tap1'))
+        self.service._run_batch(commands)
+        self.assertEqual(2, self.runner.execute.call_count)
+
+    def test_ip_batch_failure_attributed_to_lines(self):
+        stderr = 'RTNETLINK answers: No such device\nCommand failed -:2\n'
+        self.runner.execute.side_effect = processutils.ProcessExecutionError(
+            exit_code=1, stderr=stderr)
+        commands = self._queue(('ip', 'link', 'set', 'tap0', 'up'),
+                               ('ip', 'link', 'set', 'tap1', 'up'),
+                               ('ip', 'link', 'set', 'tap2', 'up'))
+        self.service._run_batch(commands)
+
+        self.assertEqual(('', ''), commands[0].future.result())
+        err = self.assertRaises(processutils.ProcessExecutionError,
+                                commands[1].future.result)
+        self.assertEqual('ip link set tap1 up', err.cmd)
+        self.assertEqual(('', ''), commands[2].future.result())
+
+    def test_ovs_vsctl_failure_reruns_commands(self):
+        failure = processutils.ProcessExecutionError(exit_code=1)
+        self.runner.execute.side_effect = [failure, ('', ''), failure]
+        commands = self._queue(('ovs-vsctl', 'add-port', 'br-int', 'tap0'),
+                               ('ovs-vsctl', 'add-port', 'br-int', 'tap1'))
+        self.service._run_batch(commands)
+
+        self.assertEqual(3, self.runner.execute.call_count)
+        self.assertEqual(('', ''), commands[0].future.result())
+        self.assertRaises(processutils.ProcessExecutionError,
+                          commands[1].future.result)
+
+    def test_concurrent_callers_are_merged(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def execute(*cmd, **kwargs):
+            calls.append((cmd, kwargs))
+            if len(calls) == 1:
+                started.set()
+                release.wait(5)
+            return '', ''
+
+        self.runner.execute.side_effect = execute
+        threads = [threading.Thread(target=self.service.execute,
+                                    args=('ip', 'link', 'set', 'tap0', 'up'))]
+        threads[0].start()
+        started.wait(5)
+        for index in (1, 2):
+            threads.append(threading.Thread(
+                target=self.service.execute,
+                args=('ip', 'link', 'set', 'tap%d' % index, 'up')))
+            threads[-1].start()
+        # Wait for both commands to be queued behind the running one.
+        for _attempt in range(500):
+            if len(self.service._queue) == 2:
+                break
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(2, len(calls))
+        self.assertEqual(
+            (('ip', '-force', '-batch', '-'),
+             {'process_input': 'link set tap1 up\nlink set tap2 up\n'}),
+            calls[1])
+
+
+class TestPluginExecutePrivileged(base.TestCase):
+
+    @mock.patch.object(privileged, 'get_service')
+    def test_execute_privileged(self, mock_get_service):
+        class FakePlugin(plugin.PluginBase):
+            describe = plug = unplug = None
+
+        fake = FakePlugin()
+        service = mock_get_service.return_value
+        service.execute.return_value = ('out', '')
+        self.assertEqual(('out', ''),
+                         fake.execute_privileged('ip', 'link',
+                                                 check_exit_code=False))
+        service.execute.assert_called_once_with('ip', 'link',
+                                                check_exit_code=False)
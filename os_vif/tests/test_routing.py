@@ -0,0 +1,191 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+import os_vif
+from os_vif import exception
+from os_vif import objects
+from os_vif import plugin
+from os_vif import routing
+from os_vif.tests import base
+
+
+class TestRoutingTable(base.TestCase):
+
+    def setUp(self):
+        super(TestRoutingTable, self).setUp()
+        self.table = routing.RoutingTable({
+            'old': plugin.PluginInfo(set(['VIF']), '1.0', '1.1'),
+            'new': plugin.PluginInfo(set(['VIF']), '1.2', '1.4'),
+            'other': plugin.PluginInfo(set(['VIFOther']), '1.0', '1.0'),
+        })
+
+    def test_target_version_in_range(self):
+        self.assertEqual('1.1', self.table.target_version('old', 'VIF', '1.1'))
+        self.assertEqual('1.3', self.table.target_version('new', 'VIF', '1.3'))
+
+    def test_target_version_backports_newer_objects(self):
+        self.assertEqual('1.1', self.table.target_version('old', 'VIF', '1.3'))
+        self.assertEqual('1.4', self.table.target_version('new', 'VIF', '1.9'))
+
+    def test_target_version_unsupported(self):
+        self.assertRaises(exception.UnsupportedVIFObject,
+                          self.table.target_version, 'new', 'VIF', '1.0')
+        self.assertRaises(exception.UnsupportedVIFObject,
+                          self.table.target_version, 'old', 'VIF', '2.0')
+
+    def test_target_version_ignores_vif_types(self):
+        # A plugin chosen by name gets the VIF whatever the VIF types it
+        # declares.
+        self.assertEqual('1.0', self.table.target_version('other', 'VIF',
+                                                          '1.0'))
+
+    def test_target_version_undeclared_versions(self):
+        table = routing.RoutingTable({
+            'ovs': plugin.PluginInfo(set(['ovs']), None, None),
+        })
+        self.assertEqual('1.7', table.target_version('ovs', 'VIF', '1.7'))
+
+    def test_target_version_undescribed_plugin(self):
+        self.assertEqual('1.7', self.table.target_version('unknown', 'VIF',
+                                                          '1.7'))
+
+    def test_describe_pending(self):
+        table = routing.RoutingTable({}, pending=['late', 'broken'])
+        self.assertEqual(frozenset(['late', 'broken']), table.pending)
+        infos = {'late': plugin.PluginInfo(set(['VIF']), '1.0', '1.1')}
+        table.describe(['late', 'broken', 'late'], infos.__getitem__)
+        self.assertEqual(frozenset(), table.pending)
+        self.assertIn('late', table)
+        self.assertEqual('1.1', table.target_version('late', 'VIF', '1.4'))
+        # Plugins that could not be described are routed by name only.
+        self.assertEqual('1.4', table.target_version('broken', 'VIF', '1.4'))
+
+    @mock.patch.object(routing.LOG, 'warning')
+    def test_unparsable_info_is_skipped(self, mock_warning):
+        table = routing.RoutingTable({
+            'broken': plugin.PluginInfo(set(['VIF']), 'one', '1.0'),
+        })
+        self.assertNotIn('broken', table)
+        self.assertTrue(mock_warning.called)
+
+
+class TestRouting(base.TestCase):
+
+    def setUp(self):
+        super(TestRouting, self).setUp()
+        os_vif._EXT_MANAGER = None
+        os_vif._EXECUTOR = None
+
+    def _initialize(self, plugins):
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value=plugins):
+            os_vif.initialize()
+        self.addCleanup(os_vif._EXECUTOR.shutdown, wait=False)
+
+    def test_plug_backports_newer_vif(self):
+        fake = mock.MagicMock()
+        fake.describe.return_value = plugin.PluginInfo(set(['VIF']), '1.0',
+                                                       '1.0')
+        self._initialize({'fake': fake})
+        vif = objects.vif.VIF(id='uniq', plugin='fake')
+        vif.VERSION = '1.1'
+        with mock.patch.object(objects.vif.VIF, 'obj_make_compatible') as m:
+            os_vif.plug(vif, mock.sentinel.instance)
+
+        plugged = fake.plug.call_args[0][0]
+        self.assertIsNot(vif, plugged)
+        self.assertEqual('1.0', plugged.VERSION)
+        self.assertEqual('uniq', plugged.id)
+        self.assertEqual('1.1', vif.VERSION)
+        self.assertEqual('1.0', m.call_args[0][1])
+
+    def test_plug_current_vif_is_not_copied(self):
+        fake = mock.MagicMock()
+        fake.describe.return_value = plugin.PluginInfo(set(['VIF']), '1.0',
+                                                       '1.0')
+        self._initialize({'fake': fake})
+        vif = objects.vif.VIF(id='uniq', plugin='fake')
+        os_vif.plug(vif, mock.sentinel.instance)
+        fake.plug.assert_called_once_with(vif, mock.sentinel.instance)
+
+    def test_plug_by_name(self):
+        ovs = mock.MagicMock()
+        ovs.describe.return_value = plugin.PluginInfo(
+            set(['ovs', 'ovs_hybrid']), '1.0', '1.0')
+        bridge = mock.MagicMock()
+        bridge.describe.return_value = plugin.PluginInfo(set(['bridge']),
+                                                         '1.0', '1.0')
+        self._initialize({'ovs': ovs, 'bridge': bridge})
+        vif = objects.vif.VIF(id='uniq', plugin='ovs')
+        os_vif.plug(vif, mock.sentinel.instance)
+        ovs.plug.assert_called_once_with(vif, mock.sentinel.instance)
+        self.assertFalse(bridge.plug.called)
+
+    def test_plug_unsupported_vif_version(self):
+        fake = mock.MagicMock()
+        fake.describe.return_value = plugin.PluginInfo(set(['ovs']),
+                                                       '1.0', '1.0')
+        self._initialize({'fake': fake})
+        vif = objects.vif.VIF(id='uniq', plugin='fake')
+        vif.VERSION = '2.0'
+        self.assertRaises(exception.UnsupportedVIFObject,
+                          os_vif.plug, vif, mock.sentinel.instance)
+        self.assertFalse(fake.plug.called)
+
+    def test_plug_many_without_plugin_name(self):
+        fake = mock.MagicMock()
+        fake.describe.return_value = plugin.PluginInfo(set(['VIF']), '1.0',
+                                                       '1.0')
+        self._initialize({'fake': fake})
+        vif = objects.vif.VIF(id='uniq')
+        results = os_vif.plug_many([vif], mock.sentinel.instance)
+
+        self.assertIsInstance(results[0].error, exception.NoMatchingPlugin)
+        self.assertFalse(fake.plug_many.called)
+        self.assertFalse(fake.plug.called)
+
+    def test_lazy_plugins_described_on_first_use(self):
+        class FakePlugin(plugin.PluginBase):
+            def describe(self):
+                return plugin.PluginInfo(set(['VIF']), '1.0', '1.0',
+                                         default_timeout=30)
+
+            plug = mock.MagicMock()
+            unplug = mock.MagicMock()
+
+        entry_points = []
+        for name in ('foo', 'bar'):
+            ep = mock.MagicMock()
+            ep.name = name
+            ep.resolve.return_value = type(name, (FakePlugin,), {})
+            entry_points.append(ep)
+        with mock.patch('pkg_resources.iter_entry_points',
+                        return_value=entry_points):
+            os_vif.initialize(lazy=True)
+        self.addCleanup(os_vif._EXECUTOR.shutdown, wait=False)
+        self.assertEqual([], os_vif._EXT_MANAGER.loaded_names())
+        self.assertEqual(frozenset(['foo', 'bar']), os_vif._ROUTES.pending)
+
+        vif = objects.vif.VIF(id='uniq', plugin='foo')
+        vif.VERSION = '1.1'
+        with mock.patch.object(objects.vif.VIF, 'obj_make_compatible'):
+            os_vif.plug(vif, mock.sentinel.instance)
+        self.assertEqual(['foo'], os_vif._EXT_MANAGER.loaded_names())
+        self.assertEqual('1.0', FakePlugin.plug.call_args[0][0].VERSION)
+        self.assertEqual({'foo': 30}, os_vif._PLUGIN_TIMEOUTS)
+
+        # A VIF naming no plugin loads nothing.
+        self.assertRaises(exception.NoMatchingPlugin, os_vif.plug,
+                          objects.vif.VIF(id='other'), mock.sentinel.instance)
+        self.assertEqual(frozenset(['bar']), os_vif._ROUTES.pending)
@@ -0,0 +1,142 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_concurrency import processutils
+
+import os_vif
+from os_vif import exception
+from os_vif.objects import network
+from os_vif.objects import vif as vif_obj
+from os_vif.tests import base
+from os_vif import transactions
+
+
+class TestTransaction(base.TestCase):
+
+    def setUp(self):
+        super(TestTransaction, self).setUp()
+        self.plugin = mock.MagicMock()
+        self.plugin.unplug_many.side_effect = lambda vifs: [None] * len(vifs)
+        with mock.patch('stevedore.extension.ExtensionManager',
+                        return_value={'foobar': self.plugin}):
+            os_vif.initialize(reset=True)
+        self.instance = mock.MagicMock()
+
+    def _vif(self, vif_id, net=None):
+        return vif_obj.VIF(id=vif_id, plugin='foobar', network=net)
+
+    def _unplugged(self):
+        return [[vif.id for vif in call[0][0]]
+                for call in self.plugin.unplug_many.call_args_list]
+
+    def test_commit(self):
+        vifs = [self._vif('one'), self._vif('two')]
+        with os_vif.transaction() as tx:
+            tx.plug(vifs[0], self.instance)
+            tx.plug(vifs[0], self.instance)
+            tx.plug(vifs[1], self.instance)
+            self.assertEqual(vifs, tx.plugged)
+        self.assertEqual([], tx.plugged)
+        self.assertFalse(self.plugin.unplug_many.called)
+
+    def test_plug_failure_rolls_back(self):
+        self.plugin.plug.side_effect = [
+            None, None, processutils.ProcessExecutionError()]
+        vifs = [self._vif('one'), self._vif('two'), self._vif('three')]
+
+        def plug_all():
+            with os_vif.transaction() as tx:
+                for vif in vifs:
+                    tx.plug(vif, self.instance)
+
+        err = self.assertRaises(exception.PlugException, plug_all)
+        self.assertEqual([vifs[2]],
+                         [vif_result.vif for vif_result in err.results])
+        # The VIF whose plugging failed is unplugged as well.
+        self.assertEqual(vifs,
+                         [vif_result.vif for vif_result in err.rollback])
+        self.assertTrue(all(vif_result.succeeded
+                            for vif_result in err.rollback))
+        # Unrelated VIFs are unplugged together.
+        self.assertEqual([['three', 'two', 'one']], self._unplugged())
+
+    def test_plug_timeout_rolls_back(self):
+        vif = self._vif('one')
+        timeout = exception.PlugTimeout(timeout=1, operation='plug',
+                                        vif='one')
+
+        def plug():
+            with os_vif.transaction() as tx:
+                tx.plug(vif, self.instance)
+
+        with mock.patch.object(os_vif, 'plug', side_effect=timeout):
+            err = self.assertRaises(exception.PlugTimeout, plug)
+        self.assertEqual([vif], [vif_result.vif for vif_result in err.results])
+        self.assertEqual([['one']], self._unplugged())
+
+    def test_no_matching_plugin_not_rolled_back(self):
+        vifs = [self._vif('one'), vif_obj.VIF(id='two', plugin='nosuch')]
+        with os_vif.transaction() as tx:
+            tx.plug(vifs[0], self.instance)
+            self.assertRaises(exception.NoMatchingPlugin, tx.plug, vifs[1],
+                              self.instance)
+            self.assertRaises(exception.PlugException, tx.plug_many,
+                              vifs[1:], self.instance)
+            self.assertEqual(vifs[:1], tx.plugged)
+
+    def test_rollback_order_of_shared_bridge(self):
+        net = network.Network(bridge='brq0', should_provide_bridge=True)
+        vifs = [self._vif('one', net), self._vif('two'),
+                self._vif('three', net)]
+        with os_vif.transaction() as tx:
+            for vif in vifs:
+                tx.plug(vif, self.instance)
+            results = tx.rollback()
+        self.assertEqual(vifs, [vif_result.vif for vif_result in results])
+        self.assertEqual([['three', 'two'], ['one']], self._unplugged())
+
+    def test_plug_many_failure(self):
+        err = processutils.ProcessExecutionError()
+        self.plugin.plug_many.return_value = [None, err]
+        vifs = [self._vif('one'), self._vif('two')]
+
+        def plug_all():
+            with os_vif.transaction() as tx:
+                tx.plug_many(vifs, self.instance)
+
+        exc = self.assertRaises(exception.PlugException, plug_all)
+        self.assertEqual([True, False], [vif_result.succeeded
+                                         for vif_result in exc.results])
+        self.assertEqual(vifs,
+                         [vif_result.vif for vif_result in exc.rollback])
+
+    def test_other_error_rolls_back(self):
+        vif = self._vif('one')
+
+        def fail():
+            with os_vif.transaction() as tx:
+                tx.plug(vif, self.instance)
+                raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual([['one']], self._unplugged())
+
+    def test_rollback_failure(self):
+        self.plugin.unplug_many.side_effect = lambda vifs: [
+            processutils.ProcessExecutionError()] * len(vifs)
+        tx = transactions.Transaction()
+        tx.plug(self._vif('one'), self.instance)
+        err = self.assertRaises(exception.UnplugException, tx.rollback)
+        self.assertEqual(['one'], [vif_result.vif.id
+                                   for vif_result in err.results])
+        self.assertEqual([], tx.plugged)
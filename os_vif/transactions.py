@@ -0,0 +1,213 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Plugging several VIFs as a whole.
+
+A `Transaction` records the VIFs it plugs, and unplugs them again if the
+`with` block it is used in raises. A VIF is recorded before it is handed to
+its plugin, so that a VIF whose plugging failed half way, or timed out, is
+unplugged as well::
+
+    with os_vif.transaction() as tx:
+        for vif in vifs:
+            tx.plug(vif, instance)
+
+VIFs are unplugged in the reverse of the order they were plugged in, but
+only VIFs that share a resource, as named by `os_vif.locking.resources()`,
+wait for each other. The others are unplugged concurrently.
+"""
+
+import os_vif
+from os_vif import exception
+from os_vif.i18n import _LE
+from os_vif import locking
+from os_vif import logutils
+from os_vif import result
+
+LOG = os_vif.LOG
+
+
+def _rollback_waves(vifs):
+    """
+    Splits the VIFs, listed in the order they were plugged in, into the
+    lists of VIFs to unplug one after the other. A VIF is unplugged in a
+    later list than all the VIFs plugged after it that share a resource
+    with it.
+    """
+    waves = []
+    # Maps each resource to the index of the last wave using it.
+    last_wave = {}
+    for vif in reversed(vifs):
+        names = locking.resources(vif)
+        wave = 1 + max([last_wave.get(name, -1) for name in names] or [-1])
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(vif)
+        for name in names:
+            last_wave[name] = wave
+    return waves
+
+
+class Transaction(object):
+    """
+    Plugs VIFs, recording those that were plugged so that they can all be
+    unplugged if a later step fails. Returned by `os_vif.transaction()`.
+
+    On failure, the exception raised inside the `with` block propagates once
+    the VIFs are unplugged. The `rollback` property of a
+    `exception.PlugException` lists the outcome of unplugging each VIF, and
+    its `results` property the outcome of each VIF of the failed step.
+    """
+
+    def __init__(self):
+        # The VIFs handed to plugins so far, in the order they were plugged
+        # in.
+        self._plugged = []
+        self._plugged_ids = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None:
+            self.commit()
+            return False
+        results = self._rollback()
+        if isinstance(exc, exception.ExceptionBase):
+            exc.kwargs['rollback'] = results
+        return False
+
+    @property
+    def plugged(self):
+        """
+        List of the VIFs plugged so far, in the order they were plugged,
+        including those whose plugging failed.
+        """
+        return list(self._plugged)
+
+    @staticmethod
+    def _key(vif):
+        return getattr(vif, 'id', None) or id(vif)
+
+    def _record(self, vif):
+        """Records a VIF, and returns True if it was not recorded yet."""
+        key = self._key(vif)
+        if key in self._plugged_ids:
+            return False
+        self._plugged_ids.add(key)
+        self._plugged.append(vif)
+        return True
+
+    def _forget(self, vif):
+        self._plugged_ids.discard(self._key(vif))
+        self._plugged.remove(vif)
+
+    def plug(self, vif, instance):
+        """
+        Plugs the VIF with `os_vif.plug()`. The VIF is recorded before it
+        is handed to its plugin, and stays recorded if plugging fails.
+
+        :param vif: `os_vif.objects.VIF` object.
+        :param instance: `nova.objects.Instance` object.
+        :raises `exception.PlugException` if the VIF could not be plugged,
+                listing the VIF in its `results`, and the exceptions
+                `os_vif.plug()` raises.
+        """
+        recorded = self._record(vif)
+        try:
+            os_vif.plug(vif, instance)
+        except (exception.LibraryNotInitialized,
+                exception.NoMatchingPlugin):
+            # No plugin was handed the VIF, so there is nothing to undo.
+            if recorded:
+                self._forget(vif)
+            raise
+        except (exception.PlugException, exception.PlugTimeout) as err:
+            err.kwargs['results'] = [result.VIFResult(vif, err)]
+            raise
+
+    def plug_many(self, vifs, instance):
+        """
+        Plugs the VIFs with `os_vif.plug_many()`. The VIFs are recorded
+        before they are handed to their plugins, and those that failed stay
+        recorded, except for those no plugin was found for.
+
+        :param vifs: list of `os_vif.objects.VIF` objects.
+        :param instance: `nova.objects.Instance` object.
+        :returns: list of `os_vif.result.VIFResult` objects, in the same
+                  order as `vifs`.
+        :raises `exception.PlugException` if any of the VIFs could not be
+                plugged, with the outcome of each VIF in its `results`.
+        """
+        recorded = [vif for vif in vifs if self._record(vif)]
+        try:
+            results = os_vif.plug_many(vifs, instance)
+        except exception.LibraryNotInitialized:
+            for vif in recorded:
+                self._forget(vif)
+            raise
+        recorded = set(id(vif) for vif in recorded)
+        failed = []
+        for vif_result in results:
+            if vif_result.succeeded:
+                continue
+            failed.append(vif_result)
+            unrouted = isinstance(vif_result.error, exception.NoMatchingPlugin)
+            if unrouted and id(vif_result.vif) in recorded:
+                self._forget(vif_result.vif)
+        if failed:
+            raise exception.PlugException(
+                vif=', '.join(vif_result.vif.id for vif_result in failed),
+                err=failed[0].error, results=results)
+        return results
+
+    def commit(self):
+        """Forgets the VIFs plugged so far, which are no longer unplugged."""
+        self._plugged = []
+        self._plugged_ids = set()
+
+    def rollback(self):
+        """
+        Unplugs the VIFs plugged so far.
+
+        :returns: list of `os_vif.result.VIFResult` objects, in the order
+                  the VIFs were plugged in.
+        :raises `exception.UnplugException` if any of the VIFs could not be
+                unplugged, with the outcome of each VIF in its `results`.
+        """
+        results = self._rollback()
+        failed = [vif_result for vif_result in results
+                  if not vif_result.succeeded]
+        if failed:
+            raise exception.UnplugException(
+                vif=', '.join(vif_result.vif.id for vif_result in failed),
+                err=failed[0].error, results=results)
+        return results
+
+    def _rollback(self):
+        plugged = self._plugged
+        self.commit()
+        if not plugged:
+            return []
+        LOG.debug("Rolling back the plugging of vifs %s", plugged)
+        by_vif = {}
+        for wave in _rollback_waves(plugged):
+            for vif_result in os_vif.unplug_many(wave):
+                by_vif[id(vif_result.vif)] = vif_result
+        results = [by_vif[id(vif)] for vif in plugged]
+        for vif_result in results:
+            if not vif_result.succeeded:
+                LOG.error(_LE("Failed to roll back the plugging of vif "
+                              "%(vif)s: %(err)s"),
+                          {'vif': logutils.identity(vif_result.vif),
+                           'err': vif_result.error})
+        return results